@@ -2,389 +2,64 @@ import os
 import requests
 import json
 import time
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
+import importlib
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
-from PIL import Image, ImageEnhance, ImageFilter
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-import anthropic
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils.exceptions import InvalidFileException
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import re
-from typing import Dict, List, Tuple, Optional
-import smtplib
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
 import io
-import re
-import time
 import uuid
-from typing import Dict, Any, Optional, Tuple
-import boto3
-import requests
-from PIL import Image
-import pytesseract
+import threading
+import sqlite3
+import csv
+import hashlib
+import mmap
+import multiprocessing
+import shutil
+import tempfile
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Any
 from enum import Enum
 from dataclasses import dataclass
 import logging
-import fitz
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
+class LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access.
 
-# Replace the DocumentAnalyzer class with this version:
-class DocumentType(Enum):
-    """Enum for document types with proper categorization"""
-    # Identity Documents
-    AADHAAR_CARD = "aadhaar_card"
-    PAN_CARD = "pan_card"
-    PASSPORT = "passport"
-    DRIVING_LICENSE = "driving_license"
-    VOTER_ID = "voter_id"
-    
-    # Financial Documents
-    BANK_STATEMENT = "bank_statement"
-    CANCELLED_CHEQUE = "cancelled_cheque"
-    SALARY_SLIP = "salary_slip"
-    INVOICE = "invoice"
-    RECEIPT = "receipt"
-    
-    # Insurance Documents
-    POLICY_DOCUMENT = "policy_document"
-    CLAIM_FORM = "claim_form"
-    COVERAGE_NOTE = "coverage_note"
-    ENDORSEMENT = "endorsement"
-    RENEWAL_NOTICE = "renewal_notice"
-    
-    # Vehicle Documents
-    RC_BOOK = "rc_book"
-    POLLUTION_CERTIFICATE = "pollution_certificate"
-    VEHICLE_INSURANCE = "vehicle_insurance"
-    
-    # Medical Documents
-    MEDICAL_REPORT = "medical_report"
-    PRESCRIPTION = "prescription"
-    DISCHARGE_SUMMARY = "discharge_summary"
-    TEST_RESULTS = "test_results"
-    HOSPITAL_BILL = "hospital_bill"
-    
-    # Legal Documents
-    AGREEMENT = "agreement"
-    AFFIDAVIT = "affidavit"
-    POWER_OF_ATTORNEY = "power_of_attorney"
-    COURT_ORDER = "court_order"
-    POLICE_REPORT = "police_report"
-    FIR_COPY = "fir_copy"
-    
-    # Supporting Documents
-    SURVEY_REPORT = "survey_report"
-    REPAIR_ESTIMATE = "repair_estimate"
-    PHOTOGRAPHS = "photographs"
-    VIDEO_EVIDENCE = "video_evidence"
-    
-    # Unknown
-    UNKNOWN = "unknown"
+    PyMuPDF, Pillow and the Anthropic SDK together dominate the cold import of
+    this module, and the GUI needs none of them until a ticket is processed.
+    """
 
-@dataclass
-class DocumentMetadata:
-    """Metadata for processed documents"""
-    file_name: str
-    file_size: int
-    upload_time: datetime
-    processing_time: float
-    s3_key: Optional[str] = None
-    error_message: Optional[str] = None
+    def __init__(self, name):
+        self._name = name
+        self._module = None
 
-# Replace the existing DocumentAnalyzer class with this updated version
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
 
-class DocumentAnalyzer:
-    """
-    Document analyzer using A Image Reader API instead of AWS Textract.
-    """
-    
-    def __init__(self, api_endpoint="https://apiimagereader.insurancedekho.com/document/reader"):
-        self.api_endpoint = api_endpoint
-        self.cache_enabled = True
-        self.max_workers = 5
-        self._cache = {}
-        
-        # Initialize document mappings
-        self._init_document_mappings()
-        
-        logger.info(f"DocumentAnalyzer initialized with API endpoint: {api_endpoint}")
-    
-    def _init_document_mappings(self):
-        """Initialize comprehensive document mappings"""
-        # Keep all the existing mappings as they are
-        self.document_name_mapping = {
-            # Identity Documents
-            DocumentType.AADHAAR_CARD: 'Aadhaar Card',
-            DocumentType.PAN_CARD: 'PAN Card',
-            DocumentType.PASSPORT: 'Passport',
-            DocumentType.DRIVING_LICENSE: 'Driving License',
-            DocumentType.VOTER_ID: 'Voter ID Card',
-            
-            # Financial Documents
-            DocumentType.BANK_STATEMENT: 'Bank Statement',
-            DocumentType.CANCELLED_CHEQUE: 'Cancelled Cheque',
-            DocumentType.SALARY_SLIP: 'Salary Slip',
-            DocumentType.INVOICE: 'Invoice',
-            DocumentType.RECEIPT: 'Receipt',
-            
-            # Insurance Documents
-            DocumentType.POLICY_DOCUMENT: 'Insurance Policy Document',
-            DocumentType.CLAIM_FORM: 'Claim Form',
-            DocumentType.COVERAGE_NOTE: 'Coverage Note',
-            DocumentType.ENDORSEMENT: 'Policy Endorsement',
-            DocumentType.RENEWAL_NOTICE: 'Renewal Notice',
-            
-            # Vehicle Documents
-            DocumentType.RC_BOOK: 'Vehicle Registration Certificate (RC)',
-            DocumentType.POLLUTION_CERTIFICATE: 'Pollution Certificate',
-            DocumentType.VEHICLE_INSURANCE: 'Vehicle Insurance',
-            
-            # Medical Documents
-            DocumentType.MEDICAL_REPORT: 'Medical Report',
-            DocumentType.PRESCRIPTION: 'Medical Prescription',
-            DocumentType.DISCHARGE_SUMMARY: 'Hospital Discharge Summary',
-            DocumentType.TEST_RESULTS: 'Medical Test Results',
-            DocumentType.HOSPITAL_BILL: 'Hospital Bill',
-            
-            # Legal Documents
-            DocumentType.AGREEMENT: 'Legal Agreement',
-            DocumentType.AFFIDAVIT: 'Affidavit',
-            DocumentType.POWER_OF_ATTORNEY: 'Power of Attorney',
-            DocumentType.COURT_ORDER: 'Court Order',
-            DocumentType.POLICE_REPORT: 'Police Report',
-            DocumentType.FIR_COPY: 'FIR Copy',
-            
-            # Supporting Documents
-            DocumentType.SURVEY_REPORT: 'Survey Report',
-            DocumentType.REPAIR_ESTIMATE: 'Repair Estimate',
-            DocumentType.PHOTOGRAPHS: 'Incident Photographs',
-            DocumentType.VIDEO_EVIDENCE: 'Video Evidence'
-        }
-        
-        # Keep all other mappings (document_categories, document_patterns) as they are
-        self.document_categories = {
-            'identity': {
-                'types': [DocumentType.AADHAAR_CARD, DocumentType.PAN_CARD, 
-                         DocumentType.PASSPORT, DocumentType.DRIVING_LICENSE, DocumentType.VOTER_ID],
-                'keywords': ['identity', 'identification', 'government', 'official', 'photo id'],
-                'priority': 10
-            },
-            'financial': {
-                'types': [DocumentType.BANK_STATEMENT, DocumentType.CANCELLED_CHEQUE,
-                         DocumentType.SALARY_SLIP, DocumentType.INVOICE, DocumentType.RECEIPT],
-                'keywords': ['bank', 'financial', 'transaction', 'payment', 'account'],
-                'priority': 8
-            },
-            'insurance': {
-                'types': [DocumentType.POLICY_DOCUMENT, DocumentType.CLAIM_FORM,
-                         DocumentType.COVERAGE_NOTE, DocumentType.ENDORSEMENT, DocumentType.RENEWAL_NOTICE],
-                'keywords': ['insurance', 'policy', 'claim', 'coverage', 'premium'],
-                'priority': 9
-            },
-            'vehicle': {
-                'types': [DocumentType.RC_BOOK, DocumentType.POLLUTION_CERTIFICATE,
-                         DocumentType.VEHICLE_INSURANCE],
-                'keywords': ['vehicle', 'car', 'bike', 'registration', 'transport'],
-                'priority': 7
-            },
-            'medical': {
-                'types': [DocumentType.MEDICAL_REPORT, DocumentType.PRESCRIPTION,
-                         DocumentType.DISCHARGE_SUMMARY, DocumentType.TEST_RESULTS, DocumentType.HOSPITAL_BILL],
-                'keywords': ['medical', 'hospital', 'doctor', 'patient', 'treatment'],
-                'priority': 8
-            },
-            'legal': {
-                'types': [DocumentType.AGREEMENT, DocumentType.AFFIDAVIT,
-                         DocumentType.POWER_OF_ATTORNEY, DocumentType.COURT_ORDER,
-                         DocumentType.POLICE_REPORT, DocumentType.FIR_COPY],
-                'keywords': ['legal', 'court', 'police', 'agreement', 'affidavit'],
-                'priority': 7
-            },
-            'claim_supporting': {
-                'types': [DocumentType.SURVEY_REPORT, DocumentType.REPAIR_ESTIMATE,
-                         DocumentType.PHOTOGRAPHS, DocumentType.VIDEO_EVIDENCE],
-                'keywords': ['survey', 'damage', 'repair', 'incident', 'evidence'],
-                'priority': 6
-            }
-        }
-        
-        # Keep document patterns as they are
-        self.document_patterns = {
-            DocumentType.AADHAAR_CARD: {
-                'patterns': [
-                    r'\b\d{4}\s?\d{4}\s?\d{4}\b',  # Aadhaar number
-                    r'(?i)aadhaar|uid|uidai|आधार'
-                ],
-                'required_fields': ['aadhaar_number'],
-                'confidence_boost': 0.3
-            },
-            DocumentType.PAN_CARD: {
-                'patterns': [
-                    r'\b[A-Z]{5}[0-9]{4}[A-Z]\b',  # PAN number
-                    r'(?i)permanent\s+account\s+number|income\s+tax'
-                ],
-                'required_fields': ['pan_number'],
-                'confidence_boost': 0.3
-            },
-            # ... keep all other patterns as they are
-        }
+    def __getattr__(self, attr):
+        if attr in ('_name', '_module'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
 
-    def _call_image_reader_api(self, image_url=None, image_content=None, doc_type=None):
-        """Call the InsuranceDekho Image Reader API"""
-        try:
-            # Prepare the form data
-            form_data = {}
-            files = {}
-            
-            if image_url:
-                form_data['image_url'] = image_url
-            elif image_content:
-                files['image'] = ('document.jpg', image_content, 'image/jpeg')
-            
-            if doc_type:
-                form_data['doc_type'] = doc_type
-            
-            # Make the API call
-            response = requests.post(
-                self.api_endpoint,
-                data=form_data,
-                files=files if files else None,
-                timeout=30
-            )
-            
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API call failed: {str(e)}")
-            raise
-    
-    def _analyze_image(self, content: bytes) -> Tuple[str, Dict[str, str], float]:
-        """Analyze image using InsuranceDekho Image Reader API"""
-        logger.info("Analyzing image with InsuranceDekho API")
-        
-        try:
-            # Call the API with image content
-            result = self._call_image_reader_api(image_content=content)
-            
-            # Parse the API response
-            text = result.get('extracted_text', '')
-            data = result.get('extracted_data', {})
-            confidence = result.get('confidence', 0.8)
-            
-            # Convert API response to our format
-            extracted_data = {}
-            
-            # Map common fields from API response
-            field_mapping = {
-                'name': 'name',
-                'aadhaar_number': 'aadhaar_number',
-                'pan_number': 'pan_number',
-                'date_of_birth': 'date_of_birth',
-                'address': 'address',
-                'mobile_number': 'mobile_number',
-                'email': 'email_address',
-                'vehicle_number': 'vehicle_registration_number',
-                'policy_number': 'policy_number',
-                'claim_number': 'claim_number'
-            }
-            
-            for api_field, our_field in field_mapping.items():
-                if api_field in data:
-                    extracted_data[our_field] = data[api_field]
-            
-            return text, extracted_data, confidence
-            
-        except Exception as e:
-            logger.error(f"Image analysis failed: {str(e)}")
-            # Fallback to basic extraction
-            return "", {}, 0.5
-    
-    def _analyze_pdf(self, content: bytes, file_name: str) -> Tuple[str, Dict[str, str], float, int]:
-        """Analyze PDF by converting pages to images and using the API"""
-        logger.info(f"Analyzing PDF: {file_name}")
-        
-        try:
-            # Convert PDF to images
-            import fitz  # PyMuPDF
-            pdf_document = fitz.open(stream=content, filetype="pdf")
-            
-            all_text = []
-            all_data = {}
-            confidence_scores = []
-            page_count = len(pdf_document)
-            
-            for page_num in range(page_count):
-                page = pdf_document[page_num]
-                
-                # Convert page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-                img_data = pix.tobytes("png")
-                
-                # Analyze the page image
-                text, data, confidence = self._analyze_image(img_data)
-                
-                all_text.append(text)
-                all_data.update(data)
-                confidence_scores.append(confidence)
-            
-            # Combine results
-            combined_text = '\n'.join(all_text)
-            avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.5
-            
-            return combined_text, all_data, avg_confidence, page_count
-            
-        except ImportError:
-            logger.error("PyMuPDF not installed. Install with: pip install PyMuPDF")
-            # Fallback: treat as single image
-            return self._analyze_image(content) + (1,)
-        except Exception as e:
-            logger.error(f"PDF analysis failed: {str(e)}")
-            return "", {}, 0.5, 1
-    
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name!r} ({state})>"
 
-import os
-import requests
-import json
-import time
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from io import BytesIO
-from PIL import Image, ImageEnhance, ImageFilter
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-import anthropic
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils.exceptions import InvalidFileException
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import re
-from typing import Dict, List, Tuple, Optional
-import smtplib
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
-import io
-import re
-import time
-import uuid
-from typing import Dict, Any, Optional, Tuple
-import boto3
-import requests
-from PIL import Image
-import pytesseract
-from enum import Enum
-from dataclasses import dataclass
-import logging
-import fitz
+
+anthropic = LazyModule('anthropic')
+fitz = LazyModule('fitz')
+Image = LazyModule('PIL.Image')
+ImageEnhance = LazyModule('PIL.ImageEnhance')
+ImageFilter = LazyModule('PIL.ImageFilter')
+ImageOps = LazyModule('PIL.ImageOps')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -461,6 +136,34 @@ AWS_ACCESS_KEY_ID = config.get('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_ACCESS_KEY = config.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_REGION = config.get('AWS_REGION', 'us-east-1')
 
+def _config_value(name, default):
+    """Read an optional tuning setting from the loaded config, then the environment"""
+    # A key present in config.json wins even when it is 0 or false
+    value = config[name] if name in config else os.getenv(name)
+    if value in (None, ''):
+        return default
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        print(f"Warning: invalid value for {name}: {value!r}, using {default}")
+        return default
+
+# Freshdesk API pacing (requests per minute allowed by the plan)
+FRESHDESK_RATE_LIMIT_PER_MINUTE = _config_value('FRESHDESK_RATE_LIMIT_PER_MINUTE', 200)
+FRESHDESK_MAX_CONNECTIONS = _config_value('FRESHDESK_MAX_CONNECTIONS', 8)
+FRESHDESK_TIMEOUT_SECONDS = _config_value('FRESHDESK_TIMEOUT_SECONDS', 30)
+# Send API calls to another host, e.g. http://localhost:8080 for a local fake Freshdesk
+FRESHDESK_BASE_URL = _config_value('FRESHDESK_BASE_URL', '')
+
+# Images at least this large are passed to the OCR service by URL instead of
+# being downloaded here and uploaded again
+DOCUMENT_DIRECT_URL_MIN_BYTES = _config_value('DOCUMENT_DIRECT_URL_MIN_BYTES', 2 * 1024 * 1024)
+
+# Attachment downloads larger than this are refused; downloads are kept in
+# memory up to ATTACHMENT_SPOOL_BYTES and spill to a temporary file beyond that
+ATTACHMENT_MAX_BYTES = _config_value('ATTACHMENT_MAX_BYTES', 25 * 1024 * 1024)
+ATTACHMENT_SPOOL_BYTES = _config_value('ATTACHMENT_SPOOL_BYTES', 1024 * 1024)
+
 # Check if keys are loaded
 if not FRESHDESK_API_KEY or not FRESHDESK_DOMAIN:
     print("Warning: Freshdesk API keys not configured!")
@@ -534,6 +237,185 @@ class DocumentMetadata:
     s3_key: Optional[str] = None
     error_message: Optional[str] = None
 
+# ========== OCR IMAGE PREPARATION ==========
+
+# Images are downscaled so their longer side is at most this many pixels and
+# re-encoded as JPEG before upload; OCR_IMAGE_PREPARE=false uploads them as-is
+OCR_IMAGE_PREPARE = _config_value('OCR_IMAGE_PREPARE', 'true').lower() not in ('0', 'false', 'no', 'off')
+OCR_IMAGE_MAX_SIDE = _config_value('OCR_IMAGE_MAX_SIDE', 2200)
+OCR_IMAGE_JPEG_QUALITY = _config_value('OCR_IMAGE_JPEG_QUALITY', 85)
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG', 'png', 'image/png'),
+    (b'GIF8', 'gif', 'image/gif'),
+    (b'BM', 'bmp', 'image/bmp'),
+    (b'II*\x00', 'tiff', 'image/tiff'),
+    (b'MM\x00*', 'tiff', 'image/tiff'),
+)
+
+def sniff_image_type(content):
+    """Return (extension, mime type) of image bytes from their signature"""
+    for signature, extension, mime_type in IMAGE_SIGNATURES:
+        if content.startswith(signature):
+            return extension, mime_type
+    if content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return 'jpg', 'image/jpeg'
+
+def prepare_image_for_ocr(content, max_side=None, quality=None):
+    """
+    Prepare image bytes for upload to the Image Reader API.
+
+    The image is rotated upright according to its EXIF orientation, downscaled
+    to at most max_side pixels on its longer side and re-encoded as JPEG
+    without metadata. Returns (content, filename, mime_type); if the image
+    can't be decoded the original bytes are returned with their real type.
+    """
+    max_side = max_side or OCR_IMAGE_MAX_SIDE
+    quality = quality or OCR_IMAGE_JPEG_QUALITY
+    try:
+        with Image.open(BytesIO(content)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                # Flatten transparency onto white so it doesn't turn black
+                img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            if max(img.size) > max_side:
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            output = BytesIO()
+            img.save(output, format='JPEG', quality=quality, optimize=True)
+            return output.getvalue(), 'document.jpg', 'image/jpeg'
+    except Exception as e:
+        logger.warning(f"Could not prepare image for OCR, uploading original: {e}")
+        extension, mime_type = sniff_image_type(content)
+        return content, f'document.{extension}', mime_type
+
+# ========== DUPLICATE DOCUMENT DETECTION ==========
+
+# Images whose difference hashes differ in at most this many of their 256 bits
+# are flagged as likely duplicates (0 turns the check off). Only byte-identical
+# files share an analysis result: ID cards or RC books of different people
+# printed from one template are perceptually close.
+DOCUMENT_DEDUPE_MAX_DISTANCE = _config_value('DOCUMENT_DEDUPE_MAX_DISTANCE', 10)
+DHASH_SIZE = 16
+
+def image_dhash(content, hash_size=DHASH_SIZE):
+    """
+    Perceptual difference hash of image bytes (or a binary file object),
+    returned as (hash, aspect_ratio), or None if the image can't be decoded.
+    Re-encoded, resized or recompressed copies of the same scan produce
+    hashes that differ in only a few bits.
+    """
+    source = content if hasattr(content, 'read') else BytesIO(content)
+    try:
+        with Image.open(source) as img:
+            # Let the JPEG decoder downscale while decoding; the hash needs few pixels
+            img.draft('L', (hash_size * 8, hash_size * 8))
+            img = ImageOps.exif_transpose(img)
+            aspect_ratio = img.width / img.height if img.height else 0
+            small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+            pixels = small.tobytes()  # one byte per pixel in mode L
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits, aspect_ratio
+
+def dhashes_match(first, second, max_distance=None):
+    """Whether two image_dhash results belong to the same image"""
+    max_distance = DOCUMENT_DEDUPE_MAX_DISTANCE if max_distance is None else max_distance
+    if first is None or second is None or max_distance <= 0:
+        return False
+    (hash_a, ratio_a), (hash_b, ratio_b) = first, second
+    if not ratio_a or not ratio_b or abs(ratio_a - ratio_b) / max(ratio_a, ratio_b) > 0.05:
+        return False
+    return bin(hash_a ^ hash_b).count('1') <= max_distance
+
+# ========== PDF PAGE RENDERING ==========
+
+# Worker processes used to render PDF pages (0 renders in the calling thread)
+PDF_RENDER_PROCESSES = _config_value('PDF_RENDER_PROCESSES', min(4, os.cpu_count() or 1))
+# Pages of one PDF that are OCR'd concurrently
+PDF_OCR_CONCURRENCY = _config_value('PDF_OCR_CONCURRENCY', 4)
+PDF_RENDER_ZOOM = 2  # 2x zoom for better OCR quality
+
+# A page's embedded text layer is used instead of OCR when it has at least this
+# many characters and at most this share of unreadable ones
+PDF_TEXT_LAYER_MIN_CHARS = _config_value('PDF_TEXT_LAYER_MIN_CHARS', 50)
+PDF_TEXT_LAYER_MAX_GARBAGE_RATIO = _config_value('PDF_TEXT_LAYER_MAX_GARBAGE_RATIO', 0.1)
+
+def _text_layer_is_usable(text):
+    """Judge whether text extracted from a PDF text layer can stand in for OCR"""
+    stripped = text.strip()
+    if len(stripped) < PDF_TEXT_LAYER_MIN_CHARS:
+        return False
+    # Broken font encodings come out as replacement, control or private-use characters
+    garbage = sum(1 for ch in stripped if ch == '\ufffd' or not (ch.isprintable() or ch.isspace()))
+    return garbage / len(stripped) <= PDF_TEXT_LAYER_MAX_GARBAGE_RATIO
+
+def _open_pdf(content):
+    """Open a PDF from bytes, a memory map or a file path with PyMuPDF"""
+    import fitz  # PyMuPDF
+    if isinstance(content, str):
+        return fitz.open(content)
+    try:
+        return fitz.open(stream=content, filetype="pdf")
+    except (TypeError, ValueError):
+        # Older PyMuPDF versions only accept bytes-like streams they know
+        return fitz.open(stream=bytes(content), filetype="pdf")
+
+def _iter_pdf_page_images(content, page_numbers, zoom=PDF_RENDER_ZOOM):
+    """Render PDF pages to PNG bytes one at a time, yielding (page_num, png_bytes)"""
+    import fitz  # PyMuPDF
+    pdf_document = _open_pdf(content)
+    try:
+        matrix = fitz.Matrix(zoom, zoom)
+        for page_num in page_numbers:
+            yield page_num, pdf_document[page_num].get_pixmap(matrix=matrix).tobytes("png")
+    finally:
+        pdf_document.close()
+
+def _render_pdf_pages(pdf_path, page_numbers, zoom=PDF_RENDER_ZOOM):
+    """Render a batch of pages of a PDF file to PNG bytes (runs in a render worker process)"""
+    return list(_iter_pdf_page_images(pdf_path, page_numbers, zoom))
+
+_pdf_render_pool = None
+_pdf_render_pool_lock = threading.Lock()
+
+def get_pdf_render_pool():
+    """Return the shared process pool for PDF rendering, or None when disabled"""
+    global _pdf_render_pool
+    if PDF_RENDER_PROCESSES <= 0:
+        return None
+    with _pdf_render_pool_lock:
+        if _pdf_render_pool is None:
+            # Workers are spawned, not forked: the pool is started from GUI and
+            # pipeline threads, and a forked child can inherit locks held by them
+            _pdf_render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pdf_render_pool
+
+def _discard_pdf_render_pool():
+    """Drop a broken render pool so the next PDF starts a fresh one"""
+    global _pdf_render_pool
+    with _pdf_render_pool_lock:
+        if _pdf_render_pool is not None:
+            _pdf_render_pool.shutdown(wait=False)
+            _pdf_render_pool = None
+
 # Replace the existing DocumentAnalyzer class with this updated version
 
 class DocumentAnalyzer:
@@ -546,6 +428,7 @@ class DocumentAnalyzer:
         self.cache_enabled = True
         self.max_workers = 5
         self._cache = {}
+        self._remote_probes = {}  # file URL -> (size, kind) from one ranged request
         
         # Initialize document mappings
         self._init_document_mappings()
@@ -674,6 +557,7 @@ class DocumentAnalyzer:
 
     def _call_image_reader_api(self, image_url=None, image_content=None, doc_type=None):
         """Call the InsuranceDekho Image Reader API"""
+        check_cancelled()
         try:
             # Prepare the form data
             form_data = {}
@@ -682,7 +566,11 @@ class DocumentAnalyzer:
             if image_url:
                 form_data['image_url'] = image_url
             elif image_content:
-                files['image'] = ('document.jpg', image_content, 'image/jpeg')
+                if OCR_IMAGE_PREPARE:
+                    files['image'] = prepare_image_for_ocr(image_content)
+                else:
+                    extension, mime_type = sniff_image_type(image_content)
+                    files['image'] = (f'document.{extension}', image_content, mime_type)
             
             if doc_type:
                 form_data['doc_type'] = doc_type
@@ -702,13 +590,13 @@ class DocumentAnalyzer:
             logger.error(f"API call failed: {str(e)}")
             raise
     
-    def _analyze_image(self, content: bytes) -> Tuple[str, Dict[str, str], float]:
+    def _analyze_image(self, content: bytes, doc_type: str = None) -> Tuple[str, Dict[str, str], float]:
         """Analyze image using InsuranceDekho Image Reader API"""
         logger.info("Analyzing image with InsuranceDekho API")
         
         try:
             # Call the API with image content
-            result = self._call_image_reader_api(image_content=content)
+            result = self._call_image_reader_api(image_content=content, doc_type=doc_type)
             
             # Parse the API response
             text = result.get('extracted_text', '')
@@ -744,29 +632,64 @@ class DocumentAnalyzer:
             return "", {}, 0.5
     
     def _analyze_pdf(self, content: bytes, file_name: str) -> Tuple[str, Dict[str, str], float, int]:
-        """Analyze PDF by converting pages to images and using the API"""
+        """
+        Analyze PDF by converting pages to images and using the API.
+
+        Pages with a usable embedded text layer (digitally generated PDFs) are
+        read directly. The rest are rendered in the PDF render process pool and
+        each rendered page is handed to a bounded OCR thread pool as soon as it
+        is ready, so rendering and OCR overlap. Results are merged in page order.
+        """
         logger.info(f"Analyzing PDF: {file_name}")
         
         try:
-            # Convert PDF to images
-            import fitz  # PyMuPDF
-            pdf_document = fitz.open(stream=content, filetype="pdf")
-            
-            all_text = []
-            all_data = {}
-            confidence_scores = []
+            pdf_document = _open_pdf(content)
             page_count = len(pdf_document)
             
+            page_results = [("", {}, 0.5)] * page_count
+            ocr_pages = []
             for page_num in range(page_count):
-                page = pdf_document[page_num]
-                
-                # Convert page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-                img_data = pix.tobytes("png")
-                
-                # Analyze the page image
-                text, data, confidence = self._analyze_image(img_data)
+                page_text = pdf_document[page_num].get_text("text")
+                if _text_layer_is_usable(page_text):
+                    page_results[page_num] = (page_text, {}, 0.95)
+                else:
+                    ocr_pages.append(page_num)
+            pdf_document.close()
+            
+            if ocr_pages:
+                logger.info(f"{file_name}: {page_count - len(ocr_pages)} page(s) from text layer, {len(ocr_pages)} need OCR")
+            
+            # Convert the remaining pages to images and OCR them
+            ocr_workers = max(1, min(PDF_OCR_CONCURRENCY, len(ocr_pages) or 1))
+            with ThreadPoolExecutor(max_workers=ocr_workers) as ocr_pool:
+                ocr_futures = {}
+                page_futures = {}
+                for page_num, img_data in self._iter_rendered_pages(content, ocr_pages):
+                    # A page whose rendering is byte-identical to an earlier one
+                    # (e.g. a scan included twice) shares that page's OCR result.
+                    # Pages of one form or schedule often share a layout, so a
+                    # perceptual match here would drop the text of real pages.
+                    page_hash = hashlib.sha256(img_data).digest()
+                    future = page_futures.get(page_hash)
+                    if future is None:
+                        future = ocr_pool.submit(propagate_cancellation(self._analyze_page_cached), img_data)
+                        page_futures[page_hash] = future
+                    ocr_futures.setdefault(future, []).append(page_num)
                 
+                for future in as_completed(ocr_futures):
+                    page_nums = ocr_futures[future]
+                    try:
+                        page_result = future.result()
+                    except Exception as e:
+                        logger.error(f"OCR failed for page {page_nums[0] + 1} of {file_name}: {e}")
+                        continue
+                    for page_num in page_nums:
+                        page_results[page_num] = page_result
+            
+            all_text = []
+            all_data = {}
+            confidence_scores = []
+            for text, data, confidence in page_results:
                 all_text.append(text)
                 all_data.update(data)
                 confidence_scores.append(confidence)
@@ -784,9 +707,73 @@ class DocumentAnalyzer:
         except Exception as e:
             logger.error(f"PDF analysis failed: {str(e)}")
             return "", {}, 0.5, 1
-    
+
+    def _iter_rendered_pages(self, content: bytes, page_numbers: List[int]):
+        """
+        Yield (page_num, png_bytes) for the given pages as soon as each is rendered.
+        Several pages are rendered in small batches on the process pool;
+        if the pool is unavailable the remaining pages are rendered in-process.
+
+        The workers open the PDF from a temporary file, so each batch sends only
+        a path and a memory-mapped PDF is never copied into memory.
+        """
+        remaining = list(page_numbers)
+        pool = get_pdf_render_pool() if len(remaining) > 1 else None
+        if pool is not None:
+            pdf_path = None
+            rendered = set()
+            try:
+                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
+                    pdf_path = pdf_file.name
+                    pdf_file.write(content)
+                # Small batches keep the first pages flowing to OCR early
+                batch_size = max(1, -(-len(remaining) // (PDF_RENDER_PROCESSES * 2)))
+                batches = [remaining[i:i + batch_size] for i in range(0, len(remaining), batch_size)]
+                futures = [pool.submit(_render_pdf_pages, pdf_path, batch) for batch in batches]
+                for future in as_completed(futures):
+                    for page_num, img_data in future.result():
+                        rendered.add(page_num)
+                        yield page_num, img_data
+                return
+            except Exception as e:
+                logger.warning(f"PDF render pool failed, rendering in-process: {e}")
+                _discard_pdf_render_pool()
+                remaining = [page_num for page_num in remaining if page_num not in rendered]
+            finally:
+                if pdf_path:
+                    try:
+                        os.remove(pdf_path)
+                    except OSError:
+                        pass
+        
+        yield from _iter_pdf_page_images(content, remaining)
+
+    def _analyze_page_cached(self, img_data: bytes) -> Tuple[str, Dict[str, str], float]:
+        """OCR a rendered PDF page, reusing the result for a page seen before"""
+        if not self.cache_enabled:
+            return self._analyze_image(img_data)
+
+        page_hash = DocumentAnalysisCache.content_hash(img_data)
+        try:
+            cached = get_document_cache().get_page(page_hash)
+            if cached is not None:
+                return cached
+        except sqlite3.Error as e:
+            logger.warning(f"Document cache unavailable: {e}")
+            return self._analyze_image(img_data)
+
+        text, data, confidence = self._analyze_image(img_data)
+        if text:
+            try:
+                get_document_cache().put_page(page_hash, text, data, confidence)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not cache page OCR result: {e}")
+        return text, data, confidence
+
     def analyze_document(self, file_path: str = None, file_url: str = None, 
-                        use_cache: bool = True) -> Dict[str, Any]:
+                        use_cache: bool = True, file_name: str = None,
+                        size_hint: int = None, content_type_hint: str = None,
+                        content: bytes = None) -> Dict[str, Any]:
         """
         Comprehensive document analysis using InsuranceDekho API
         
@@ -794,6 +781,9 @@ class DocumentAnalyzer:
             file_path: Local file path
             file_url: Remote file URL
             use_cache: Whether to use cached results
+            file_name, size_hint, content_type_hint: Attachment metadata from
+                Freshdesk, used to decide how a URL is fetched
+            content: File bytes that were already downloaded from file_url
             
         Returns:
             Detailed analysis results
@@ -814,11 +804,45 @@ class DocumentAnalyzer:
             # Start processing timer
             start_time = time.time()
             
-            # Read file content
-            content, file_name, metadata = self._read_file_content(file_path, file_url)
-            
-            # Detect file type
-            file_type = self._detect_file_type(content, file_name)
+            # Large remote images go to the OCR service by URL, everything else
+            # is downloaded once and the bytes are reused
+            if content is not None:
+                file_name = file_name or 'downloaded_file'
+                metadata = DocumentMetadata(
+                    file_name=file_name,
+                    file_size=len(content),
+                    upload_time=datetime.now(),
+                    processing_time=0.0
+                )
+            if content is None and file_path is None and self._should_use_direct_url(file_url, file_name, size_hint, content_type_hint):
+                content = None
+                file_name = file_name or 'downloaded_file'
+                file_type = 'image'
+                metadata = DocumentMetadata(
+                    file_name=file_name,
+                    file_size=size_hint or 0,
+                    upload_time=datetime.now(),
+                    processing_time=0.0
+                )
+            else:
+                if content is None:
+                    content, read_name, metadata = self._read_file_content(file_path, file_url)
+                    if file_name and read_name == 'downloaded_file':
+                        metadata.file_name = file_name
+                file_name = metadata.file_name
+                file_type = self._detect_file_type(content, file_name)
+
+                # Same bytes seen before (possibly on another ticket): reuse the analysis
+                content_hash = DocumentAnalysisCache.content_hash(content)
+                cached_result = self._get_cached_analysis(content_hash) if use_cache else None
+                if cached_result is not None:
+                    cached_result['processing_time'] = time.time() - start_time
+                    cached_result['metadata'] = metadata.__dict__
+                    cached_result['content_hash'] = content_hash
+                    if cache_key and self.cache_enabled:
+                        self._cache[cache_key] = cached_result
+                    logger.info(f"Returning cached analysis for document {content_hash[:12]}")
+                    return cached_result
             
             # Determine document type hint for API
             doc_type_hint = self._guess_doc_type_from_filename(file_name)
@@ -828,14 +852,13 @@ class DocumentAnalyzer:
                 text, data, confidence, page_count = self._analyze_pdf(content, file_name)
             else:
                 # For images, we can pass doc_type hint to API
-                if file_url:
-                    # Use URL directly if available
+                if content is None:
                     result = self._call_image_reader_api(image_url=file_url, doc_type=doc_type_hint)
                     text = result.get('extracted_text', '')
                     data = result.get('extracted_data', {})
                     confidence = result.get('confidence', 0.8)
                 else:
-                    text, data, confidence = self._analyze_image(content)
+                    text, data, confidence = self._analyze_image(content, doc_type=doc_type_hint)
                 page_count = 1
             
             # Extract additional structured data using regex patterns
@@ -872,6 +895,12 @@ class DocumentAnalyzer:
             # Cache result
             if cache_key and self.cache_enabled:
                 self._cache[cache_key] = result
+            if content is not None and text and self.cache_enabled:
+                result['content_hash'] = content_hash
+                try:
+                    get_document_cache().put_document(content_hash, result)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not cache document analysis: {e}")
             
             logger.info(f"Successfully analyzed document: {doc_name} (confidence: {classification['confidence']:.2f})")
             
@@ -889,6 +918,85 @@ class DocumentAnalyzer:
                 'extracted_data': {}
             }
     
+    def _get_cached_analysis(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Look up a previous analysis of the same document bytes"""
+        if not self.cache_enabled:
+            return None
+        try:
+            return get_document_cache().get_document(content_hash)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Document cache lookup failed: {e}")
+            return None
+
+    def _should_use_direct_url(self, file_url: str, file_name: str = None,
+                               size_hint: int = None, content_type_hint: str = None) -> bool:
+        """
+        Decide whether a remote file can be sent to the OCR service by URL.
+
+        Only images of at least DOCUMENT_DIRECT_URL_MIN_BYTES qualify; smaller
+        files and PDFs are downloaded once and their bytes uploaded. When the
+        size or the type can't be told from the attachment metadata, a single
+        ranged request for the first bytes answers both.
+        """
+        if not file_url or (size_hint and size_hint < DOCUMENT_DIRECT_URL_MIN_BYTES):
+            return False
+
+        kind = None
+        content_type = (content_type_hint or '').lower()
+        name_lower = (file_name or '').lower()
+        if content_type == 'application/pdf' or name_lower.endswith('.pdf'):
+            kind = 'pdf'
+        elif content_type.startswith('image/') or name_lower.endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')):
+            kind = 'image'
+        if kind == 'pdf':
+            return False
+        if size_hint and kind == 'image':
+            return True
+
+        probed_size, probed_kind = self._probe_remote_file(file_url)
+        size = size_hint or probed_size
+        return bool(size) and size >= DOCUMENT_DIRECT_URL_MIN_BYTES and (kind or probed_kind) == 'image'
+
+    def _probe_remote_file(self, file_url: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Fetch only the first bytes of a remote file with one ranged request.
+
+        Returns (total_size, kind): the size comes from the Content-Range header
+        (Content-Length if the server ignores the range), the kind ('pdf',
+        'image' or None) from the bytes. Results are kept per URL, so duplicate
+        detection and the analysis itself share the request.
+        """
+        probe = self._remote_probes.get(file_url)
+        if probe is not None:
+            return probe
+
+        size = None
+        try:
+            response = freshdesk_client.get(
+                file_url, rate_limited=False, headers={'Range': 'bytes=0-15'}, stream=True
+            )
+            try:
+                response.raise_for_status()
+                total = response.headers.get('Content-Range', '').rpartition('/')[2].strip()
+                if total.isdigit():
+                    size = int(total)
+                elif response.status_code == 200:
+                    size = int(response.headers.get('Content-Length') or 0) or None
+                head = response.raw.read(16)
+            finally:
+                response.close()
+        except Exception as e:
+            logger.warning(f"Could not probe remote file {file_url}: {e}")
+            return None, None
+
+        kind = None
+        if head.startswith(b'%PDF'):
+            kind = 'pdf'
+        elif head.startswith((b'\xff\xd8\xff', b'\x89PNG', b'GIF8', b'BM', b'II*\x00', b'MM\x00*')):
+            kind = 'image'
+        probe = self._remote_probes[file_url] = (size, kind)
+        return probe
+
     def _guess_doc_type_from_filename(self, filename: str) -> str:
         """Guess document type from filename for API hint"""
         filename_lower = filename.lower()
@@ -907,8 +1015,8 @@ class DocumentAnalyzer:
             return 'voter_id'
         
         return None  # Let API auto-detect
-    def _process_single_attachment(self, attachment: Dict[str, Any]) -> Dict[str, Any]:
-        """Process a single attachment and return analysis results"""
+    def _process_single_attachment(self, attachment: Dict[str, Any], content: bytes = None) -> Dict[str, Any]:
+        """Process a single attachment (optionally with its already downloaded bytes) and return analysis results"""
         try:
             attachment_url = attachment.get('attachment_url')
             filename = attachment.get('name', 'unknown_file')
@@ -924,11 +1032,16 @@ class DocumentAnalyzer:
                     'confidence': 0.0
                 }
             
-            # Analyze using the attachment URL
+            # Analyze using the attachment URL; the metadata lets analyze_document
+            # avoid downloading large images the OCR service fetches itself
             analysis_result = self.analyze_document(
                 file_path=None,
                 file_url=attachment_url,
-                use_cache=True
+                use_cache=True,
+                file_name=filename,
+                size_hint=file_size,
+                content_type_hint=attachment.get('content_type'),
+                content=content
             )
             
             # Add metadata
@@ -974,19 +1087,17 @@ class DocumentAnalyzer:
                 return content, filename, metadata
                 
             elif file_url:
-                response = requests.get(file_url, auth=(FRESHDESK_API_KEY, "X"), timeout=30)
-                response.raise_for_status()
-                content = response.content
-                
-                # Get filename from headers or use default
-                filename = 'downloaded_file'
-                content_disposition = response.headers.get('Content-Disposition', '')
-                if 'filename=' in content_disposition:
-                    filename = content_disposition.split('filename=')[1].strip('"')
+                # Stream the download; large PDFs are memory-mapped rather than read
+                spool, size, headers = freshdesk_client.download(file_url)
+                with spool:
+                    # Get filename from headers or use default
+                    filename = filename_from_headers(headers)
+                    is_pdf = filename.lower().endswith('.pdf') or 'pdf' in headers.get('Content-Type', '')
+                    content = read_spooled_download(spool, size, memory_map=is_pdf)
                     
                 metadata = DocumentMetadata(
                     file_name=filename,
-                    file_size=len(content),
+                    file_size=size,
                     upload_time=datetime.now(),
                     processing_time=0.0
                 )
@@ -999,14 +1110,15 @@ class DocumentAnalyzer:
     def _detect_file_type(self, content: bytes, filename: str) -> str:
         """Detect file type from content and filename"""
         filename_lower = filename.lower()
+        head = bytes(content[:8])  # content may be memory-mapped
         
         if filename_lower.endswith('.pdf'):
             return 'pdf'
         elif filename_lower.endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')):
             return 'image'
-        elif content.startswith(b'%PDF'):
+        elif head.startswith(b'%PDF'):
             return 'pdf'
-        elif content.startswith((b'\xff\xd8\xff', b'\x89PNG', b'GIF8')):
+        elif head.startswith((b'\xff\xd8\xff', b'\x89PNG', b'GIF8')):
             return 'image'
         
         return 'image'  # Default to image
@@ -1260,10 +1372,183 @@ class DocumentAnalyzer:
             suggestions.append("Consider uploading a clearer image")
         return suggestions
     
+    def _fingerprint_attachment(self, attachment: Dict[str, Any]):
+        """
+        Download an attachment for duplicate detection and hash it from the
+        spooled file, so large files are never held in memory whole.
+
+        Returns (download, exact_key, image_hash). download is a
+        SpooledAttachment (None for large images that are sent to the OCR
+        service by URL, or if the download fails; analysis then fetches and
+        reports the error as usual).
+        """
+        attachment_url = attachment.get('attachment_url')
+        if not attachment_url or self._should_use_direct_url(
+                attachment_url, attachment.get('name'), attachment.get('size', 0), attachment.get('content_type')):
+            return None, None, None
+        try:
+            spool, size, headers = freshdesk_client.download(attachment_url)
+        except Exception as e:
+            logger.warning(f"Could not download {attachment.get('name', 'attachment')} for dedupe: {e}")
+            return None, None, None
+
+        is_pdf = attachment.get('name', '').lower().endswith('.pdf') or 'pdf' in headers.get('Content-Type', '')
+        download = SpooledAttachment(spool, size, is_pdf)
+        try:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: spool.read(1024 * 1024), b''):
+                digest.update(chunk)
+            spool.seek(0)
+            image_hash = None
+            if spool.read(4) != b'%PDF':
+                spool.seek(0)
+                image_hash = image_dhash(spool)
+            spool.seek(0)
+        except BaseException:
+            download.close()
+            raise
+        return download, digest.hexdigest(), image_hash
+
+    def _group_duplicate_attachments(self, attachments: List[Dict[str, Any]]):
+        """
+        Group attachments that hold the same file, in original order.
+
+        Returns (groups, similar). Downloaded files are grouped by the SHA-256
+        of their bytes, and attachments that weren't downloaded only when they
+        point at the same URL. Only the first attachment of each group keeps
+        its download (spooled to disk when large); the duplicates' downloads
+        are closed straight away.
+
+        similar maps a group's index to an earlier group that probably holds
+        the same document: an image within DOCUMENT_DEDUPE_MAX_DISTANCE of it,
+        or an undownloaded file with the same name and size. Such groups are
+        still analyzed on their own and only flagged.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            fingerprints = list(executor.map(propagate_cancellation(self._fingerprint_attachment), attachments))
+
+        groups = []
+        similar = {}
+        exact_index = {}
+        meta_index = {}
+        perceptual_index = []
+        for att, (download, digest, image_hash) in zip(attachments, fingerprints):
+            if digest is not None:
+                exact_key = digest
+            elif att.get('attachment_url'):
+                exact_key = ('url', att['attachment_url'])
+            else:
+                exact_key = ('unique', len(groups))
+
+            group = exact_index.get(exact_key)
+            if group is not None:
+                if download is not None:
+                    download.close()
+                groups[group].append((att, None))
+                continue
+
+            group = len(groups)
+            groups.append([(att, download)])
+            exact_index[exact_key] = group
+
+            if image_hash is not None:
+                match = next((g for h, g in perceptual_index if dhashes_match(h, image_hash)), None)
+                perceptual_index.append((image_hash, group))
+            elif digest is None and att.get('size') and att.get('name'):
+                meta_key = (att['name'].lower(), att['size'])
+                match = meta_index.get(meta_key)
+                meta_index.setdefault(meta_key, group)
+            else:
+                match = None
+            if match is not None:
+                similar[group] = match
+
+        duplicates = len(attachments) - len(groups)
+        if duplicates:
+            logger.info(f"Skipping OCR for {duplicates} duplicate attachment(s)")
+        if similar:
+            logger.info(f"Flagged {len(similar)} attachment(s) as likely duplicates")
+        return groups, similar
+
+    def _process_group_representative(self, attachment: Dict[str, Any], download=None) -> Dict[str, Any]:
+        """Analyze the first attachment of a duplicate group, reading its spooled download only now"""
+        content = None
+        if download is not None:
+            with download:
+                content = download.read()
+        return self._process_single_attachment(attachment, content)
+
+    def _fan_out_result(self, result: Dict[str, Any], attachment: Dict[str, Any],
+                        representative: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a representative's analysis onto a duplicate attachment entry"""
+        duplicate_result = dict(result)
+        duplicate_result['original_filename'] = attachment.get('name', 'unknown_file')
+        duplicate_result['file_size'] = attachment.get('size', 0)
+        duplicate_result['attachment_url'] = attachment.get('attachment_url')
+        duplicate_result['duplicate_of'] = representative.get('name', 'unknown_file')
+        return duplicate_result
+
+    def _tally_attachment_result(self, results: Dict[str, Any], att: Dict[str, Any],
+                                 result: Dict[str, Any]) -> Optional[float]:
+        """Add one attachment's result to the summary; returns its confidence if successful"""
+        results['analyzed'].append(result)
+        
+        # Update statistics
+        if 'error' in result:
+            results['statistics']['failed'] += 1
+            results['missing_documents'].append({
+                'file': att.get('filename', 'unknown'),
+                'reason': result.get('error', 'Processing failed')
+            })
+            return None
+        
+        results['statistics']['successful'] += 1
+        confidence = result.get('confidence', 0)
+        
+        # Categorize document
+        doc_name = result.get('document_name', 'Unknown')
+        category = result.get('category', 'unknown')
+        
+        # Update inventory
+        if doc_name not in results['document_inventory']:
+            results['document_inventory'][doc_name] = []
+        results['document_inventory'][doc_name].append({
+            'file_name': att.get('filename', att.get('name', 'unknown')),
+            'confidence': confidence,
+            'page_count': result.get('page_count', 1)
+        })
+        
+        # Update category summary
+        if category not in results['category_summary']:
+            results['category_summary'][category] = 0
+        results['category_summary'][category] += 1
+        
+        # Check for issues
+        if confidence < 0.5:
+            results['quality_issues'].append({
+                'document': doc_name,
+                'file': att.get('filename', 'unknown'),
+                'confidence': confidence,
+                'issue': 'Low confidence score'
+            })
+        
+        if result.get('document_type') == DocumentType.UNKNOWN:
+            results['missing_documents'].append({
+                'file': att.get('filename', 'unknown'),
+                'reason': 'Could not identify document type'
+            })
+        return confidence
+
     def analyze_all_attachments(self, attachments: List[Dict[str, Any]], 
                                progress_callback: Optional[callable] = None) -> Dict[str, Any]:
         """
-        Analyze multiple attachments with parallel processing
+        Analyze multiple attachments with parallel processing.
+
+        Byte-identical attachments are analyzed once and the result is copied
+        to every copy, so the inventory still lists each attachment. Files that
+        only look alike (e.g. a re-encoded scan, or another person's card of
+        the same design) are analyzed separately and their results carry
+        possible_duplicate_of.
         """
         start_time = time.time()
         total_attachments = len(attachments)
@@ -1287,78 +1572,52 @@ class DocumentAnalyzer:
             logger.warning("No attachments provided for analysis")
             return results
         
-        # Process attachments in parallel
+        groups, similar = self._group_duplicate_attachments(attachments)
+        
+        # Process one representative per group in parallel
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_attachment = {}
+            future_to_group = {}
             
-            for idx, att in enumerate(attachments):
-                future = executor.submit(self._process_single_attachment, att)
-                future_to_attachment[future] = (idx, att)
+            for group_idx, group in enumerate(groups):
+                representative, download = group[0]
+                future = executor.submit(propagate_cancellation(self._process_group_representative), representative, download)
+                future_to_group[future] = group_idx
             
             completed = 0
             confidence_sum = 0.0
             
-            for future in as_completed(future_to_attachment):
-                idx, att = future_to_attachment[future]
-                completed += 1
-                
-                if progress_callback:
-                    progress_callback(completed / total_attachments * 100)
+            for future in as_completed(future_to_group):
+                group_idx = future_to_group[future]
+                group = groups[group_idx]
+                representative, download = group[0]
+                if download is not None:
+                    download.close()  # in case the task failed before reading it
                 
                 try:
                     result = future.result()
-                    results['analyzed'].append(result)
-                    
-                    # Update statistics
-                    if 'error' not in result:
-                        results['statistics']['successful'] += 1
-                        confidence = result.get('confidence', 0)
-                        confidence_sum += confidence
-                        
-                        # Categorize document
-                        doc_name = result.get('document_name', 'Unknown')
-                        category = result.get('category', 'unknown')
-                        
-                        # Update inventory
-                        if doc_name not in results['document_inventory']:
-                            results['document_inventory'][doc_name] = []
-                        results['document_inventory'][doc_name].append({
-                            'file_name': att.get('filename', att.get('name', 'unknown')),
-                            'confidence': confidence,
-                            'page_count': result.get('page_count', 1)
-                        })
-                        
-                        # Update category summary
-                        if category not in results['category_summary']:
-                            results['category_summary'][category] = 0
-                        results['category_summary'][category] += 1
-                        
-                        # Check for issues
-                        if confidence < 0.5:
-                            results['quality_issues'].append({
-                                'document': doc_name,
-                                'file': att.get('filename', 'unknown'),
-                                'confidence': confidence,
-                                'issue': 'Low confidence score'
-                            })
-                        
-                        if result.get('document_type') == DocumentType.UNKNOWN:
-                            results['missing_documents'].append({
-                                'file': att.get('filename', 'unknown'),
-                                'reason': 'Could not identify document type'
-                            })
-                    else:
-                        results['statistics']['failed'] += 1
-                        results['missing_documents'].append({
-                            'file': att.get('filename', 'unknown'),
-                            'reason': result.get('error', 'Processing failed')
-                        })
-                
                 except Exception as e:
-                    logger.error(f"Error processing attachment {idx}: {str(e)}")
-                    results['statistics']['failed'] += 1
+                    logger.error(f"Error processing attachment {representative.get('name', 'unknown')}: {str(e)}")
+                    result = None
                 
-                results['statistics']['total_processed'] = completed
+                # Fan the representative's result out to every copy
+                for member_idx, (att, _) in enumerate(group):
+                    completed += 1
+                    
+                    if progress_callback:
+                        progress_callback(completed / total_attachments * 100)
+                    
+                    if result is None:
+                        results['statistics']['failed'] += 1
+                    else:
+                        member_result = result if member_idx == 0 else self._fan_out_result(result, att, representative)
+                        if group_idx in similar:
+                            member_result = dict(member_result)
+                            member_result['possible_duplicate_of'] = groups[similar[group_idx]][0][0].get('name', 'unknown_file')
+                        confidence = self._tally_attachment_result(results, att, member_result)
+                        if confidence is not None:
+                            confidence_sum += confidence
+                    
+                    results['statistics']['total_processed'] = completed
         
         # Calculate final statistics
         if results['statistics']['successful'] > 0:
@@ -1367,6 +1626,8 @@ class DocumentAnalyzer:
             )
         
         results['statistics']['processing_time'] = time.time() - start_time
+        results['statistics']['duplicates_skipped'] = total_attachments - len(groups)
+        results['statistics']['possible_duplicates'] = len(similar)
         
         # Add recommendations based on analysis
         results['recommendations'] = self._generate_recommendations(results)
@@ -1485,8 +1746,8 @@ def analyze_downloaded_attachments(ticket_id):
     """
     Download and analyze all attachments for a ticket using InsuranceDekho API
     """
-    # Download attachments to temp directory
-    temp_dir = f"temp_attachments_{ticket_id}"
+    # Download attachments to a private temp directory (removed afterwards)
+    temp_dir = tempfile.mkdtemp(prefix=f"attachments_{ticket_id}_")
     downloaded = download_all_ticket_attachments(ticket_id, temp_dir)
     
     # Initialize analyzer with InsuranceDekho API
@@ -1506,9 +1767,7 @@ def analyze_downloaded_attachments(ticket_id):
             results.append(analysis)
     
     # Clean up temp files
-    import shutil
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
     
     return results
     
@@ -2006,21 +2265,23 @@ class EnhancedContextualRoutingAnalyzer:
             }
         }
     
-    def analyze_complete_ticket_context(self, ticket_id):
+    def analyze_complete_ticket_context(self, ticket_id, ticket_context=None):
         """
         Analyze complete ticket including parent-child relationships
         Returns comprehensive understanding of ticket state
         """
+        ctx = ticket_context or TicketContext(ticket_id)
+        
         # Fetch main ticket
-        ticket_data = fetch_ticket_by_id(ticket_id)
+        ticket_data = ctx.ticket
         if not ticket_data:
             return None
         
         # Get all conversations
-        conversations = fetch_all_ticket_conversations(ticket_id)
+        conversations = ctx.conversations
         
         # Analyze parent-child relationships
-        parent_child_analysis = self._analyze_parent_child_tickets(ticket_data)
+        parent_child_analysis = self._analyze_parent_child_tickets(ticket_data, ticket_context=ctx)
         
         # Extract routing history
         routing_history = self._extract_routing_history(ticket_data, conversations)
@@ -2062,7 +2323,7 @@ class EnhancedContextualRoutingAnalyzer:
         return complete_context
 
     
-    def _analyze_parent_child_tickets(self, ticket_data):
+    def _analyze_parent_child_tickets(self, ticket_data, ticket_context=None):
         """Analyze parent-child ticket relationships with actual ticket fetching"""
         analysis = {
             'is_parent': False,
@@ -2077,25 +2338,27 @@ class EnhancedContextualRoutingAnalyzer:
         # Check if this is a parent ticket
         status = ticket_data.get('status')
         ticket_id = ticket_data.get('id')
+        ctx = ticket_context or TicketContext(ticket_id, ticket=ticket_data)
 
         if status in [10, 11, 12]:  # Parent ticket statuses
             analysis['is_parent'] = True
 
             # Fetch actual child tickets
-            child_tickets = fetch_child_tickets(ticket_id)
+            child_tickets = ctx.children
             analysis['child_tickets'] = child_tickets
 
+            # Fetch child conversations concurrently, then analyze in order
+            def child_routing_history(child):
+                child_conversations = ctx.child_context(child.get('id')).conversations
+                return self._extract_routing_history(child, child_conversations)
+
+            child_routings = freshdesk_client.map(child_routing_history, child_tickets)
+
             # Analyze each child ticket
-            for child in child_tickets:
+            for child, child_routing in zip(child_tickets, child_routings):
                 child_id = child.get('id')
                 child_status = child.get('status')
 
-                # Get child conversations for detailed analysis
-                child_conversations = fetch_all_ticket_conversations(child_id)
-
-                # Extract routing from child
-                child_routing = self._extract_routing_history(child, child_conversations)
-
                 # Summarize child ticket
                 analysis['child_ticket_summary'][child_id] = {
                     'subject': child.get('subject'),
@@ -2127,7 +2390,7 @@ class EnhancedContextualRoutingAnalyzer:
             analysis['is_child'] = True
 
             # Try to find parent ticket
-            parent_ticket = fetch_parent_ticket(ticket_data)
+            parent_ticket = ctx.parent
             if parent_ticket:
                 analysis['parent_ticket'] = parent_ticket.get('id')
                 analysis['parent_subject'] = parent_ticket.get('subject')
@@ -2556,20 +2819,21 @@ class EnhancedTicketAnalyzer:
             }
         }
 
-    def analyze_ticket_with_children(self, ticket_id):
+    def analyze_ticket_with_children(self, ticket_id, ticket_context=None):
         """Complete analysis of ticket including all child tickets"""
         print(f"Starting complete analysis for ticket {ticket_id}")
+        ctx = ticket_context or TicketContext(ticket_id)
         
         # Get main ticket
-        main_ticket = fetch_ticket_by_id(ticket_id)
+        main_ticket = ctx.ticket
         if not main_ticket:
             return {'error': f'Could not fetch ticket {ticket_id}'}
         
         # Get main ticket conversations
-        main_conversations = fetch_all_ticket_conversations(ticket_id)
+        main_conversations = ctx.conversations
         
         # Analyze main ticket
-        main_analysis = self.analyze_single_ticket(main_ticket, main_conversations, is_main=True)
+        main_analysis = self.analyze_single_ticket(main_ticket, main_conversations, is_main=True, ticket_context=ctx)
         
         # Initialize result structure
         result = {
@@ -2585,24 +2849,29 @@ class EnhancedTicketAnalyzer:
             print(f"Detected parent ticket, fetching child tickets...")
             
             # Fetch child tickets
-            child_tickets = fetch_child_tickets(ticket_id)
+            child_tickets = ctx.children
             print(f"Found {len(child_tickets)} child tickets")
             
-            # Analyze each child ticket
-            for child in child_tickets:
+            def analyze_child(child):
                 child_id = child.get('id')
                 print(f"Analyzing child ticket {child_id}")
                 
                 # Get full child ticket data and conversations
-                child_data = fetch_ticket_by_id(child_id)
-                if child_data:
-                    child_conversations = fetch_all_ticket_conversations(child_id)
-                    child_analysis = self.analyze_single_ticket(
-                        child_data, 
-                        child_conversations, 
-                        is_main=False, 
-                        parent_id=ticket_id
-                    )
+                child_ctx = ctx.child_context(child_id)
+                child_data = child_ctx.ticket
+                if not child_data:
+                    return None
+                return self.analyze_single_ticket(
+                    child_data, 
+                    child_ctx.conversations, 
+                    is_main=False, 
+                    parent_id=ticket_id,
+                    ticket_context=child_ctx
+                )
+            
+            # Analyze child tickets concurrently, keeping their original order
+            for child_analysis in freshdesk_client.map(analyze_child, child_tickets):
+                if child_analysis:
                     result['child_tickets'].append(child_analysis)
             
             # Update overall status based on child tickets
@@ -2622,7 +2891,7 @@ class EnhancedTicketAnalyzer:
         
         return result
 
-    def analyze_single_ticket(self, ticket_data, conversations, is_main=True, parent_id=None):
+    def analyze_single_ticket(self, ticket_data, conversations, is_main=True, parent_id=None, ticket_context=None):
         """Analyze a single ticket (parent or child) comprehensively"""
         ticket_id = ticket_data.get('id')
         status = ticket_data.get('status')
@@ -2635,7 +2904,10 @@ class EnhancedTicketAnalyzer:
         })
         
         # Extract content and actions
-        raw_content, actions_taken = extract_email_content_and_attachments(ticket_data, conversations)
+        if ticket_context is not None:
+            raw_content, actions_taken = ticket_context.raw_ticket_content, ticket_context.actions_taken
+        else:
+            raw_content, actions_taken = extract_email_content_and_attachments(ticket_data, conversations)
         
         # Determine where it's actually pending from (content analysis)
         actual_pending_from = self.determine_actual_pending_from(
@@ -2920,20 +3192,12 @@ class EnhancedTicketAnalyzer:
             return {'error': f'Error calculating timing: {str(e)}'}
 
     def calculate_business_hours(self, start_time, end_time):
-        """Calculate business hours between two times"""
-        # Simplified calculation - assumes 9 AM to 6 PM, Monday to Friday
-        business_hours = 0
-        current = start_time.replace(hour=9, minute=0, second=0, microsecond=0)
-        
-        while current < end_time:
-            # Check if it's a weekday
-            if current.weekday() < 5:  # Monday = 0, Friday = 4
-                # Check if within business hours
-                if 9 <= current.hour < 18:
-                    business_hours += 1
-            current += timedelta(hours=1)
-        
-        return business_hours
+        """Calculate business hours between two times (shifts, holidays and IST from the business calendar)"""
+        try:
+            return round(get_business_calendar().business_hours(start_time, end_time), 2)
+        except BusinessCalendarCoverageError as e:
+            print(f"⚠️ Business hours unavailable: {e}")
+            return None
 
     def get_last_activity(self, conversations):
         """Get information about the last activity"""
@@ -3450,7 +3714,8 @@ def process_ticket_attachments_enhanced(ticket_data: dict) -> dict:
             ticket_id = ticket_data.get('Ticket ID')
             if ticket_id:
                 print(f"DEBUG: No attachments in ticket_data, fetching for ticket {ticket_id}")
-                fresh_data = fetch_ticket_by_id(ticket_id)
+                ticket_context = ticket_data.get('ticket_context')
+                fresh_data = ticket_context.ticket if ticket_context else fetch_ticket_by_id(ticket_id)
                 if fresh_data and 'attachments' in fresh_data:
                     ticket_data['attachments'] = fresh_data['attachments']
                     print(f"DEBUG: Added {len(fresh_data['attachments'])} attachments to ticket_data")
@@ -3910,12 +4175,13 @@ def generate_all_documents_received_response(insurer_name: str, claim_type: str)
     
     return "\n".join(response_parts)
 
-def process_claims_ticket_with_documents(ticket_id: int) -> Dict:
+def process_claims_ticket_with_documents(ticket_id: int, ticket_context: Optional['TicketContext'] = None) -> Dict:
     """
     Main function to process a claims ticket and generate appropriate response
     
     Args:
         ticket_id: Freshdesk ticket ID
+        ticket_context: Optional TicketContext with data already fetched in this run
         
     Returns:
         Dict with processing results and generated response
@@ -3925,7 +4191,8 @@ def process_claims_ticket_with_documents(ticket_id: int) -> Dict:
         doc_engine = DocumentRequirementEngine()
         
         # Fetch ticket data
-        ticket_data = fetch_ticket_by_id(ticket_id)
+        ctx = ticket_context or TicketContext(ticket_id)
+        ticket_data = ctx.ticket
         if not ticket_data:
             return {
                 'success': False,
@@ -3933,9 +4200,7 @@ def process_claims_ticket_with_documents(ticket_id: int) -> Dict:
                 'ticket_id': ticket_id
             }
         
-        # Get conversations
-        conversations = fetch_all_ticket_conversations(ticket_id)
-        raw_content, actions = extract_email_content_and_attachments(ticket_data, conversations)
+        raw_content = ctx.raw_ticket_content
         
         # Prepare enriched ticket data
         enriched_ticket = {
@@ -4032,10 +4297,9 @@ def send_automated_response(ticket_id: int, response_text: str) -> bool:
             "status": 3  # Set to pending to wait for customer response
         }
         
-        response = requests.post(
+        response = freshdesk_client.post(
             url,
             json=data,
-            auth=(FRESHDESK_API_KEY, "X"),
             headers={"Content-Type": "application/json"}
         )
         
@@ -4079,10 +4343,9 @@ def update_ticket_tags(ticket_id: int, tags: List[str]) -> bool:
            "tags": tags
        }
        
-       response = requests.put(
+       response = freshdesk_client.put(
            url,
            json=data,
-           auth=(FRESHDESK_API_KEY, "X"),
            headers={"Content-Type": "application/json"}
        )
        
@@ -4271,10 +4534,9 @@ def update_ticket_status(ticket_id: int, status: int) -> bool:
            "status": status
        }
        
-       response = requests.put(
+       response = freshdesk_client.put(
            url,
            json=data,
-           auth=(FRESHDESK_API_KEY, "X"),
            headers={"Content-Type": "application/json"}
        )
        
@@ -4334,10 +4596,9 @@ Please intimate this claim to {insurer_name} and provide claim number.
            "tags": ["child_ticket", "claim_intimation", insurer_name.lower().replace(" ", "_")]
        }
        
-       response = requests.post(
+       response = freshdesk_client.post(
            url,
            json=data,
-           auth=(FRESHDESK_API_KEY, "X"),
            headers={"Content-Type": "application/json"}
        )
        
@@ -4361,7 +4622,7 @@ Please intimate this claim to {insurer_name} and provide claim number.
        }
 
 # Comprehensive workflow function
-def automated_claims_workflow(ticket_id: int) -> Dict:
+def automated_claims_workflow(ticket_id: int, ticket_context: Optional['TicketContext'] = None) -> Dict:
    """
    Complete automated workflow for claims processing
    
@@ -4374,6 +4635,7 @@ def automated_claims_workflow(ticket_id: int) -> Dict:
    
    Args:
        ticket_id: Freshdesk ticket ID
+       ticket_context: Optional TicketContext with data already fetched in this run
        
    Returns:
        Dict with complete workflow results
@@ -4387,7 +4649,7 @@ def automated_claims_workflow(ticket_id: int) -> Dict:
            'timestamp': datetime.now().isoformat()
        })
        
-       initial_result = process_claims_ticket_with_documents(ticket_id)
+       initial_result = process_claims_ticket_with_documents(ticket_id, ticket_context=ticket_context)
        
        if not initial_result['success']:
            return {
@@ -4501,7 +4763,32 @@ def automated_claims_workflow(ticket_id: int) -> Dict:
            'error': str(e),
            'workflow_log': workflow_log
        }
-       
+
+def claims_workflow_action(ticket_id, claims_analysis: Dict) -> Dict:
+    """
+    The autonomous action that runs automated_claims_workflow for a claims ticket.
+
+    The workflow replies to the customer, changes the ticket status and tags and,
+    once every document is in, creates the insurer child ticket. Ticket analysis
+    only offers it; it runs when an agent executes the action.
+    """
+    missing = claims_analysis.get('documents', {}).get('missing_required') or []
+    if missing:
+        action = f"Request {len(missing)} missing document(s) and mark the ticket pending"
+        reason = f"Missing required documents: {', '.join(missing)}"
+    else:
+        action = "Confirm receipt to the customer and create the insurer claim intimation ticket"
+        reason = "All required claim documents are attached"
+    return {
+        'type': 'RUN_CLAIMS_WORKFLOW',
+        'priority': 'HIGH',
+        'action': action,
+        'reason': reason,
+        'auto_executable': True,
+        'execution_method': 'run_claims_workflow',
+        'parameters': {'ticket_id': ticket_id}
+    }
+
 # Add intelligent document suggestions
 class DocumentSuggestionEngine:
     """Suggest required documents based on ticket context"""
@@ -4586,92 +4873,1158 @@ status_map = {
     5: "Closed"
 }
 
-# --- Global Agent Name Cache ---
-agent_name_cache = {}
-agent_cache_populated = False
+# --- Global Agent Name Cache ---
+agent_name_cache = {}
+agent_cache_populated = False
+
+# --- Initialize Claude Client ---
+# With LAZY_STARTUP (the default) the Claude client and the autonomous engines
+# are created on first use instead of at import, so the GUI opens quickly.
+# LAZY_STARTUP=false restores eager initialization.
+LAZY_STARTUP = str(_config_value('LAZY_STARTUP', 'true')).lower() not in ('0', 'false', 'no', 'off')
+
+anthropic_client = None
+_anthropic_client_initialized = False
+_anthropic_client_lock = threading.Lock()
+
+def get_anthropic_client():
+    """Return the shared Claude client, creating it on first use (None without an API key)"""
+    global anthropic_client, _anthropic_client_initialized
+    if _anthropic_client_initialized:
+        return anthropic_client
+    with _anthropic_client_lock:
+        if not _anthropic_client_initialized:
+            if CLAUDE_API_KEY:
+                try:
+                    anthropic_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+                    print("Claude client initialized successfully.")
+                except Exception as e:
+                    print(f"Error initializing Claude client: {e}. Please check your API key.")
+            else:
+                print("CLAUDE_API_KEY not found. Claude client will not be initialized.")
+            _anthropic_client_initialized = True
+    return anthropic_client
+
+if not LAZY_STARTUP:
+    get_anthropic_client()
+
+# --- Local Data Files ---
+# For Android compatibility, we need to handle file paths differently
+def get_data_path(filename):
+    """Get the path to a local data file that works on both desktop and Android"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Try different possible locations
+    possible_paths = [
+        filename,
+        os.path.join(script_dir, filename),
+        os.path.join(os.path.dirname(script_dir), filename),
+        f"/data/data/com.mycompany.id_brain/files/flet/app/{filename}"
+    ]
+    
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    
+    # If file doesn't exist, return a default path where it should be created
+    return os.path.join(script_dir, filename)
+
+def get_excel_path():
+    """Get the path to the Excel file that works on both desktop and Android"""
+    return get_data_path("ticket_summary.xlsx")
+
+EXCEL_FILE = get_excel_path()
+SUMMARY_DB_FILE = get_data_path("ticket_summary.db")
+CLAUDE_CACHE_DB_FILE = get_data_path("claude_cache.db")
+DOCUMENT_CACHE_DB_FILE = get_data_path("document_cache.db")
+BATCH_QUEUE_DB_FILE = get_data_path("batch_queue.db")
+TICKET_MIRROR_DB_FILE = get_data_path("ticket_mirror.db")
+BUSINESS_CALENDAR_FILE = get_data_path("business_calendar.json")
+
+class _SQLiteStore:
+    """
+    Base class for the local SQLite stores.
+
+    Each thread gets its own connection; the database runs in WAL mode so readers
+    never block the writer and the GUI and batch jobs can use it concurrently.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+error_log_dir = "error_logs"
+os.makedirs(error_log_dir, exist_ok=True)
+
+# --- Placeholder for Clustering Models ---
+cluster_model = None
+embedding_model = None
+
+# ========== CANCELLATION ==========
+
+class OperationCancelled(BaseException):
+    """
+    Raised inside work whose CancellationToken was cancelled.
+
+    Derives from BaseException (like asyncio.CancelledError) so the broad
+    `except Exception` fallbacks in the analysis code don't swallow it and
+    store a fallback result for work nobody is waiting for.
+    """
+
+class CancellationToken:
+    """
+    Cooperative cancellation for a ticket analysis run.
+
+    The GUI cancels the token of a search when the agent starts another one.
+    The token is made current for a thread with cancellation_scope(); Claude
+    calls, Freshdesk requests and OCR calls check it before starting, and
+    streamed Claude responses between deltas, so a cancelled run stops at the
+    next API call instead of finishing. A token created with a parent is
+    also cancelled when the parent is (e.g. one pipeline stage of a search).
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled()
+
+_cancellation_local = threading.local()
+
+def current_cancellation_token():
+    """The CancellationToken of the work running on this thread, or None"""
+    return getattr(_cancellation_local, 'token', None)
+
+@contextmanager
+def cancellation_scope(token):
+    """Make token the current cancellation token of this thread inside the block"""
+    previous = current_cancellation_token()
+    _cancellation_local.token = token
+    try:
+        yield token
+    finally:
+        _cancellation_local.token = previous
+
+def check_cancelled():
+    """Raise OperationCancelled if the current thread's work was cancelled"""
+    token = current_cancellation_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+def propagate_cancellation(func):
+    """
+    Wrap func for a worker thread so it runs under the caller's cancellation
+    token, and doesn't start at all once the token is cancelled.
+    """
+    token = current_cancellation_token()
+    if token is None:
+        return func
+
+    def run(*args, **kwargs):
+        with cancellation_scope(token):
+            token.raise_if_cancelled()
+            return func(*args, **kwargs)
+    return run
+
+# ========== BUSINESS CALENDAR ==========
+
+# Working hours used for ticket ages and TAT checks. business_calendar.json
+# (next to this file) can override them:
+#   {"timezone": "Asia/Kolkata",
+#    "shifts": {"default": {"mon-fri": ["09:00-18:00"]},
+#               "claims": {"mon-sat": ["09:00-13:00", "14:00-19:00"]}},
+#    "years": [2026],
+#    "holidays": [{"date": "2026-01-26", "name": "Republic Day"}, "2026-08-15"]}
+# A shift that ends before it starts (e.g. "22:00-06:00") runs past midnight.
+# "years" lists the years whose holidays are complete (default: the years that
+# have holidays); working time that touches any other year raises
+# BusinessCalendarCoverageError instead of silently counting holidays as workdays.
+DEFAULT_BUSINESS_TIMEZONE = 'Asia/Kolkata'
+DEFAULT_BUSINESS_SHIFTS = {'mon-fri': ['09:00-18:00']}
+_WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+_SECONDS_PER_DAY = 24 * 3600
+_IST = timezone(timedelta(hours=5, minutes=30), 'IST')
+
+def _business_timezone(name):
+    """Return the tzinfo for a zone name; IST has no DST, so a fixed offset is exact without tz data"""
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        if name not in ('Asia/Kolkata', 'Asia/Calcutta', 'IST'):
+            print(f"Warning: unknown business timezone {name!r}, using IST")
+        return _IST
+
+def _parse_clock(value):
+    """'09:30' -> seconds after midnight ('24:00' is allowed)"""
+    hours, _, minutes = value.strip().partition(':')
+    seconds = int(hours) * 3600 + int(minutes or 0) * 60
+    if not 0 <= seconds <= _SECONDS_PER_DAY:
+        raise ValueError(f"invalid time of day: {value!r}")
+    return seconds
+
+def _parse_shifts(spec):
+    """Turn {'mon-fri': ['09:00-18:00']} into sorted, merged (start, end) windows per weekday"""
+    windows = [[] for _ in range(7)]
+    for days, ranges in spec.items():
+        if isinstance(ranges, str):
+            ranges = [ranges]
+        first, _, last = days.lower().partition('-')
+        first_day = _WEEKDAY_NAMES.index(first.strip()[:3])
+        last_day = _WEEKDAY_NAMES.index((last or first).strip()[:3])
+        weekdays = [(first_day + i) % 7 for i in range((last_day - first_day) % 7 + 1)]
+        for time_range in ranges:
+            begin, end = (_parse_clock(part) for part in time_range.split('-'))
+            for weekday in weekdays:
+                if end > begin:
+                    windows[weekday].append((begin, end))
+                else:
+                    windows[weekday].append((begin, _SECONDS_PER_DAY))
+                    if end:
+                        windows[(weekday + 1) % 7].append((0, end))
+
+    merged = []
+    for day in windows:
+        day_windows = []
+        for begin, end in sorted(day):
+            if day_windows and begin <= day_windows[-1][1]:
+                day_windows[-1] = (day_windows[-1][0], max(end, day_windows[-1][1]))
+            else:
+                day_windows.append((begin, end))
+        merged.append(day_windows)
+    return merged
+
+class BusinessCalendarCoverageError(ValueError):
+    """Raised when working time is asked for a year the holiday list does not cover"""
+
+class BusinessCalendar:
+    """
+    Working time between two instants, computed in closed form.
+
+    Shift windows are kept per weekday in the business time zone. An interval
+    costs its whole weeks (one multiplication), at most six remaining whole
+    days, the two partial end days and a bisect over the sorted holidays, so a
+    six-month-old ticket is as cheap as a one-hour-old one.
+    """
+
+    def __init__(self, shifts=None, holidays=(), tz=None, years=None):
+        self.tz = tz or _business_timezone(DEFAULT_BUSINESS_TIMEZONE)
+        # Years with a complete holiday list; None means no holidays are configured
+        self.years = frozenset(int(year) for year in years) if years is not None else None
+        self.windows = _parse_shifts(shifts or DEFAULT_BUSINESS_SHIFTS)
+        self.day_seconds = [sum(end - begin for begin, end in day) for day in self.windows]
+        self.week_seconds = sum(self.day_seconds)
+        working_days = sum(1 for seconds in self.day_seconds if seconds)
+        self.working_day_seconds = self.week_seconds / working_days if working_days else 0
+
+        # Holidays as date ordinals, with prefix sums of the working time they remove
+        self.holidays = sorted({holiday.toordinal() for holiday in holidays})
+        self._holiday_set = set(self.holidays)
+        self._holiday_prefix = [0]
+        for ordinal in self.holidays:
+            self._holiday_prefix.append(self._holiday_prefix[-1] + self.day_seconds[(ordinal - 1) % 7])
+
+    def _local(self, value):
+        """Naive wall-clock time in the business zone (naive input is taken as already local)"""
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is not None:
+            value = value.astimezone(self.tz).replace(tzinfo=None)
+        return value
+
+    def _seconds_before(self, weekday, clock):
+        """Working seconds on a weekday before the given second of the day"""
+        total = 0
+        for begin, end in self.windows[weekday]:
+            if clock <= begin:
+                break
+            total += min(clock, end) - begin
+        return total
+
+    def _whole_days(self, first, last):
+        """Working seconds in the whole days with ordinals first .. last - 1"""
+        if last <= first:
+            return 0
+        weeks, rest = divmod(last - first, 7)
+        weekday = (first - 1) % 7
+        total = weeks * self.week_seconds
+        for offset in range(rest):
+            total += self.day_seconds[(weekday + offset) % 7]
+        lo = bisect_left(self.holidays, first)
+        hi = bisect_left(self.holidays, last)
+        return total - (self._holiday_prefix[hi] - self._holiday_prefix[lo])
+
+    def is_holiday(self, day):
+        return day.toordinal() in self._holiday_set
+
+    def _check_covered(self, start, end):
+        if self.years is None:
+            return
+        missing = [year for year in range(start.year, end.year + 1) if year not in self.years]
+        if missing:
+            covered = ', '.join(str(year) for year in sorted(self.years)) or 'none'
+            raise BusinessCalendarCoverageError(
+                f"business calendar has no holidays for {', '.join(map(str, missing))} "
+                f"(covered years: {covered}); add them to {os.path.basename(BUSINESS_CALENDAR_FILE)}"
+            )
+
+    def business_seconds(self, start, end):
+        """Working seconds between two datetimes or ISO strings (0 if end is not after start)"""
+        start, end = self._local(start), self._local(end)
+        if end <= start:
+            return 0.0
+        self._check_covered(start, end)
+        first, last = start.toordinal(), end.toordinal()
+        start_clock = start.hour * 3600 + start.minute * 60 + start.second + start.microsecond / 1e6
+        end_clock = end.hour * 3600 + end.minute * 60 + end.second + end.microsecond / 1e6
+
+        if first == last:
+            if first in self._holiday_set:
+                return 0.0
+            weekday = start.weekday()
+            return float(self._seconds_before(weekday, end_clock) - self._seconds_before(weekday, start_clock))
+
+        total = self._whole_days(first + 1, last)
+        if first not in self._holiday_set:
+            weekday = start.weekday()
+            total += self.day_seconds[weekday] - self._seconds_before(weekday, start_clock)
+        if last not in self._holiday_set:
+            total += self._seconds_before(end.weekday(), end_clock)
+        return float(total)
+
+    def business_hours(self, start, end):
+        return self.business_seconds(start, end) / 3600
+
+    def business_days(self, start, end):
+        """Working time as a number of average working days (for TATs given in days)"""
+        if not self.working_day_seconds:
+            return 0.0
+        return self.business_seconds(start, end) / self.working_day_seconds
+
+    def now(self):
+        return datetime.now(self.tz)
+
+def _load_business_calendar_settings(path=None):
+    """Read business_calendar.json; a missing or unreadable file gives the defaults"""
+    path = path or BUSINESS_CALENDAR_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: could not read business calendar {path}: {e}")
+        return {}
+
+def _covered_years(settings):
+    """Years the holiday list is complete for: "years" if given, else the years that have holidays"""
+    years = settings.get('years')
+    if years is None:
+        return {holiday.year for holiday in settings['holidays']} or None
+    try:
+        return {int(year) for year in years}
+    except (TypeError, ValueError):
+        print(f"Warning: ignoring invalid business calendar years {years!r}")
+        return {holiday.year for holiday in settings['holidays']} or None
+
+def _parse_holidays(entries):
+    holidays = []
+    for entry in entries or []:
+        value = entry.get('date') if isinstance(entry, dict) else entry
+        try:
+            holidays.append(datetime.strptime(str(value).strip(), '%Y-%m-%d').date())
+        except ValueError:
+            print(f"Warning: ignoring invalid holiday date {value!r}")
+    return holidays
+
+_business_calendar_settings = None
+_business_calendars = {}
+_business_calendar_lock = threading.Lock()
+
+def get_business_calendar(team=None):
+    """
+    Return the shared BusinessCalendar for a team.
+
+    Teams without their own entry under "shifts" use the "default" shifts;
+    holidays and the time zone are the same for every team.
+    """
+    global _business_calendar_settings
+    key = (team or 'default').lower()
+    calendar = _business_calendars.get(key)
+    if calendar is not None:
+        return calendar
+
+    with _business_calendar_lock:
+        if _business_calendar_settings is None:
+            settings = _load_business_calendar_settings()
+            settings['holidays'] = _parse_holidays(settings.get('holidays'))
+            settings['years'] = _covered_years(settings)
+            _business_calendar_settings = settings
+        settings = _business_calendar_settings
+        shifts = settings.get('shifts') or {}
+        if key not in shifts:
+            key = 'default'
+        if key not in _business_calendars:
+            tz = _business_timezone(settings.get('timezone') or DEFAULT_BUSINESS_TIMEZONE)
+            holidays, years = settings['holidays'], settings['years']
+            try:
+                calendar = BusinessCalendar(shifts.get(key) or DEFAULT_BUSINESS_SHIFTS, holidays, tz, years)
+            except (ValueError, AttributeError) as e:
+                print(f"Warning: invalid shifts for {key!r} in business calendar: {e}, using defaults")
+                calendar = BusinessCalendar(DEFAULT_BUSINESS_SHIFTS, holidays, tz, years)
+            _business_calendars[key] = calendar
+        _business_calendars.setdefault((team or 'default').lower(), _business_calendars[key])
+        return _business_calendars[key]
+
+def business_hours_between(start, end=None, team=None):
+    """Working hours from start to end (default: now) on the team's calendar"""
+    calendar = get_business_calendar(team)
+    return calendar.business_hours(start, end if end is not None else calendar.now())
+
+# ========== DOCUMENT ANALYSIS CACHE ==========
+
+DOCUMENT_CACHE_MAX_MB = _config_value('DOCUMENT_CACHE_MAX_MB', 200)
+
+class DocumentAnalysisCache(_SQLiteStore):
+    """
+    On-disk, content-addressed cache of document analysis results.
+
+    Whole documents are keyed by the SHA-256 of their bytes, so the same scan
+    re-attached to another ticket or conversation is served without OCR.
+    Rendered PDF pages are cached separately by the hash of the page image.
+    Both tables are evicted least-recently-used first once their stored size
+    exceeds max_bytes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS document_analysis (
+            content_hash TEXT PRIMARY KEY,
+            result_json TEXT,
+            size_bytes INTEGER,
+            created_at REAL,
+            last_used_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_document_analysis_last_used
+            ON document_analysis (last_used_at);
+        CREATE TABLE IF NOT EXISTS page_ocr (
+            page_hash TEXT PRIMARY KEY,
+            text TEXT,
+            data_json TEXT,
+            confidence REAL,
+            size_bytes INTEGER,
+            last_used_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_page_ocr_last_used
+            ON page_ocr (last_used_at);
+    """
+
+    # Result fields that depend only on the document bytes
+    RESULT_FIELDS = (
+        'document_name', 'document_type', 'category', 'confidence', 'extracted_text',
+        'extracted_data', 'page_count', 'quality_assessment', 'validation', 'suggestions', 'api_used'
+    )
+
+    def __init__(self, db_path, max_bytes=200 * 1024 * 1024):
+        super().__init__(db_path)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def get_document(self, content_hash):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT result_json FROM document_analysis WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE document_analysis SET last_used_at = ? WHERE content_hash = ?",
+                (time.time(), content_hash)
+            )
+        result = json.loads(row['result_json'])
+        result['document_type'] = DocumentType(result['document_type'])
+        return result
+
+    def put_document(self, content_hash, result):
+        cached = {field: result.get(field) for field in self.RESULT_FIELDS}
+        cached['document_type'] = getattr(cached['document_type'], 'value', cached['document_type'])
+        result_json = json.dumps(_sanitize_for_json(cached), ensure_ascii=False, default=str)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_analysis "
+                "(content_hash, result_json, size_bytes, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, result_json, len(result_json), now, now)
+            )
+            self._evict(conn, 'document_analysis', 'content_hash')
+
+    def get_page(self, page_hash):
+        """Return (text, data, confidence) for a cached page, or None"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT text, data_json, confidence FROM page_ocr WHERE page_hash = ?", (page_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE page_ocr SET last_used_at = ? WHERE page_hash = ?", (time.time(), page_hash))
+        return row['text'], json.loads(row['data_json']), row['confidence']
+
+    def put_page(self, page_hash, text, data, confidence):
+        data_json = json.dumps(data, ensure_ascii=False, default=str)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_ocr "
+                "(page_hash, text, data_json, confidence, size_bytes, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (page_hash, text, data_json, confidence, len(text) + len(data_json), time.time())
+            )
+            self._evict(conn, 'page_ocr', 'page_hash')
+
+    def _evict(self, conn, table, key_column):
+        total = conn.execute(f"SELECT COALESCE(SUM(size_bytes), 0) FROM {table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale_keys = []
+        for row in conn.execute(f"SELECT {key_column}, size_bytes FROM {table} ORDER BY last_used_at"):
+            stale_keys.append(row[0])
+            excess -= row[1] or 0
+            if excess <= 0:
+                break
+        conn.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", [(key,) for key in stale_keys])
+
+
+_document_cache = None
+_document_cache_lock = threading.Lock()
+
+def get_document_cache():
+    """Return the shared DocumentAnalysisCache (created on first use)"""
+    global _document_cache
+    with _document_cache_lock:
+        if _document_cache is None:
+            _document_cache = DocumentAnalysisCache(
+                DOCUMENT_CACHE_DB_FILE,
+                max_bytes=DOCUMENT_CACHE_MAX_MB * 1024 * 1024
+            )
+        return _document_cache
+
+# ========== CLAUDE CALLS ==========
+
+CLAUDE_CACHE_ENABLED = _config_value('CLAUDE_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+CLAUDE_CACHE_TTL_SECONDS = _config_value('CLAUDE_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+CLAUDE_CACHE_MAX_ENTRIES = _config_value('CLAUDE_CACHE_MAX_ENTRIES', 5000)
+
+class ClaudeResponseCache(_SQLiteStore):
+    """
+    On-disk cache of Claude responses keyed by a hash of the full request
+    (model, system prompt, messages, temperature and max_tokens).
+
+    Entries expire after ttl_seconds and the least recently used ones are
+    evicted once the cache holds more than max_entries. Hit/miss counts and
+    the tokens a hit would have cost are tracked for the current process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS claude_responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response_text TEXT,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            created_at REAL,
+            last_used_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_claude_responses_last_used
+            ON claude_responses (last_used_at);
+    """
+
+    def __init__(self, db_path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        super().__init__(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(request):
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss or expired entry"""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT response_text, input_tokens, output_tokens, created_at FROM claude_responses WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+        if row is not None and now - row['created_at'] > self.ttl_seconds:
+            with conn:
+                conn.execute("DELETE FROM claude_responses WHERE key = ?", (key,))
+            row = None
+
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.tokens_saved += (row['input_tokens'] or 0) + (row['output_tokens'] or 0)
+
+        with conn:
+            conn.execute("UPDATE claude_responses SET last_used_at = ? WHERE key = ?", (now, key))
+        return row['response_text']
+
+    def put(self, key, model, response_text, input_tokens=0, output_tokens=0):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO claude_responses "
+                "(key, model, response_text, input_tokens, output_tokens, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response_text, input_tokens, output_tokens, now, now)
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM claude_responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM claude_responses WHERE key IN "
+                    "(SELECT key FROM claude_responses ORDER BY last_used_at LIMIT ?)",
+                    (overflow,)
+                )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM claude_responses")
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'tokens_saved': self.tokens_saved
+            }
+        stats['entries'] = self._connect().execute("SELECT COUNT(*) FROM claude_responses").fetchone()[0]
+        return stats
+
+
+_claude_response_cache = None
+_claude_response_cache_lock = threading.Lock()
+
+def get_claude_response_cache():
+    """Return the shared ClaudeResponseCache (created on first use)"""
+    global _claude_response_cache
+    with _claude_response_cache_lock:
+        if _claude_response_cache is None:
+            _claude_response_cache = ClaudeResponseCache(
+                CLAUDE_CACHE_DB_FILE,
+                ttl_seconds=CLAUDE_CACHE_TTL_SECONDS,
+                max_entries=CLAUDE_CACHE_MAX_ENTRIES
+            )
+        return _claude_response_cache
+
+def get_claude_cache_stats():
+    """Hit rate and tokens saved by the Claude response cache"""
+    return get_claude_response_cache().stats()
+
+class ClaudeUsageLog:
+    """
+    Token usage of recent Claude API calls, including prompt-cache reads and
+    writes, plus running totals for the process.
+    """
+
+    FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
+    def __init__(self, maxlen=200):
+        self.calls = deque(maxlen=maxlen)
+        self.totals = {field: 0 for field in self.FIELDS}
+        self.total_calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, model, usage):
+        entry = {field: getattr(usage, field, 0) or 0 for field in self.FIELDS}
+        entry['model'] = model
+        entry['timestamp'] = time.time()
+        with self._lock:
+            self.calls.append(entry)
+            self.total_calls += 1
+            for field in self.FIELDS:
+                self.totals[field] += entry[field]
+        return entry
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self.totals)
+            stats = {'calls': self.total_calls, **totals, 'recent_calls': list(self.calls)}
+        prompt_tokens = totals['input_tokens'] + totals['cache_creation_input_tokens'] + totals['cache_read_input_tokens']
+        stats['prompt_cache_read_ratio'] = round(totals['cache_read_input_tokens'] / prompt_tokens, 3) if prompt_tokens else 0.0
+        return stats
+
+
+claude_usage_log = ClaudeUsageLog()
+
+def get_claude_usage_stats():
+    """Per-call and total token usage of Claude API calls, incl. prompt-cache reads/writes"""
+    return claude_usage_log.stats()
+
+def prompt_block(text, cache=False):
+    """
+    Build a text content block for a Claude message. With cache=True the block
+    ends a prompt-cache breakpoint: everything up to and including it (system
+    prompt, SOP context, ticket content) is cached by Anthropic and billed at
+    the cache-read rate when the same prefix is sent again.
+    """
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def _prepare_claude_request(messages, system, max_tokens, temperature, model, use_cache, cache_system):
+    """
+    Build the messages request and look it up in the response cache.
+    Returns (request, cache, key, cached_text); cache is None when caching is off.
+    """
+    request = {'model': model, 'max_tokens': max_tokens, 'messages': messages}
+    if system is not None:
+        if isinstance(system, str) and cache_system:
+            system = [prompt_block(system, cache=True)]
+        request['system'] = system
+    if temperature is not None:
+        request['temperature'] = temperature
+
+    if not CLAUDE_CACHE_ENABLED:
+        return request, None, None, None
+    try:
+        cache = get_claude_response_cache()
+        key = cache.make_key(request)
+        cached_text = cache.get(key) if use_cache else None
+        return request, cache, key, cached_text
+    except sqlite3.Error as e:
+        print(f"⚠️ Claude response cache unavailable: {e}")
+        return request, None, None, None
+
+def _record_claude_response(cache, key, model, text, usage):
+    """Record token usage of an API call and store its response in the cache"""
+    if usage is not None:
+        entry = claude_usage_log.record(model, usage)
+        if entry['cache_read_input_tokens'] or entry['cache_creation_input_tokens']:
+            print(f"DEBUG: Claude prompt cache read={entry['cache_read_input_tokens']} "
+                  f"write={entry['cache_creation_input_tokens']} uncached={entry['input_tokens']}")
+
+    if cache is not None:
+        try:
+            cache.put(
+                key, model, text,
+                getattr(usage, 'input_tokens', 0) or 0,
+                getattr(usage, 'output_tokens', 0) or 0
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not store Claude response in cache: {e}")
+
+def call_claude(messages, system=None, max_tokens=1000, temperature=None,
+                model="claude-3-haiku-20240307", use_cache=True, client=None, cache_system=True):
+    """
+    Send a messages request to Claude and return the response text.
+
+    All Claude call sites go through this function. Responses are served from
+    and stored in the persistent ClaudeResponseCache; use_cache=False skips the
+    cache lookup (e.g. when retrying after a bad response) but still stores the
+    fresh response. Setting CLAUDE_CACHE_ENABLED=false turns the cache off.
+
+    A string system prompt is sent as a prompt-cache breakpoint unless
+    cache_system=False; callers mark further stable prefixes with prompt_block().
+    Token usage of every API call is recorded in claude_usage_log.
+    """
+    client = client or get_anthropic_client()
+    if client is None:
+        raise RuntimeError("Claude client not initialized")
+
+    request, cache, key, cached_text = _prepare_claude_request(
+        messages, system, max_tokens, temperature, model, use_cache, cache_system
+    )
+    if cached_text is not None:
+        return cached_text
+
+    check_cancelled()
+    response = client.messages.create(**request)
+    text = response.content[0].text
+    _record_claude_response(cache, key, model, text, getattr(response, 'usage', None))
+    # The response is cached above, but a cancelled caller doesn't get it
+    check_cancelled()
+    return text
+
+def stream_claude(messages, system=None, max_tokens=1000, temperature=None,
+                  model="claude-3-haiku-20240307", use_cache=True, client=None, cache_system=True):
+    """
+    Streaming variant of call_claude: yields the response text in deltas as
+    Claude generates it. A cached response is yielded in one piece. The full
+    text is stored in the response cache once the stream completes.
+    Both functions raise OperationCancelled when the current CancellationToken
+    is cancelled; the stream is closed as soon as the next delta arrives.
+    """
+    client = client or get_anthropic_client()
+    if client is None:
+        raise RuntimeError("Claude client not initialized")
+
+    request, cache, key, cached_text = _prepare_claude_request(
+        messages, system, max_tokens, temperature, model, use_cache, cache_system
+    )
+    if cached_text is not None:
+        yield cached_text
+        return
+
+    check_cancelled()
+    parts = []
+    with client.messages.stream(**request) as stream:
+        for delta in stream.text_stream:
+            # Leaving the with block closes the connection and stops generation
+            check_cancelled()
+            parts.append(delta)
+            yield delta
+        final_message = stream.get_final_message()
+    _record_claude_response(cache, key, model, "".join(parts), getattr(final_message, 'usage', None))
+
+def _sanitize_for_json(obj):
+    """
+    Recursively walk through `obj` and convert any datetime objects to ISO‐formatted strings.
+    Works for dicts, lists, and primitives.
+    """
+    if isinstance(obj, dict):
+        return {k: _sanitize_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_sanitize_for_json(v) for v in obj]
+    elif isinstance(obj, datetime):
+        return obj.isoformat()
+    else:
+        return obj
+
+
+# ========== FRESHDESK HTTP CLIENT ==========
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread that talks to Freshdesk.
+
+    The bucket refills at the plan's per-minute quota. The X-RateLimit-Remaining
+    and Retry-After headers of each response are fed back in, so the local
+    budget never gets ahead of what the server says is left.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.capacity = max(1, int(requests_per_minute))
+        self.refill_per_second = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, reserve=0):
+        """
+        Block until a request may be sent. Background callers pass a reserve:
+        they only take a token while more than `reserve` are left, so
+        interactive requests are not starved.
+        """
+        needed = 1 + min(reserve, self.capacity - 1)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= needed:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now,
+                           (needed - self.tokens) / self.refill_per_second)
+            time.sleep(wait)
+
+    def update_from_response(self, response):
+        """Sync the bucket with the rate-limit headers Freshdesk sent back"""
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        retry_after = response.headers.get('Retry-After')
+        with self._lock:
+            now = time.monotonic()
+            if remaining is not None:
+                try:
+                    self.tokens = min(self.tokens, float(remaining))
+                except ValueError:
+                    pass
+            if retry_after is not None or response.status_code == 429:
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = 60.0
+                self.blocked_until = max(self.blocked_until, now + delay)
+                self.tokens = 0.0
+                return delay
+        return 0.0
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when an attachment download exceeds ATTACHMENT_MAX_BYTES"""
+
+
+def read_spooled_download(spool, size, memory_map=False):
+    """
+    Return the contents of a file from FreshdeskClient.download. With
+    memory_map=True a file that spilled to disk is memory-mapped instead of
+    read into memory (the map stays valid after the spooled file is closed).
+    """
+    if memory_map and size > ATTACHMENT_SPOOL_BYTES:
+        return mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+    spool.seek(0)
+    return spool.read()
+
+
+class SpooledAttachment:
+    """
+    An attachment downloaded by FreshdeskClient.download, kept in its spooled
+    file until it is analyzed. read() returns the bytes (a memory map for
+    large PDFs); close() releases the file and is safe to call twice.
+    """
+
+    def __init__(self, spool, size, is_pdf=False):
+        self.spool = spool
+        self.size = size
+        self.is_pdf = is_pdf
+
+    def read(self):
+        return read_spooled_download(self.spool, self.size, memory_map=self.is_pdf)
+
+    def close(self):
+        self.spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def filename_from_headers(headers, default='downloaded_file'):
+    """Get the file name from a Content-Disposition header"""
+    content_disposition = headers.get('Content-Disposition', '')
+    if 'filename=' in content_disposition:
+        return content_disposition.split('filename=')[1].strip('"')
+    return default
+
+
+class FreshdeskClient:
+    """
+    Single HTTP client for the Freshdesk API.
+
+    Uses one requests.Session with a keep-alive connection pool, applies a
+    default timeout to every call and paces requests through a RateLimiter.
+    429 responses are retried once the Retry-After delay has passed.
+    """
+
+    def __init__(self, domain, api_key, requests_per_minute=200, max_connections=8,
+                 timeout=30, max_retries=3, base_url=None):
+        self.api_origin = f"https://{domain}.freshdesk.com"
+        self.base_url = (base_url or self.api_origin).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+
+        self.session = requests.Session()
+        self.session.auth = (api_key, "X")
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def build_url(self, path):
+        """
+        Accept either a full URL or an API path such as /api/v2/tickets/1.
+        With a custom base_url, full URLs on the Freshdesk domain are sent there too.
+        """
+        if path.startswith(("http://", "https://")):
+            if self.base_url != self.api_origin and path.startswith(self.api_origin):
+                return self.base_url + path[len(self.api_origin):]
+            return path
+        return f"{self.base_url}{path}"
+
+    @contextmanager
+    def background(self, reserve):
+        """Requests made by this thread inside the block leave `reserve` rate-limit tokens unused"""
+        previous = getattr(self._local, 'reserve', 0)
+        self._local.reserve = reserve
+        try:
+            yield self
+        finally:
+            self._local.reserve = previous
+
+    def request(self, method, url, rate_limited=True, **kwargs):
+        """
+        Send a request and return the response (like requests.request).
+
+        rate_limited=False skips the token bucket, e.g. for attachment downloads
+        which are served from file storage and do not count against the API quota.
+        """
+        check_cancelled()
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.build_url(url)
+
+        for attempt in range(self.max_retries + 1):
+            if rate_limited:
+                self.rate_limiter.acquire(getattr(self._local, 'reserve', 0))
+            with self._slots:
+                response = self.session.request(method, url, **kwargs)
+
+            if not rate_limited:
+                return response
+
+            delay = self.rate_limiter.update_from_response(response)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+            print(f"⚠️ Freshdesk rate limit reached, retrying {method} {url} in {delay:.0f}s "
+                  f"(attempt {attempt + 1}/{self.max_retries})")
 
-# --- Initialize Claude Client ---
-anthropic_client = None
-if CLAUDE_API_KEY:
-    try:
-        anthropic_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
-        print("Claude client initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing Claude client: {e}. Please check your API key.")
-else:
-    print("CLAUDE_API_KEY not found. Claude client will not be initialized.")
+        return response
 
-# --- Excel Configuration ---
-# For Android compatibility, we need to handle file paths differently
-def get_excel_path():
-    """Get the path to the Excel file that works on both desktop and Android"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Try different possible locations
-    possible_paths = [
-        "ticket_summary.xlsx",
-        os.path.join(script_dir, "ticket_summary.xlsx"),
-        os.path.join(os.path.dirname(script_dir), "ticket_summary.xlsx"),
-        "/data/data/com.mycompany.id_brain/files/flet/app/ticket_summary.xlsx"
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return path
-    
-    # If file doesn't exist, return a default path where it should be created
-    return os.path.join(script_dir, "ticket_summary.xlsx")
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
 
-EXCEL_FILE = get_excel_path()
-error_log_dir = "error_logs"
-os.makedirs(error_log_dir, exist_ok=True)
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
 
-# --- Placeholder for Clustering Models ---
-cluster_model = None
-embedding_model = None
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
 
-def _sanitize_for_json(obj):
-    """
-    Recursively walk through `obj` and convert any datetime objects to ISO‐formatted strings.
-    Works for dicts, lists, and primitives.
-    """
-    if isinstance(obj, dict):
-        return {k: _sanitize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [_sanitize_for_json(v) for v in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    else:
-        return obj
+    def download(self, url, max_bytes=None, chunk_size=64 * 1024):
+        """
+        Stream a file (e.g. an attachment) into a SpooledTemporaryFile.
+
+        Returns (spooled_file, size, headers) with the file rewound to the start;
+        the caller must close it. Files up to ATTACHMENT_SPOOL_BYTES stay in
+        memory, larger ones spill to disk. Raises AttachmentTooLarge when the
+        file is bigger than max_bytes (ATTACHMENT_MAX_BYTES by default) and
+        requests.HTTPError for error responses.
+        """
+        max_bytes = max_bytes or ATTACHMENT_MAX_BYTES
+        response = self.get(url, rate_limited=False, stream=True)
+        try:
+            response.raise_for_status()
+            declared_size = int(response.headers.get('Content-Length') or 0)
+            if declared_size > max_bytes:
+                raise AttachmentTooLarge(f"{declared_size} bytes exceeds the {max_bytes} byte limit")
+
+            spool = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_BYTES)
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise AttachmentTooLarge(f"download exceeds the {max_bytes} byte limit")
+                    spool.write(chunk)
+            except BaseException:
+                spool.close()
+                raise
+            spool.seek(0)
+            return spool, size, response.headers
+        finally:
+            response.close()
+
+    def map(self, func, items):
+        """
+        Run func over items concurrently and return the results in input order.
+
+        The number of workers is capped by the connection pool size, and every
+        request they make still goes through the shared rate limiter, so fan-out
+        from several callers cannot exceed the Freshdesk quota.
+        """
+        items = list(items)
+        workers = min(self.max_connections, len(items))
+        if workers <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(propagate_cancellation(func), items))
+
+
+freshdesk_client = FreshdeskClient(
+    FRESHDESK_DOMAIN,
+    FRESHDESK_API_KEY,
+    requests_per_minute=FRESHDESK_RATE_LIMIT_PER_MINUTE,
+    max_connections=FRESHDESK_MAX_CONNECTIONS,
+    timeout=FRESHDESK_TIMEOUT_SECONDS,
+    base_url=FRESHDESK_BASE_URL or None
+)
 
 
 def fetch_freshdesk_tickets(page=1, per_page=30):
     """Fetches a page of tickets from Freshdesk."""
     url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets?page={page}&per_page={per_page}"
-    response = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+    response = freshdesk_client.get(url)
     if response.status_code != 200:
         print(f"❌ Failed to fetch tickets from page {page}: Status {response.status_code}, Response: {response.text}")
         return []
     return response.json()
 
-def fetch_ticket_by_id(ticket_id):
-    """Fetches a single ticket by its ID from Freshdesk."""
+def fetch_ticket_by_id(ticket_id, conversations=None):
+    """Fetches a single ticket by its ID from Freshdesk.
+
+    If the ticket's conversations were already fetched they can be passed in,
+    and the attachments are collected from them instead of another request.
+    """
     # Remove the include parameter - just fetch the ticket
     url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{ticket_id}"
     
-    r = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+    r = freshdesk_client.get(url)
     
     if r.status_code != 200:
+        print(f"❌ Failed to fetch ticket {ticket_id}: Status {r.status_code}")
         return None
     
     ticket_data = r.json()
     
-    # Fetch conversations separately (attachments are in conversations)
-    conversations_url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{ticket_id}/conversations"
-    conv_response = requests.get(conversations_url, auth=(FRESHDESK_API_KEY, "X"))
+    if conversations is None:
+        # Fetch conversations separately (attachments are in conversations)
+        conversations_url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{ticket_id}/conversations"
+        conv_response = freshdesk_client.get(conversations_url)
+        if conv_response.status_code == 200:
+            conversations = conv_response.json()
     
-    if conv_response.status_code == 200:
-        conversations = conv_response.json()
+    if conversations is not None:
         # Extract attachments from conversations
         attachments = []
         for conv in conversations:
@@ -4687,7 +6040,7 @@ def fetch_ticket_attachments_separately(ticket_id):
     print(f"DEBUG: Fetching attachments from: {url}")
     
     try:
-        r = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+        r = freshdesk_client.get(url)
         print(f"DEBUG: Attachments endpoint status: {r.status_code}")
         
         if r.status_code == 200:
@@ -4713,40 +6066,43 @@ def download_attachment(attachment_url, save_path=None):
         save_path: Optional path to save the file locally
     
     Returns:
-        Dict with file content and metadata
+        Dict with file metadata, plus the file content when it is not saved
+        to save_path (saved files are streamed to disk and not kept in memory)
     """
     try:
-        # Download the attachment
-        response = requests.get(attachment_url, auth=(FRESHDESK_API_KEY, "X"))
-        
-        if response.status_code != 200:
-            print(f"Failed to download attachment: {response.status_code}")
+        # Download the attachment in chunks, refusing files over ATTACHMENT_MAX_BYTES
+        try:
+            spool, size, headers = freshdesk_client.download(attachment_url)
+        except requests.exceptions.HTTPError as e:
+            print(f"Failed to download attachment: {e.response.status_code}")
             return None
         
-        # Get file info from headers
-        content_type = response.headers.get('Content-Type', 'unknown')
-        content_disposition = response.headers.get('Content-Disposition', '')
-        
-        # Extract filename if available
-        filename = 'unknown'
-        if 'filename=' in content_disposition:
-            filename = content_disposition.split('filename=')[1].strip('"')
-        
-        result = {
-            'content': response.content,
-            'content_type': content_type,
-            'filename': filename,
-            'size': len(response.content)
-        }
-        
-        # Save locally if path provided
-        if save_path:
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
-            result['saved_to'] = save_path
+        with spool:
+            # Get file info from headers
+            content_type = headers.get('Content-Type', 'unknown')
+            
+            # Extract filename if available
+            filename = filename_from_headers(headers, default='unknown')
+            
+            result = {
+                'content_type': content_type,
+                'filename': filename,
+                'size': size
+            }
+            
+            # Save locally if path provided
+            if save_path:
+                with open(save_path, 'wb') as f:
+                    shutil.copyfileobj(spool, f)
+                result['saved_to'] = save_path
+            else:
+                result['content'] = read_spooled_download(spool, size)
         
         return result
         
+    except AttachmentTooLarge as e:
+        print(f"Skipping attachment {attachment_url}: {e}")
+        return None
     except Exception as e:
         print(f"Error downloading attachment: {e}")
         return None
@@ -4805,8 +6161,8 @@ def analyze_downloaded_attachments(ticket_id):
     """
     Download and analyze all attachments for a ticket
     """
-    # Download attachments to temp directory
-    temp_dir = f"temp_attachments_{ticket_id}"
+    # Download attachments to a private temp directory (removed afterwards)
+    temp_dir = tempfile.mkdtemp(prefix=f"attachments_{ticket_id}_")
     downloaded = download_all_ticket_attachments(ticket_id, temp_dir)
     
     # Initialize analyzer
@@ -4827,9 +6183,7 @@ def analyze_downloaded_attachments(ticket_id):
             results.append(analysis)
     
     # Clean up temp files
-    import shutil
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
     
     return results
 
@@ -4838,7 +6192,7 @@ def analyze_downloaded_attachments(ticket_id):
 def fetch_ticket_conversations(ticket_id, page=1):
     """Fetches a single page of conversations for a given ticket."""
     url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{ticket_id}/conversations?page={page}"
-    response = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+    response = freshdesk_client.get(url)
     print(f"DEBUG: Response Status Code for conversations of {ticket_id}, page {page}: {response.status_code}")
     if response.status_code != 200:
         print(f"⚠️ Could not fetch conversations for {ticket_id} on page {page}. Response: {response.text}")
@@ -4853,11 +6207,12 @@ def fetch_ticket_conversations(ticket_id, page=1):
     
     return conversations
 
-def fetch_all_ticket_conversations(ticket_id):
+def fetch_all_ticket_conversations(ticket_id, start_page=1):
     """Fetches all conversation pages for a given Freshdesk ticket by handling pagination.
-    Each conversation includes created_at and updated_at timestamps."""
+    Each conversation includes created_at and updated_at timestamps.
+    Pages before start_page are skipped (used for incremental refreshes)."""
     all_conversations = []
-    page = 1
+    page = start_page
     per_page_limit = 30 
 
     print(f"DEBUG: Starting to fetch all conversations for ticket ID: {ticket_id}")
@@ -4866,9 +6221,8 @@ def fetch_all_ticket_conversations(ticket_id):
         url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{ticket_id}/conversations?page={page}"
         
         try:
-            response = requests.get(
+            response = freshdesk_client.get(
                 url,
-                auth=(FRESHDESK_API_KEY, 'X'),
                 headers={"Content-Type": "application/json"}
             )
             response.raise_for_status()
@@ -4907,6 +6261,31 @@ def fetch_all_ticket_conversations(ticket_id):
     
     return all_conversations
 
+CONVERSATIONS_PER_PAGE = 30
+
+def fetch_ticket_conversations_since(ticket_id, known_conversations):
+    """
+    Fetches only the conversations added after known_conversations.
+
+    Conversations are returned oldest first, 30 per page, so fetching starts on
+    the page that holds the last known conversation. If that conversation is
+    not found there (conversations were deleted and the pages shifted) all
+    pages are fetched instead. Returns the new conversations only.
+    """
+    if not known_conversations:
+        return fetch_all_ticket_conversations(ticket_id)
+
+    known_ids = {conv.get('id') for conv in known_conversations}
+    last_known_id = known_conversations[-1].get('id')
+    start_page = (len(known_conversations) - 1) // CONVERSATIONS_PER_PAGE + 1
+
+    conversations = fetch_all_ticket_conversations(ticket_id, start_page=start_page)
+    if start_page > 1 and not any(conv.get('id') == last_known_id for conv in conversations):
+        print(f"DEBUG: Conversation pages shifted for ticket {ticket_id}, fetching all pages.")
+        conversations = fetch_all_ticket_conversations(ticket_id)
+
+    return [conv for conv in conversations if conv.get('id') not in known_ids]
+
 def process_conversation_timestamps(conversations):
     """Helper function to extract and process timestamp information from conversations."""
     from datetime import datetime
@@ -4942,7 +6321,7 @@ def fetch_child_tickets(parent_ticket_id):
     try:
         # 1) Preferred: Call the dedicated endpoint
         url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{parent_ticket_id}/associated_tickets"
-        resp = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+        resp = freshdesk_client.get(url)
         resp.raise_for_status()
         children = resp.json().get("tickets", [])
         if children:
@@ -4951,23 +6330,21 @@ def fetch_child_tickets(parent_ticket_id):
 
         # 2) Fallback: Read the parent’s associated_tickets_list field
         url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{parent_ticket_id}"
-        resp = requests.get(
+        resp = freshdesk_client.get(
             url,
             params={"include": "conversations"},   # optional includes
-            auth=(FRESHDESK_API_KEY, "X"),
         )
         resp.raise_for_status()
         parent = resp.json()
         if parent.get("association_type") == 1:
             child_ids = parent.get("associated_tickets_list", [])
-            children = []
-            for cid in child_ids:
-                c = requests.get(
-                    f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets/{cid}",
-                    auth=(FRESHDESK_API_KEY, "X"),
-                )
+
+            def fetch_child(cid):
+                c = freshdesk_client.get(f"/api/v2/tickets/{cid}")
                 c.raise_for_status()
-                children.append(c.json())
+                return c.json()
+
+            children = freshdesk_client.map(fetch_child, child_ids)
             print(f"Found {len(children)} child tickets via associated_tickets_list")
             return children
 
@@ -5003,17 +6380,24 @@ def fetch_parent_ticket(child_ticket_data):
         print(f"Error fetching parent ticket: {e}")
         return None
     
+# Agent names rarely change, so successful lookups are kept for the whole session
+_agent_names = {}
+
 def get_agent_name_from_id(agent_id):
     """Fetches the name of a Freshdesk agent given their ID."""
     if not agent_id:
         return "Unassigned"
+    if agent_id in _agent_names:
+        return _agent_names[agent_id]
 
     url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/agents/{agent_id}"
     try:
-        response = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
+        response = freshdesk_client.get(url)
         if response.status_code == 200:
             agent_data = response.json()
-            return f"{agent_data.get('first_name', '')} {agent_data.get('last_name', '')}".strip()
+            name = f"{agent_data.get('first_name', '')} {agent_data.get('last_name', '')}".strip()
+            _agent_names[agent_id] = name
+            return name
         else:
             print(f"⚠️ Error fetching agent {agent_id}: Status {response.status_code}, Response: {response.text}")
             return "Unknown Agent"
@@ -5021,6 +6405,407 @@ def get_agent_name_from_id(agent_id):
         print(f"❌ Network error fetching agent {agent_id}: {e}")
         return "Network Error Agent"
 
+# ========== LOCAL TICKET MIRROR ==========
+
+# A background worker polls Freshdesk for tickets updated since its last run
+# and keeps them, with their conversations, in ticket_mirror.db. TicketContext
+# reads the mirror first, so recently touched tickets open without API calls.
+TICKET_SYNC_ENABLED = str(_config_value('TICKET_SYNC_ENABLED', 'true')).lower() not in ('0', 'false', 'no', 'off')
+TICKET_SYNC_INTERVAL_SECONDS = _config_value('TICKET_SYNC_INTERVAL_SECONDS', 60)
+TICKET_SYNC_INITIAL_DAYS = _config_value('TICKET_SYNC_INITIAL_DAYS', 3)
+# Rate-limit tokens the sync worker leaves for interactive requests
+TICKET_SYNC_TOKEN_RESERVE = _config_value('TICKET_SYNC_TOKEN_RESERVE', 40)
+# Freshdesk attachment URLs expire; older mirrored tickets with attachments are refetched
+TICKET_MIRROR_ATTACHMENT_URL_MAX_AGE = _config_value('TICKET_MIRROR_ATTACHMENT_URL_MAX_AGE', 1800)
+TICKET_SYNC_PER_PAGE = 100
+# The ticket list endpoint stops at page 300; the sync then restarts from the last updated_at
+TICKET_SYNC_MAX_PAGES = 300
+
+class TicketMirrorStore(_SQLiteStore):
+    """
+    Local copy of recently updated tickets and their conversations.
+
+    Only the sync worker and TicketContext write to it. The mirror is trusted
+    while the last successful sync is recent (see is_current), because any
+    ticket changed before that sync started has been pulled again.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mirror_tickets (
+            ticket_id TEXT PRIMARY KEY,
+            updated_at TEXT,
+            ticket TEXT,
+            conversations TEXT,
+            fetched_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS mirror_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def get(self, ticket_id):
+        """Return (ticket, conversations, fetched_at) or None"""
+        row = self._connect().execute(
+            "SELECT ticket, conversations, fetched_at FROM mirror_tickets WHERE ticket_id = ?", (str(ticket_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row['ticket']), json.loads(row['conversations']), row['fetched_at']
+
+    def get_updated_at(self, ticket_id):
+        row = self._connect().execute(
+            "SELECT updated_at FROM mirror_tickets WHERE ticket_id = ?", (str(ticket_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, ticket, conversations):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO mirror_tickets (ticket_id, updated_at, ticket, conversations, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(ticket['id']), ticket.get('updated_at'), json.dumps(ticket), json.dumps(conversations), time.time())
+            )
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM mirror_tickets").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self._connect().execute("SELECT value FROM mirror_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO mirror_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def is_current(self, max_age=None):
+        """True if a sync finished recently enough for the mirror to be trusted"""
+        max_age = max_age or 3 * TICKET_SYNC_INTERVAL_SECONDS
+        synced_at = self.get_meta('last_sync_started_at')
+        return synced_at is not None and time.time() - float(synced_at) <= max_age
+
+_ticket_mirror = None
+_ticket_mirror_lock = threading.Lock()
+
+def get_ticket_mirror():
+    """Return the shared TicketMirrorStore"""
+    global _ticket_mirror
+    with _ticket_mirror_lock:
+        if _ticket_mirror is None:
+            _ticket_mirror = TicketMirrorStore(TICKET_MIRROR_DB_FILE)
+        return _ticket_mirror
+
+def read_mirrored_ticket(ticket_id):
+    """Return (ticket, conversations) from the mirror if it can be trusted, else None"""
+    if not TICKET_SYNC_ENABLED:
+        return None
+    try:
+        mirror = get_ticket_mirror()
+        if not mirror.is_current():
+            return None
+        record = mirror.get(ticket_id)
+    except Exception as e:
+        print(f"⚠️ Error reading ticket mirror: {e}")
+        return None
+    if record is None:
+        return None
+    ticket, conversations, fetched_at = record
+    if ticket.get('attachments') and time.time() - fetched_at > TICKET_MIRROR_ATTACHMENT_URL_MAX_AGE:
+        return None
+    print(f"DEBUG: Ticket {ticket_id} loaded from the local mirror.")
+    return ticket, conversations
+
+def fetch_updated_tickets(updated_since, page=1):
+    """Fetches a page of tickets updated since an ISO timestamp, oldest update first."""
+    response = freshdesk_client.get(
+        f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/tickets",
+        params={
+            'updated_since': updated_since,
+            'order_by': 'updated_at',
+            'order_type': 'asc',
+            'include': 'description',
+            'per_page': TICKET_SYNC_PER_PAGE,
+            'page': page
+        }
+    )
+    if response.status_code != 200:
+        print(f"❌ Failed to fetch updated tickets (page {page}): Status {response.status_code}, Response: {response.text}")
+        return None
+    return response.json()
+
+class TicketSyncWorker:
+    """
+    Polls Freshdesk for tickets updated since the last run and stores them,
+    with their conversations, in the TicketMirrorStore.
+
+    Each pass asks for updated_since=<newest updated_at seen> ordered by
+    updated_at, so an interrupted pass resumes where it stopped. Conversations
+    are fetched incrementally for tickets already in the mirror. All calls go
+    through the shared freshdesk_client and leave TICKET_SYNC_TOKEN_RESERVE
+    rate-limit tokens for the GUI.
+    """
+
+    def __init__(self, interval=None, store=None, reserve=None):
+        self.interval = interval or TICKET_SYNC_INTERVAL_SECONDS
+        self.store = store or get_ticket_mirror()
+        self.reserve = TICKET_SYNC_TOKEN_RESERVE if reserve is None else reserve
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ticket-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.last_result = self.sync_once()
+            except Exception as e:
+                print(f"❌ Ticket sync failed: {e}")
+                self.last_result = {'error': str(e)}
+            self._stop.wait(self.interval)
+
+    def sync_once(self):
+        """Pull every ticket updated since the last pass; returns counts for the pass"""
+        started_at = time.time()
+        updated_since = self.store.get_meta('updated_since')
+        if not updated_since:
+            since = datetime.utcnow() - timedelta(days=TICKET_SYNC_INITIAL_DAYS)
+            updated_since = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        synced = 0
+        unchanged = 0
+        page = 1
+        with freshdesk_client.background(self.reserve):
+            while not self._stop.is_set():
+                tickets = fetch_updated_tickets(updated_since, page)
+                if tickets is None:
+                    return {'error': 'Ticket list request failed', 'synced': synced}
+
+                for ticket in tickets:
+                    if self.store.get_updated_at(ticket['id']) == ticket.get('updated_at'):
+                        unchanged += 1
+                        continue
+                    self._sync_ticket(ticket)
+                    synced += 1
+
+                if tickets:
+                    # Freshdesk compares updated_since inclusively, so the newest
+                    # ticket comes back once more next time and is skipped as unchanged
+                    self.store.set_meta('updated_since', tickets[-1]['updated_at'])
+
+                if len(tickets) < TICKET_SYNC_PER_PAGE:
+                    self.store.set_meta('last_sync_started_at', started_at)
+                    break
+                page += 1
+                if page > TICKET_SYNC_MAX_PAGES:
+                    updated_since, page = tickets[-1]['updated_at'], 1
+
+        result = {'synced': synced, 'unchanged': unchanged, 'seconds': round(time.time() - started_at, 1)}
+        if synced:
+            print(f"Ticket sync: {synced} updated tickets mirrored in {result['seconds']}s")
+        return result
+
+    def _sync_ticket(self, ticket):
+        ticket_id = ticket['id']
+        record = self.store.get(ticket_id)
+        # Mirrored attachment URLs may have expired, so those tickets are fetched in full
+        if record is not None and not any(conv.get('attachments') for conv in record[1]):
+            conversations = record[1] + fetch_ticket_conversations_since(ticket_id, record[1])
+        else:
+            conversations = fetch_all_ticket_conversations(ticket_id)
+        # Same shape as fetch_ticket_by_id: attachments are collected from the conversations
+        ticket['attachments'] = [att for conv in conversations for att in conv.get('attachments', [])]
+        self.store.put(ticket, conversations)
+
+_ticket_sync_worker = None
+_ticket_sync_lock = threading.Lock()
+
+def start_ticket_sync(interval=None):
+    """Start the background ticket sync (once per process) and return the worker"""
+    global _ticket_sync_worker
+    if not TICKET_SYNC_ENABLED:
+        return None
+    with _ticket_sync_lock:
+        if _ticket_sync_worker is None:
+            _ticket_sync_worker = TicketSyncWorker(interval=interval)
+    return _ticket_sync_worker.start()
+
+def stop_ticket_sync():
+    if _ticket_sync_worker is not None:
+        _ticket_sync_worker.stop()
+
+# ========== PER-RUN TICKET CONTEXT ==========
+
+class TicketContext:
+    """
+    Request-scoped cache of the Freshdesk data for a single ticket.
+
+    process_ticket_id_enhanced creates one context per run and passes it to every
+    stage, so the ticket, its conversations, child and parent tickets and the
+    extracted raw content are fetched once instead of once per stage. Values are
+    loaded lazily on first access and the object can be shared between threads.
+    """
+
+    def __init__(self, ticket_id, ticket=None, conversations=None):
+        self.ticket_id = ticket_id
+        self._values = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._child_contexts = {}
+        if ticket is not None:
+            self._values['ticket'] = ticket
+        if conversations is not None:
+            self._values['conversations'] = conversations
+
+    def _load(self, key, loader):
+        """Return a cached value, calling loader() only the first time"""
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._values:
+                self._values[key] = loader()
+            return self._values[key]
+
+    def _mirrored(self):
+        """(ticket, conversations) from the local ticket mirror, or None"""
+        return self._load('mirror', lambda: read_mirrored_ticket(self.ticket_id))
+
+    def _fetch_conversations(self):
+        mirrored = self._mirrored()
+        if mirrored is not None:
+            return mirrored[1]
+        return fetch_all_ticket_conversations(self.ticket_id)
+
+    def _fetch_ticket(self):
+        mirrored = self._mirrored()
+        if mirrored is not None:
+            return mirrored[0]
+        # Attachments are collected from the already fetched conversations
+        return fetch_ticket_by_id(self.ticket_id, conversations=self.conversations)
+
+    @property
+    def conversations(self):
+        return self._load('conversations', self._fetch_conversations)
+
+    @property
+    def ticket(self):
+        return self._load('ticket', self._fetch_ticket)
+
+    def _extract_content(self):
+        if not self.ticket:
+            return "", ""
+        return extract_email_content_and_attachments(self.ticket, self.conversations)
+
+    @property
+    def raw_ticket_content(self):
+        return self._load('content', self._extract_content)[0]
+
+    @property
+    def actions_taken(self):
+        return self._load('content', self._extract_content)[1]
+
+    @property
+    def children(self):
+        return self._load('children', lambda: fetch_child_tickets(self.ticket_id))
+
+    @property
+    def parent(self):
+        return self._load('parent', lambda: fetch_parent_ticket(self.ticket) if self.ticket else None)
+
+    def load_since_watermark(self, watermark):
+        """
+        Load the ticket and conversations on top of a stored TicketSummaryStore
+        watermark and return the conversations added since it was written.
+
+        When the watermark carries the conversations of the earlier run, the
+        ticket is fetched with those and the conversation pages are only read
+        if the ticket's updated_at has moved. Otherwise everything is loaded
+        (from the ticket mirror when it has the ticket) and compared against
+        the last conversation id.
+        """
+        known = watermark.get('conversations')
+        if known is not None and self._mirrored() is None:
+            # Only readers of the ticket and its conversations wait for the HTTP
+            # calls below (through their key locks, taken in the same order as
+            # _fetch_ticket does); the context lock is held just to check and merge
+            with self._lock:
+                ticket_lock = self._key_locks.setdefault('ticket', threading.Lock())
+                conversations_lock = self._key_locks.setdefault('conversations', threading.Lock())
+            with ticket_lock, conversations_lock:
+                with self._lock:
+                    preloaded = 'ticket' in self._values or 'conversations' in self._values
+                if not preloaded:
+                    ticket = fetch_ticket_by_id(self.ticket_id, conversations=known)
+                    new_conversations = []
+                    if ticket and ticket.get('updated_at') != watermark.get('ticket_updated_at'):
+                        new_conversations = fetch_ticket_conversations_since(self.ticket_id, known)
+                        ticket['attachments'] = [
+                            att for conv in known + new_conversations for att in conv.get('attachments', [])
+                        ]
+                    with self._lock:
+                        self._values['ticket'] = ticket
+                        self._values['conversations'] = known + new_conversations
+                    return new_conversations
+
+        ticket = self.ticket
+        if ticket and ticket.get('updated_at') == watermark.get('ticket_updated_at'):
+            return []
+        last_id = watermark.get('last_conversation_id') or 0
+        return [conv for conv in self.conversations if (conv.get('id') or 0) > last_id]
+
+    def child_context(self, child_id):
+        """Get the (shared) context for one of this ticket's children"""
+        with self._lock:
+            if child_id not in self._child_contexts:
+                self._child_contexts[child_id] = TicketContext(child_id)
+            return self._child_contexts[child_id]
+
+
+class StageTimer:
+    """
+    Wall time per pipeline stage for one ticket run.
+
+    lap(stage) books the time since the previous lap to that stage. The batch
+    engine installs a timer per worker thread; the processing functions call
+    stage_lap() at their stage boundaries, which does nothing outside a batch.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.time()
+
+    def lap(self, stage):
+        now = time.time()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+_stage_timer_local = threading.local()
+
+def add_stage_time(stage, seconds):
+    """Book time measured elsewhere (e.g. a pipeline stage on another thread) to the current StageTimer"""
+    timer = getattr(_stage_timer_local, 'timer', None)
+    if timer is not None:
+        timer.timings[stage] = timer.timings.get(stage, 0.0) + seconds
+
+def stage_lap(stage):
+    """Record the end of a stage on the current thread's StageTimer, if any"""
+    timer = getattr(_stage_timer_local, 'timer', None)
+    if timer is not None:
+        timer.lap(stage)
+
+
 def classify_error_type(text):
     """Original classification function - kept as fallback."""
     text_lower = text.lower()
@@ -5049,65 +6834,245 @@ def classify_error_type(text):
 
     return "Uncategorized"
 
-def initialize_excel_if_needed():
-    """Creates the Excel file and header row if it doesn't exist."""
-    if not os.path.exists(EXCEL_FILE):
-        wb = Workbook()
+# ========== TICKET SUMMARY STORE ==========
+
+class TicketSummaryStore(_SQLiteStore):
+    """
+    Processed ticket summaries keyed by ticket id.
+
+    Holds the same columns as the old ticket_summary.xlsx workbook. The legacy
+    workbook can be imported with import_excel() and the table written back to
+    Excel or CSV with export() for anyone who still works from the spreadsheet.
+    """
+
+    COLUMNS = ["Ticket ID", "Subject", "Problem", "Why", "Solution", "Classification", "Cluster"]
+    FIELDS = ["ticket_id", "subject", "problem", "why", "solution", "classification", "cluster"]
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ticket_summary (
+            ticket_id TEXT PRIMARY KEY,
+            subject TEXT,
+            problem TEXT,
+            why TEXT,
+            solution TEXT,
+            classification TEXT,
+            cluster TEXT,
+            updated_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ticket_watermarks (
+            ticket_id TEXT PRIMARY KEY,
+            ticket_updated_at TEXT,
+            last_conversation_id INTEGER,
+            conversation_count INTEGER,
+            conversations TEXT,
+            updated_at TEXT
+        );
+    """
+
+    def get(self, ticket_id):
+        """Return the stored summary for a ticket (workbook column names) or None"""
+        row = self._connect().execute(
+            "SELECT * FROM ticket_summary WHERE ticket_id = ?", (str(ticket_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {column: row[field] for column, field in zip(self.COLUMNS, self.FIELDS)}
+
+    def ticket_ids(self):
+        """Return the set of processed ticket ids"""
+        rows = self._connect().execute("SELECT ticket_id FROM ticket_summary").fetchall()
+        return {row[0] for row in rows}
+
+    def save(self, row):
+        """Insert or replace a summary row given in workbook column order"""
+        values = [str(row[0])] + [_flatten_cell(v) for v in row[1:len(self.FIELDS)]]
+        values += [""] * (len(self.FIELDS) - len(values))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO ticket_summary ({', '.join(self.FIELDS)}, updated_at) "
+                f"VALUES ({', '.join('?' * len(self.FIELDS))}, ?)",
+                values + [datetime.now().isoformat()]
+            )
+
+    def get_watermark(self, ticket_id):
+        """
+        Return what the stored summary of a ticket covers: the ticket's
+        updated_at, the last conversation id and (when kept) the conversations
+        themselves. None for tickets summarized before watermarks existed.
+        """
+        row = self._connect().execute(
+            "SELECT * FROM ticket_watermarks WHERE ticket_id = ?", (str(ticket_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'ticket_updated_at': row['ticket_updated_at'],
+            'last_conversation_id': row['last_conversation_id'],
+            'conversation_count': row['conversation_count'],
+            'conversations': json.loads(row['conversations']) if row['conversations'] else None
+        }
+
+    def save_watermark(self, ticket_id, ticket_updated_at, conversations):
+        """
+        Record the ticket updated_at and conversations a summary was built from.
+
+        The conversations are kept (without the HTML body when body_text is
+        present) so the next refresh only fetches newer ones. Conversations with
+        attachments are not kept, because Freshdesk attachment URLs expire.
+        """
+        conversations = conversations or []
+        stored = None
+        if not any(conv.get('attachments') for conv in conversations):
+            stored = json.dumps([
+                {k: v for k, v in conv.items() if not (k == 'body' and conv.get('body_text'))}
+                for conv in conversations
+            ])
+        last_id = max((conv.get('id') or 0 for conv in conversations), default=0)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ticket_watermarks "
+                "(ticket_id, ticket_updated_at, last_conversation_id, conversation_count, conversations, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(ticket_id), ticket_updated_at, last_id, len(conversations), stored, datetime.now().isoformat())
+            )
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM ticket_summary").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def import_excel(self, excel_path):
+        """
+        Import rows from a ticket_summary.xlsx workbook.
+
+        Rows for tickets that are already in the store are skipped, and the first
+        row wins for duplicate ids (the old Excel lookup returned the first match).
+        Returns the number of imported rows.
+        """
+        from openpyxl import load_workbook
+
+        wb = load_workbook(excel_path, read_only=True)
         ws = wb.active
-        ws.title = "Summary"
-        ws.append(["Ticket ID", "Subject", "Problem", "Why", "Solution", "Classification", "Cluster"])
-        wb.save(EXCEL_FILE)
+        rows = []
+        for r in ws.iter_rows(min_row=2, values_only=True):
+            if not r or r[0] is None:
+                continue
+            values = [str(r[0])] + ["" if v is None else str(v) for v in r[1:len(self.FIELDS)]]
+            values += [""] * (len(self.FIELDS) - len(values))
+            rows.append(values + [datetime.now().isoformat()])
+        wb.close()
+
+        conn = self._connect()
+        before = self.count()
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO ticket_summary ({', '.join(self.FIELDS)}, updated_at) "
+                f"VALUES ({', '.join('?' * len(self.FIELDS))}, ?)",
+                rows
+            )
+        return self.count() - before
+
+    def export(self, path):
+        """Write every summary to an .xlsx or .csv file (chosen by extension)"""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(self.FIELDS)} FROM ticket_summary ORDER BY updated_at"
+        ).fetchall()
+
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.COLUMNS)
+                writer.writerows(tuple(r) for r in rows)
+        else:
+            from openpyxl import Workbook
+
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Summary")
+            ws.append(self.COLUMNS)
+            for r in rows:
+                ws.append(list(r))
+            wb.save(path)
+        return path
+
+
+def _flatten_cell(item):
+    if isinstance(item, list):
+        return ", ".join(str(i) for i in item)
+    return str(item)
+
+_summary_store = None
+_summary_store_lock = threading.Lock()
+
+def get_summary_store():
+    """Return the shared TicketSummaryStore, importing the legacy workbook the first time"""
+    global _summary_store
+    with _summary_store_lock:
+        if _summary_store is None:
+            store = TicketSummaryStore(SUMMARY_DB_FILE)
+            if not store.get_meta('excel_imported') and os.path.exists(EXCEL_FILE):
+                from openpyxl.utils.exceptions import InvalidFileException
+                try:
+                    imported = store.import_excel(EXCEL_FILE)
+                    print(f"Imported {imported} ticket summaries from {EXCEL_FILE}")
+                    # Only a completed import is recorded; a failed one is retried on the next start
+                    store.set_meta('excel_imported', datetime.now().isoformat())
+                except InvalidFileException:
+                    print("❌ Invalid Excel file path or corrupted file. Please check if the file is open or damaged.")
+                except Exception as e:
+                    print(f"❌ Error importing Excel summaries: {e}")
+            _summary_store = store
+        return _summary_store
+
+def export_ticket_summaries(path=None):
+    """Export the summary store to Excel (default: ticket_summary.xlsx) or CSV."""
+    return get_summary_store().export(path or EXCEL_FILE)
+
+# The functions below keep the old Excel-based API working on top of the store.
+
+def initialize_excel_if_needed():
+    """Makes sure the summary store exists (importing the legacy Excel file once)."""
+    get_summary_store()
 
 def get_processed_ticket_ids():
-    """Returns a set of ticket IDs already processed in the Excel file."""
-    initialize_excel_if_needed()
-    wb = load_workbook(EXCEL_FILE)
-    ws = wb.active
-    return {str(r[0].value) for r in ws.iter_rows(min_row=2) if r[0].value}
+    """Returns a set of ticket IDs already processed."""
+    return get_summary_store().ticket_ids()
 
 def append_to_excel(row):
-    """Appends a row of data to the Excel summary file."""
-    def sanitize(item):
-        if isinstance(item, list):
-            return ", ".join(str(i) for i in item)
-        return str(item)
-    row = [sanitize(cell) for cell in row]
+    """Saves a summary row (Ticket ID, Subject, Problem, Why, Solution, Classification, Cluster)."""
     try:
-        initialize_excel_if_needed()
-        wb = load_workbook(EXCEL_FILE)
-        ws = wb.active
-        ws.append(row)
-        wb.save(EXCEL_FILE)
-    except InvalidFileException:
-        print("❌ Invalid Excel file path or corrupted file. Please check if the file is open or damaged.")
+        get_summary_store().save(row)
+    except Exception as e:
+        print(f"❌ Error saving ticket summary: {e}")
+
+def save_summary_watermark(ticket_id, ticket_data, conversations):
+    """Records which ticket update and conversations the stored summary covers."""
+    try:
+        get_summary_store().save_watermark(ticket_id, ticket_data.get("updated_at"), conversations)
     except Exception as e:
-        print(f"❌ Error appending to Excel: {e}")
+        print(f"❌ Error saving summary watermark: {e}")
 
 def search_ticket_in_excel(ticket_id):
-    """Searches for a ticket ID in the Excel file and returns its summary if found."""
-    initialize_excel_if_needed()
-    if not os.path.exists(EXCEL_FILE):
-        print(f"Excel file not found at {EXCEL_FILE}. Cannot search.")
-        return None
-    wb = load_workbook(EXCEL_FILE)
-    ws = wb.active
-    for r in ws.iter_rows(min_row=2):
-        if str(r[0].value) == str(ticket_id):
-            return {
-                "Ticket ID": r[0].value,
-                "Subject": r[1].value,
-                "Problem": r[2].value,
-                "Why": r[3].value,
-                "Solution": r[4].value,
-                "Classification": r[5].value,
-                "Cluster": r[6].value,
-            }
-    return None
+    """Returns the stored summary for a ticket ID if it was already processed."""
+    return get_summary_store().get(ticket_id)
 
 def clean_html(raw):
     """Removes HTML tags from a string."""
     if not raw:
         return ""
+    from bs4 import BeautifulSoup
     return BeautifulSoup(raw, "html.parser").get_text(separator=" ", strip=True)
 
 def preprocess_image(img):
@@ -5122,20 +7087,25 @@ def flatten(v):
 def process_attachment(att):
     """Processes an attachment."""
     url = att.get("attachment_url")
-    r = requests.get(url, auth=(FRESHDESK_API_KEY, "X"))
-    if r.status_code != 200:
-        print(f"⚠️ Failed to download attachment from {url}: Status {r.status_code}")
+    try:
+        spool, size, headers = freshdesk_client.download(url)
+    except requests.exceptions.HTTPError as e:
+        print(f"⚠️ Failed to download attachment from {url}: Status {e.response.status_code}")
         return ""
-    if "image" in r.headers.get("Content-Type", ""):
-        try:
-            img = Image.open(BytesIO(r.content))
-            img = preprocess_image(img)
-            return "(OCR text extracted from image)"
-        except Exception as e:
-            print(f"❌ Error processing image attachment: {e}")
-            return "(Error processing image)"
-    elif "text" in r.headers.get("Content-Type", "") or "application/pdf" in r.headers.get("Content-Type", ""):
-        return f"(Attachment: {att.get('name')})"
+    except AttachmentTooLarge as e:
+        print(f"⚠️ Skipping attachment {att.get('name')}: {e}")
+        return f"(Attachment too large: {att.get('name')})"
+    with spool:
+        if "image" in headers.get("Content-Type", ""):
+            try:
+                img = Image.open(spool)
+                img = preprocess_image(img)
+                return "(OCR text extracted from image)"
+            except Exception as e:
+                print(f"❌ Error processing image attachment: {e}")
+                return "(Error processing image)"
+        elif "text" in headers.get("Content-Type", "") or "application/pdf" in headers.get("Content-Type", ""):
+            return f"(Attachment: {att.get('name')})"
     return ""
 
 def extract_subject_and_description(ticket_data):
@@ -5155,11 +7125,39 @@ def extract_subject_and_description(ticket_data):
         'combined': combined_text
     }
 
-def classify_ticket_with_subject_priority(ticket_data, conversations_data=None):
+def classify_ticket_with_subject_priority(ticket_data, conversations_data=None, full_content=None):
     """
     Enhanced classification that prioritizes subject line for initial classification
     and uses description and conversations for confirmation.
+    full_content can be passed when the raw ticket content was already extracted.
     """
+    key = ('subject_priority', _classification_input_key(ticket_data, conversations_data, full_content))
+    cached = classification_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    result = _classify_ticket_with_subject_priority_uncached(ticket_data, conversations_data, full_content)
+    classification_cache.put(key, result)
+    return result
+
+def _classification_input_key(ticket_data, conversations_data, full_content):
+    """Hash of everything classify_ticket_with_subject_priority reads from its inputs"""
+    parts = [
+        ticket_data.get('subject', ''),
+        ticket_data.get('description_text', ticket_data.get('description', ''))
+    ]
+    if conversations_data:
+        if full_content is not None:
+            parts.append(full_content)
+        else:
+            # Conversation content changes show up as new ids or updated_at values
+            parts.append(ticket_data.get('responder_id'))
+            parts.append(ticket_data.get('requester_id'))
+            parts.extend(f"{c.get('id')}:{c.get('updated_at')}" for c in conversations_data)
+    return _text_key(*parts)
+
+def _classify_ticket_with_subject_priority_uncached(ticket_data, conversations_data=None, full_content=None):
+    """Subject-first classification behind classify_ticket_with_subject_priority's cache"""
     # Extract subject and description
     content = extract_subject_and_description(ticket_data)
     subject_lower = content['subject'].lower()
@@ -5187,7 +7185,8 @@ def classify_ticket_with_subject_priority(ticket_data, conversations_data=None):
     # If subject doesn't give clear classification, use full content
     if conversations_data:
         # Use full ticket content including conversations
-        full_content, _ = extract_email_content_and_attachments(ticket_data, conversations_data)
+        if full_content is None:
+            full_content, _ = extract_email_content_and_attachments(ticket_data, conversations_data)
         return classify_ticket_with_sop(full_content)
     else:
         # Use combined subject and description
@@ -5201,6 +7200,21 @@ def extract_email_content_and_attachments(ticket_data, conversations_data):
     full_content_parts.append(f"Subject: {ticket_data.get('subject', 'N/A')}")
     full_content_parts.append(f"Description: {clean_html(ticket_data.get('description_text', ticket_data.get('description', 'No description provided.')))}")
 
+    conversation_parts, actions_taken_list = _conversation_parts(ticket_data, conversations_data)
+    full_content_parts.extend(conversation_parts)
+
+    raw_content = "\n\n".join(full_content_parts)
+
+    MAX_RAW_CONTENT_LENGTH = 100000
+    if len(raw_content) > MAX_RAW_CONTENT_LENGTH:
+        raw_content = raw_content[:MAX_RAW_CONTENT_LENGTH] + "\n\n... (content truncated)"
+        print(f"WARNING: Raw ticket content truncated for LLM input to {MAX_RAW_CONTENT_LENGTH} chars.")
+
+    return raw_content, "\n".join(actions_taken_list)
+
+def _conversation_parts(ticket_data, conversations_data):
+    """Returns the content blocks and the agent actions of a list of conversations"""
+    full_content_parts = []
     actions_taken_list = []
     for conv in conversations_data:
         conv_text = conv.get('body_text') or clean_html(conv.get('body', ''))
@@ -5225,26 +7239,64 @@ def extract_email_content_and_attachments(ticket_data, conversations_data):
             if conv_text.strip():
                 full_content_parts.append(f"\n--- {message_type.upper()} from {sender} at {created_at} ---\n{conv_text}")
 
-    raw_content = "\n\n".join(full_content_parts)
+    return full_content_parts, actions_taken_list
 
-    MAX_RAW_CONTENT_LENGTH = 100000
-    if len(raw_content) > MAX_RAW_CONTENT_LENGTH:
-        raw_content = raw_content[:MAX_RAW_CONTENT_LENGTH] + "\n\n... (content truncated)"
-        print(f"WARNING: Raw ticket content truncated for LLM input to {MAX_RAW_CONTENT_LENGTH} chars.")
+# Token budget for a single summarization call. Ticket content is capped at
+# MAX_RAW_CONTENT_LENGTH characters, so nearly every ticket fits in one call.
+CLAUDE_SUMMARY_CHUNK_TOKENS = _config_value('CLAUDE_SUMMARY_CHUNK_TOKENS', 60000)
+CHARS_PER_TOKEN_ESTIMATE = 3.5
 
-    return raw_content, "\n".join(actions_taken_list)
+# Separator that extract_email_content_and_attachments puts before each conversation
+CONVERSATION_SEPARATOR_PATTERN = re.compile(r'(?=\n--- )')
+
+def estimate_tokens(text):
+    """Conservative local estimate of the Claude token count of a text"""
+    return int(len(text) / CHARS_PER_TOKEN_ESTIMATE) + 1
 
-def chunk_text(text, max_chunk_size=8000):
-    """Splits text into chunks of specified word count for LLM processing."""
-    words = text.split()
+def chunk_text(text, max_tokens=None):
+    """
+    Splits text into chunks that each fit in max_tokens for LLM processing.
+
+    Text that fits the budget is returned as a single chunk. Otherwise chunk
+    boundaries fall on the conversation separators; a single conversation that
+    is larger than the budget is split on word boundaries.
+    """
+    max_tokens = max_tokens or CLAUDE_SUMMARY_CHUNK_TOKENS
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    max_chars = int(max_tokens * CHARS_PER_TOKEN_ESTIMATE)
     chunks = []
-    for i in range(0, len(words), max_chunk_size):
-        chunks.append(" ".join(words[i : i + max_chunk_size]))
+    current = ""
+    for segment in CONVERSATION_SEPARATOR_PATTERN.split(text):
+        if not segment:
+            continue
+        if len(current) + len(segment) <= max_chars:
+            current += segment
+            continue
+        if current.strip():
+            chunks.append(current)
+        current = ""
+        if len(segment) <= max_chars:
+            current = segment
+            continue
+        # Oversized conversation: fall back to word boundaries
+        piece = []
+        piece_len = 0
+        for word in segment.split():
+            if piece and piece_len + len(word) + 1 > max_chars:
+                chunks.append(" ".join(piece))
+                piece, piece_len = [], 0
+            piece.append(word)
+            piece_len += len(word) + 1
+        current = " ".join(piece)
+    if current.strip():
+        chunks.append(current)
     return chunks
 
 def get_claude_answer(ticket_content_text: str, user_question: str, ticket_data=None) -> str:
     """Uses Claude to answer a question about the given ticket content with SOP context."""
-    if not anthropic_client:
+    if not get_anthropic_client():
         return "Error: Claude client not initialized. Cannot answer questions. Please check CLAUDE_API_KEY."
 
     # Classify the ticket to provide SOP context
@@ -5260,10 +7312,14 @@ def get_claude_answer(ticket_content_text: str, user_question: str, ticket_data=
         "When answering questions, always reference the relevant SOP and provide specific, actionable guidance based on company procedures."
     )
 
-    qa_user_prompt = (
+    # Ticket content and SOP context stay the same across questions on a ticket,
+    # so they form a cached prefix ahead of the question itself
+    qa_context_prompt = (
         f"Here is the Freshdesk ticket content:\n\n---\n{ticket_content_text}\n---\n\n"
         f"Ticket Classification: {classification}\n"
         f"Relevant SOP: {json.dumps(sop_details, indent=2) if sop_details else 'Standard procedures apply'}\n\n"
+    )
+    qa_user_prompt = (
         f"User's Question: {user_question}\n\n"
         "Answer the question using the provided ticket content and applicable SOPs. "
         "If asking about process/procedures, refer to the specific SOP steps. "
@@ -5271,16 +7327,19 @@ def get_claude_answer(ticket_content_text: str, user_question: str, ticket_data=
     )
 
     try:
-        message = anthropic_client.messages.create(
+        answer = call_claude(
             model="claude-3-haiku-20240307",
             max_tokens=1000,
             messages=[
-                {"role": "user", "content": qa_user_prompt}
+                {"role": "user", "content": [
+                    prompt_block(qa_context_prompt, cache=True),
+                    prompt_block(qa_user_prompt)
+                ]}
             ],
             system=qa_system_prompt,
             temperature=0.2,
         )
-        return message.content[0].text.strip()
+        return answer.strip()
     except Exception as e:
         print(f"Error calling Claude for Q&A: {e}")
         return f"An error occurred while trying to answer with Claude: {e}"
@@ -5325,163 +7384,342 @@ You have access to detailed Standard Operating Procedures for:
 When answering questions, always reference the relevant SOP and provide specific, actionable guidance based on company procedures.
 If the ticket doesn't clearly fall into a known SOP category, analyze the content and suggest the most appropriate process to follow."""
 
-# ========== ENHANCED CLASSIFICATION WITH SOP MAPPING ==========
-
-def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
-    """
-    Comprehensive classification that maps tickets to specific SOPs.
-    Returns a tuple of (category, sop_details)
-    """
-    text_lower = text.lower()
-    
-    # Define comprehensive keyword mappings for all categories
-    
-    # 1. CLAIMS KEYWORDS
-    claim_keywords = {
-        "motor": {
-            "primary": ["motor claim", "vehicle claim", "car claim", "bike claim", "two wheeler claim", "four wheeler claim"],
-            "secondary": ["accident", "damage", "collision", "theft", "total loss", "own damage", "od claim", "third party", "tp claim"],
-            "context": ["garage", "surveyor", "loss date", "claim number", "vehicle repair", "fnol", "first notification", "towing", "workshop", "body shop", "paint work", "denting", "parts replacement"],
-            "psu_specific": ["new india", "uiic", "united india", "psu insurer"]
-        },
-        "health": {
-            "primary": ["health claim", "medical claim", "hospitalization claim", "mediclaim"],
-            "secondary": ["hospital", "treatment", "surgery", "medical emergency", "illness", "disease", "injury"],
-            "context": ["cashless", "reimbursement", "pre-authorization", "discharge", "medical bills", "doctor", "diagnosis", "admission date", "discharge date", "room rent", "icu", "pharmacy bills", "diagnostic tests", "consultation fees"],
-            "specific": ["pre-existing disease", "ped", "waiting period", "sub-limit", "co-pay", "deductible"]
-        },
-        "life": {
-            "primary": ["life claim", "death claim", "maturity claim", "survival benefit"],
-            "secondary": ["demise", "death certificate", "nominee claim", "policy maturity"],
-            "context": ["death certificate", "nominee", "legal heir", "succession certificate", "will", "probate", "claim forms", "discharge voucher"]
-        },
-        "sme": {
-            "primary": ["sme claim", "business claim", "commercial claim", "msme claim"],
-            "secondary": ["shop claim", "office claim", "factory claim", "warehouse claim", "business interruption"],
-            "context": ["fire", "burglary", "machinery breakdown", "stock damage", "business loss", "property damage", "liability claim"]
-        }
-    }
-    
-    # 2. ENDORSEMENT KEYWORDS
-    endorsement_keywords = {
-        "motor": {
-            "financial": {
-                "primary": ["ownership transfer", "policy cancellation", "refund request", "add coverage", "remove coverage"],
-                "secondary": ["cng kit", "lpg kit", "ncb update", "ncb correction", "idv change", "increase idv", "decrease idv", "wrong ncb", "ncb falsification"],
-                "context": ["make model change", "variant change", "pa cover", "personal accident", "add-on cover", "zero dep", "engine protect", "consumables", "invoice cover", "key protect", "tyre protect", "payment charged twice", "duplicate payment", "excess payment", "invalid pyp", "previous policy"]
-            },
-            "non_financial": {
-                "primary": ["name correction", "address change", "contact update", "nominee change"],
-                "secondary": ["gstin update", "gst number", "hypothecation add", "hypothecation remove", "bank finance", "loan clearance"],
-                "context": ["engine number", "chassis number", "registration number", "vehicle number", "pin code", "email update", "mobile update", "salutation", "digital signature", "risk start date", "policy start date", "vaahan update", "vahan portal"]
+# ========== CLASSIFICATION CACHE ==========
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize
             }
-        },
-        "health": {
-            "financial": {
-                "primary": ["add member", "delete member", "newborn addition", "sum insured change", "policy cancellation"],
-                "secondary": ["ped update", "pre-existing disease", "medical condition update", "dob correction", "age correction"],
-                "context": ["family addition", "spouse addition", "parent addition", "child addition", "member deletion", "height weight", "bmi update", "lifestyle change", "occupation change", "policy holder change", "proposer change", "free look cancellation", "mid-term cancellation"]
-            },
-            "non_financial": {
-                "primary": ["name change", "address update", "contact details", "nominee update"],
-                "secondary": ["gender correction", "relationship correction", "salutation change", "communication address"],
-                "context": ["email id", "mobile number", "pincode", "city change", "state change", "kyc update", "id proof update", "gstin", "pan update", "aadhaar update", "effective date", "policy date correction", "auto debit", "si mandate", "ecs mandate"]
-            },
-            "miscellaneous": ["health checkup", "health card", "e-card", "policy copy", "premium receipt", "claim ratio", "network hospital", "policy features", "coverage details", "waiting period query", "sub-limit query", "room rent limit", "co-pay details", "policy status", "renewal status", "grace period", "portal issue", "website error", "app issue", "premium calculation", "loading details", "discount query"]
-        },
-        "life": {
-            "financial": {
-                "primary": ["rider addition", "rider deletion", "sum assured change", "premium change", "policy cancellation"],
-                "secondary": ["premium frequency", "payment mode change", "fund switch", "partial withdrawal"],
-                "context": ["term rider", "critical illness", "accidental death benefit", "waiver of premium", "income benefit", "loan against policy", "surrender value", "paid up value", "premium payment term", "policy term change", "revival", "reinstatement"]
-            },
-            "non_financial": {
-                "primary": ["nominee change", "address change", "name correction", "contact update"],
-                "secondary": ["assignee update", "beneficiary change", "communication preference"],
-                "context": ["email update", "mobile update", "pan correction", "aadhaar update", "bank details", "ecs mandate", "auto debit", "standing instruction", "due date change", "premium due date", "annual mode", "half yearly", "quarterly", "monthly mode"]
-            },
-            "miscellaneous": ["policy copy", "premium paid receipt", "tax certificate", "80c certificate", "80d certificate", "loan eligibility", "surrender quote", "maturity amount", "bonus details", "nav details", "fund performance", "medical reports", "underwriting query", "revival quote", "grace period", "lapsed policy", "policy status", "premium holiday", "top up", "partial withdrawal status"]
-        },
-        "msme": {
-            "financial": {
-                "primary": ["add employee", "delete employee", "sum insured change", "coverage modification", "policy extension"],
-                "secondary": ["gmc addition", "gmc deletion", "gpa coverage", "workmen compensation", "stock update"],
-                "context": ["employee list", "salary update", "designation change", "location addition", "branch coverage", "risk location", "machinery addition", "stock value update", "building value", "contents update", "liability limit", "policy period extension", "short period cancellation"]
-            },
-            "non_financial": {
-                "primary": ["company name", "address change", "contact person", "authorized signatory"],
-                "secondary": ["gstin update", "pan update", "cin update", "registration details"],
-                "context": ["bank details", "hypothecation", "mortgage details", "email id", "phone number", "branch address", "head office", "registered office", "factory address", "warehouse location", "directors details", "partners details", "proprietor details"]
-            },
-            "miscellaneous": ["employee cards", "id cards", "uhid list", "active employee list", "deleted employee list", "premium calculation", "experience report", "claim ratio", "renewal quote", "coverage certificate", "policy wordings", "endorsement copy", "debit note", "credit note"]
-        }
+
+
+def _text_key(*parts):
+    """Fast content hash of one or more strings, used as a cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x00')
+    return digest.digest()
+
+CLASSIFICATION_CACHE_SIZE = _config_value('CLASSIFICATION_CACHE_SIZE', 1024)
+classification_cache = LRUCache(maxsize=CLASSIFICATION_CACHE_SIZE)
+
+def get_classification_cache_stats():
+    """Hit/miss counters of the classification cache"""
+    return classification_cache.stats()
+
+
+# ========== ENHANCED CLASSIFICATION WITH SOP MAPPING ==========
+
+# ========== SOP KEYWORD TABLES ==========
+# Keyword mappings used by classify_ticket_with_sop. They are built once here and
+# compiled into a single KeywordMatcher instead of being rebuilt on every call.
+
+# 1. CLAIMS KEYWORDS
+SOP_CLAIM_KEYWORDS = {
+    "motor": {
+        "primary": ["motor claim", "vehicle claim", "car claim", "bike claim", "two wheeler claim", "four wheeler claim"],
+        "secondary": ["accident", "damage", "collision", "theft", "total loss", "own damage", "od claim", "third party", "tp claim"],
+        "context": ["garage", "surveyor", "loss date", "claim number", "vehicle repair", "fnol", "first notification", "towing", "workshop", "body shop", "paint work", "denting", "parts replacement"],
+        "psu_specific": ["new india", "uiic", "united india", "psu insurer"]
+    },
+    "health": {
+        "primary": ["health claim", "medical claim", "hospitalization claim", "mediclaim"],
+        "secondary": ["hospital", "treatment", "surgery", "medical emergency", "illness", "disease", "injury"],
+        "context": ["cashless", "reimbursement", "pre-authorization", "discharge", "medical bills", "doctor", "diagnosis", "admission date", "discharge date", "room rent", "icu", "pharmacy bills", "diagnostic tests", "consultation fees"],
+        "specific": ["pre-existing disease", "ped", "waiting period", "sub-limit", "co-pay", "deductible"]
+    },
+    "life": {
+        "primary": ["life claim", "death claim", "maturity claim", "survival benefit"],
+        "secondary": ["demise", "death certificate", "nominee claim", "policy maturity"],
+        "context": ["death certificate", "nominee", "legal heir", "succession certificate", "will", "probate", "claim forms", "discharge voucher"]
+    },
+    "sme": {
+        "primary": ["sme claim", "business claim", "commercial claim", "msme claim"],
+        "secondary": ["shop claim", "office claim", "factory claim", "warehouse claim", "business interruption"],
+        "context": ["fire", "burglary", "machinery breakdown", "stock damage", "business loss", "property damage", "liability claim"]
     }
-    
-    # 3. SUPPORT QUERY KEYWORDS
-    support_keywords = {
-        "pdpnr": {
-            "primary": ["payment done policy not received", "pdpnr", "payment successful no policy", "policy not generated"],
-            "secondary": ["pdf not received", "policy document pending", "payment confirmed but", "transaction successful but"],
-            "context": ["payment receipt", "transaction id", "payment reference", "utr number", "payment screenshot", "bank statement", "credit card statement", "debit confirmation"]
-        },
-        "plng": {
-            "primary": ["payment link not generated", "plng", "link not received", "payment link issue"],
-            "secondary": ["proposal not submitting", "proposal stuck", "payment page error", "unable to proceed payment"],
-            "context": ["api down", "technical error", "underwriting issue", "kyc pending", "validation error", "system error", "timeout error", "session expired", "quote expired"]
+}
+
+# 2. ENDORSEMENT KEYWORDS
+SOP_ENDORSEMENT_KEYWORDS = {
+    "motor": {
+        "financial": {
+            "primary": ["ownership transfer", "policy cancellation", "refund request", "add coverage", "remove coverage"],
+            "secondary": ["cng kit", "lpg kit", "ncb update", "ncb correction", "idv change", "increase idv", "decrease idv", "wrong ncb", "ncb falsification"],
+            "context": ["make model change", "variant change", "pa cover", "personal accident", "add-on cover", "zero dep", "engine protect", "consumables", "invoice cover", "key protect", "tyre protect", "payment charged twice", "duplicate payment", "excess payment", "invalid pyp", "previous policy"]
         },
-        "pfasp": {
-            "primary": ["payment failed after successful", "pfasp", "payment deducted but failed", "amount debited but"],
-            "secondary": ["transaction failed", "payment gateway error", "payment reversed", "refund pending"],
-            "context": ["bank deducted", "amount debited", "pg error", "gateway timeout", "technical failure", "reconciliation", "payment status", "failed transaction"]
+        "non_financial": {
+            "primary": ["name correction", "address change", "contact update", "nominee change"],
+            "secondary": ["gstin update", "gst number", "hypothecation add", "hypothecation remove", "bank finance", "loan clearance"],
+            "context": ["engine number", "chassis number", "registration number", "vehicle number", "pin code", "email update", "mobile update", "salutation", "digital signature", "risk start date", "policy start date", "vaahan update", "vahan portal"]
+        }
+    },
+    "health": {
+        "financial": {
+            "primary": ["add member", "delete member", "newborn addition", "sum insured change", "policy cancellation"],
+            "secondary": ["ped update", "pre-existing disease", "medical condition update", "dob correction", "age correction"],
+            "context": ["family addition", "spouse addition", "parent addition", "child addition", "member deletion", "height weight", "bmi update", "lifestyle change", "occupation change", "policy holder change", "proposer change", "free look cancellation", "mid-term cancellation"]
         },
-        "kyc": {
-            "primary": ["kyc issue", "kyc pending", "kyc verification", "vkyc problem"],
-            "secondary": ["identity verification", "document verification", "aadhaar verification", "pan verification"],
-            "context": ["video kyc", "ckyc", "ckycr", "otp issue", "biometric", "face match", "document upload", "unclear document", "verification failed", "mismatch error"]
+        "non_financial": {
+            "primary": ["name change", "address update", "contact details", "nominee update"],
+            "secondary": ["gender correction", "relationship correction", "salutation change", "communication address"],
+            "context": ["email id", "mobile number", "pincode", "city change", "state change", "kyc update", "id proof update", "gstin", "pan update", "aadhaar update", "effective date", "policy date correction", "auto debit", "si mandate", "ecs mandate"]
         },
-        "general_support": {
-            "primary": ["portal issue", "website problem", "app not working", "login issue"],
-            "secondary": ["technical problem", "system issue", "unable to access", "error message"],
-            "context": ["pos portal", "broker portal", "customer portal", "mobile app", "payment gateway", "otp not received", "password reset", "forgot password", "account locked", "session timeout"]
-        }
-    }
-    
-    # 4. COMMON REQUEST KEYWORDS
-    common_request_keywords = {
-        "pi_request": {
-            "primary": ["pi report", "pre inspection", "inspection report", "vehicle inspection"],
-            "secondary": ["back documents", "supporting documents", "pi photos", "inspection photos"],
-            "context": ["vehicle photos", "chassis photo", "engine photo", "odometer", "rc copy", "previous policy", "form 29", "form 30", "noc", "hypothecation letter", "finance noc"]
+        "miscellaneous": ["health checkup", "health card", "e-card", "policy copy", "premium receipt", "claim ratio", "network hospital", "policy features", "coverage details", "waiting period query", "sub-limit query", "room rent limit", "co-pay details", "policy status", "renewal status", "grace period", "portal issue", "website error", "app issue", "premium calculation", "loading details", "discount query"]
+    },
+    "life": {
+        "financial": {
+            "primary": ["rider addition", "rider deletion", "sum assured change", "premium change", "policy cancellation"],
+            "secondary": ["premium frequency", "payment mode change", "fund switch", "partial withdrawal"],
+            "context": ["term rider", "critical illness", "accidental death benefit", "waiver of premium", "income benefit", "loan against policy", "surrender value", "paid up value", "premium payment term", "policy term change", "revival", "reinstatement"]
         },
-        "cashless_garage": {
-            "primary": ["cashless garage", "network garage", "preferred garage", "garage list"],
-            "secondary": ["workshop list", "authorized garage", "panel garage", "tie up garage"],
-            "context": ["near me", "in my area", "city wise", "location wise", "contact details", "garage address", "workshop number", "pickup drop", "towing facility"]
+        "non_financial": {
+            "primary": ["nominee change", "address change", "name correction", "contact update"],
+            "secondary": ["assignee update", "beneficiary change", "communication preference"],
+            "context": ["email update", "mobile update", "pan correction", "aadhaar update", "bank details", "ecs mandate", "auto debit", "standing instruction", "due date change", "premium due date", "annual mode", "half yearly", "quarterly", "monthly mode"]
         },
-        "cashless_hospital": {
-            "primary": ["cashless hospital", "network hospital", "empanelled hospital", "hospital list"],
-            "secondary": ["tpa hospital", "preferred hospital", "panel hospital", "tie up hospital"],
-            "context": ["near me", "in my city", "specialty hospital", "super specialty", "clinic", "diagnostic center", "day care", "hospital address", "hospital contact", "pre authorization"]
+        "miscellaneous": ["policy copy", "premium paid receipt", "tax certificate", "80c certificate", "80d certificate", "loan eligibility", "surrender quote", "maturity amount", "bonus details", "nav details", "fund performance", "medical reports", "underwriting query", "revival quote", "grace period", "lapsed policy", "policy status", "premium holiday", "top up", "partial withdrawal status"]
+    },
+    "msme": {
+        "financial": {
+            "primary": ["add employee", "delete employee", "sum insured change", "coverage modification", "policy extension"],
+            "secondary": ["gmc addition", "gmc deletion", "gpa coverage", "workmen compensation", "stock update"],
+            "context": ["employee list", "salary update", "designation change", "location addition", "branch coverage", "risk location", "machinery addition", "stock value update", "building value", "contents update", "liability limit", "policy period extension", "short period cancellation"]
         },
-        "document_request": {
-            "primary": ["policy copy", "soft copy", "policy document", "insurance copy"],
-            "secondary": ["endorsement copy", "renewal notice", "debit note", "credit note"],
-            "context": ["email policy", "download policy", "policy pdf", "coverage note", "certificate", "tax receipt", "gst invoice", "premium receipt", "payment receipt"]
+        "non_financial": {
+            "primary": ["company name", "address change", "contact person", "authorized signatory"],
+            "secondary": ["gstin update", "pan update", "cin update", "registration details"],
+            "context": ["bank details", "hypothecation", "mortgage details", "email id", "phone number", "branch address", "head office", "registered office", "factory address", "warehouse location", "directors details", "partners details", "proprietor details"]
         },
-        "information_request": {
-            "primary": ["policy details", "coverage details", "policy status", "premium details"],
-            "secondary": ["benefits", "features", "terms conditions", "exclusions"],
-            "context": ["sum insured", "policy period", "premium amount", "next due date", "claim history", "ncb details", "add on covers", "deductible", "waiting period", "sub limits"]
-        }
+        "miscellaneous": ["employee cards", "id cards", "uhid list", "active employee list", "deleted employee list", "premium calculation", "experience report", "claim ratio", "renewal quote", "coverage certificate", "policy wordings", "endorsement copy", "debit note", "credit note"]
+    }
+}
+
+# 3. SUPPORT QUERY KEYWORDS
+SOP_SUPPORT_KEYWORDS = {
+    "pdpnr": {
+        "primary": ["payment done policy not received", "pdpnr", "payment successful no policy", "policy not generated"],
+        "secondary": ["pdf not received", "policy document pending", "payment confirmed but", "transaction successful but"],
+        "context": ["payment receipt", "transaction id", "payment reference", "utr number", "payment screenshot", "bank statement", "credit card statement", "debit confirmation"]
+    },
+    "plng": {
+        "primary": ["payment link not generated", "plng", "link not received", "payment link issue"],
+        "secondary": ["proposal not submitting", "proposal stuck", "payment page error", "unable to proceed payment"],
+        "context": ["api down", "technical error", "underwriting issue", "kyc pending", "validation error", "system error", "timeout error", "session expired", "quote expired"]
+    },
+    "pfasp": {
+        "primary": ["payment failed after successful", "pfasp", "payment deducted but failed", "amount debited but"],
+        "secondary": ["transaction failed", "payment gateway error", "payment reversed", "refund pending"],
+        "context": ["bank deducted", "amount debited", "pg error", "gateway timeout", "technical failure", "reconciliation", "payment status", "failed transaction"]
+    },
+    "kyc": {
+        "primary": ["kyc issue", "kyc pending", "kyc verification", "vkyc problem"],
+        "secondary": ["identity verification", "document verification", "aadhaar verification", "pan verification"],
+        "context": ["video kyc", "ckyc", "ckycr", "otp issue", "biometric", "face match", "document upload", "unclear document", "verification failed", "mismatch error"]
+    },
+    "general_support": {
+        "primary": ["portal issue", "website problem", "app not working", "login issue"],
+        "secondary": ["technical problem", "system issue", "unable to access", "error message"],
+        "context": ["pos portal", "broker portal", "customer portal", "mobile app", "payment gateway", "otp not received", "password reset", "forgot password", "account locked", "session timeout"]
+    }
+}
+
+# 4. COMMON REQUEST KEYWORDS
+SOP_COMMON_REQUEST_KEYWORDS = {
+    "pi_request": {
+        "primary": ["pi report", "pre inspection", "inspection report", "vehicle inspection"],
+        "secondary": ["back documents", "supporting documents", "pi photos", "inspection photos"],
+        "context": ["vehicle photos", "chassis photo", "engine photo", "odometer", "rc copy", "previous policy", "form 29", "form 30", "noc", "hypothecation letter", "finance noc"]
+    },
+    "cashless_garage": {
+        "primary": ["cashless garage", "network garage", "preferred garage", "garage list"],
+        "secondary": ["workshop list", "authorized garage", "panel garage", "tie up garage"],
+        "context": ["near me", "in my area", "city wise", "location wise", "contact details", "garage address", "workshop number", "pickup drop", "towing facility"]
+    },
+    "cashless_hospital": {
+        "primary": ["cashless hospital", "network hospital", "empanelled hospital", "hospital list"],
+        "secondary": ["tpa hospital", "preferred hospital", "panel hospital", "tie up hospital"],
+        "context": ["near me", "in my city", "specialty hospital", "super specialty", "clinic", "diagnostic center", "day care", "hospital address", "hospital contact", "pre authorization"]
+    },
+    "document_request": {
+        "primary": ["policy copy", "soft copy", "policy document", "insurance copy"],
+        "secondary": ["endorsement copy", "renewal notice", "debit note", "credit note"],
+        "context": ["email policy", "download policy", "policy pdf", "coverage note", "certificate", "tax receipt", "gst invoice", "premium receipt", "payment receipt"]
+    },
+    "information_request": {
+        "primary": ["policy details", "coverage details", "policy status", "premium details"],
+        "secondary": ["benefits", "features", "terms conditions", "exclusions"],
+        "context": ["sum insured", "policy period", "premium amount", "next due date", "claim history", "ncb details", "add on covers", "deductible", "waiting period", "sub limits"]
     }
+}
+
+# 5. Fallback classification based on general keywords
+SOP_GENERAL_CLASSIFICATIONS = {
+    "payment": "Support-Payment-Issue",
+    "policy": "General-Policy-Query", 
+    "claim": "Claims-General",
+    "document": "General-Document-Request",
+    "endorse": "Endorsement-General",
+    "cancel": "Endorsement-Cancellation",
+    "refund": "Endorsement-Refund",
+    "query": "General-Query",
+    "complaint": "General-Complaint",
+    "feedback": "General-Feedback"
+}
+
+
+class KeywordMatcher:
+    """
+    Finds which of a fixed set of keywords occur anywhere in a text, in one pass.
+
+    The keywords are compiled into a trie-shaped regular expression (an
+    Aho-Corasick style automaton run by the C regex engine). At every position
+    the longest keyword is matched, and every shorter keyword that is a prefix
+    of it is reported too, so find(text) returns exactly
+    {k for k in keywords if k in text} - plain substring semantics.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k for k in keywords if k})
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[''] = True
+
+        # For each keyword, all keywords that are prefixes of it (itself included)
+        self._prefixes = {}
+        for keyword in self.keywords:
+            node = trie
+            prefixes = []
+            for i, ch in enumerate(keyword):
+                node = node[ch]
+                if '' in node:
+                    prefixes.append(keyword[:i + 1])
+            self._prefixes[keyword] = prefixes
+
+        self._pattern = re.compile(self._trie_pattern(trie))
+
+    def _trie_pattern(self, node):
+        branches = [re.escape(ch) + self._trie_pattern(child)
+                    for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Greedy optional group: longer keywords are tried first
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+
+    def find(self, text):
+        """Return the set of keywords contained in text"""
+        hits = set()
+        search = self._pattern.search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if not match:
+                return hits
+            hits.update(self._prefixes[match.group()])
+            pos = match.start() + 1
+
+
+def _collect_keywords(table):
+    """Flatten a nested keyword table into its keyword strings"""
+    if isinstance(table, dict):
+        for value in table.values():
+            yield from _collect_keywords(value)
+    elif isinstance(table, (list, tuple)):
+        for value in table:
+            yield from _collect_keywords(value)
+    elif isinstance(table, str):
+        yield table
+
+_sop_keyword_matcher = None
+_sop_keyword_matcher_lock = threading.Lock()
+
+def get_sop_keyword_matcher():
+    """Return the KeywordMatcher for all SOP keyword tables (compiled once, on first use)"""
+    global _sop_keyword_matcher
+    if _sop_keyword_matcher is None:
+        with _sop_keyword_matcher_lock:
+            if _sop_keyword_matcher is None:
+                keywords = set()
+                for table in (SOP_CLAIM_KEYWORDS, SOP_ENDORSEMENT_KEYWORDS,
+                              SOP_SUPPORT_KEYWORDS, SOP_COMMON_REQUEST_KEYWORDS):
+                    keywords.update(_collect_keywords(table))
+                keywords.update(SOP_GENERAL_CLASSIFICATIONS.keys())
+                _sop_keyword_matcher = KeywordMatcher(keywords)
+    return _sop_keyword_matcher
+
+
+def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
+    """
+    Comprehensive classification that maps tickets to specific SOPs.
+    Returns a tuple of (category, sop_details)
+    Results are memoized by a hash of the lower-cased text, which is all the
+    classification depends on.
+    """
+    text_lower = text.lower()
+    key = ('sop', _text_key(text_lower))
+    cached = classification_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    result = _classify_ticket_with_sop_uncached(text_lower)
+    classification_cache.put(key, result)
+    return result
+
+def _classify_ticket_with_sop_uncached(text: str) -> Tuple[str, Dict]:
+    """Keyword/SOP classification behind classify_ticket_with_sop's cache"""
+    # Every keyword from the SOP tables found in the text, in a single pass
+    hits = get_sop_keyword_matcher().find(text.lower())
     
     # Enhanced classification logic with priority order
     
     # 1. Check for specific common requests first (highest priority)
-    for request_type, keyword_groups in common_request_keywords.items():
+    for request_type, keyword_groups in SOP_COMMON_REQUEST_KEYWORDS.items():
         match_score = 0
         for priority, keywords in keyword_groups.items():
-            if any(keyword in text_lower for keyword in keywords):
+            if any(keyword in hits for keyword in keywords):
                 match_score += 3 if priority == "primary" else 2 if priority == "secondary" else 1
         
         if match_score >= 3:  # Strong match
@@ -5497,10 +7735,10 @@ def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
                 return "General-Information-Request", {"process": ["Identify query type", "Fetch policy details from ITMS", "Provide accurate information", "Offer additional assistance"], "tat": "2 hours"}
     
     # 2. Check for support queries (high priority)
-    for issue_type, keyword_groups in support_keywords.items():
+    for issue_type, keyword_groups in SOP_SUPPORT_KEYWORDS.items():
         match_score = 0
         for priority, keywords in keyword_groups.items():
-            if any(keyword in text_lower for keyword in keywords):
+            if any(keyword in hits for keyword in keywords):
                 match_score += 3 if priority == "primary" else 2 if priority == "secondary" else 1
         
         if match_score >= 2:  # Medium-strong match
@@ -5510,10 +7748,10 @@ def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
                 return f"Support-{issue_type.upper()}", SOP_KNOWLEDGE_BASE["support"].get(issue_type, {})
     
     # 3. Check for claims (medium priority)
-    for claim_type, keyword_groups in claim_keywords.items():
+    for claim_type, keyword_groups in SOP_CLAIM_KEYWORDS.items():
         match_score = 0
         for priority, keywords in keyword_groups.items():
-            if any(keyword in text_lower for keyword in keywords):
+            if any(keyword in hits for keyword in keywords):
                 match_score += 3 if priority == "primary" else 2 if priority == "secondary" else 1
         
         if match_score >= 2:  # Medium match sufficient for claims
@@ -5524,12 +7762,12 @@ def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
     best_endorsement_score = 0
     best_endorsement_sub_type = None
     
-    for endorsement_type, subcategories in endorsement_keywords.items():
+    for endorsement_type, subcategories in SOP_ENDORSEMENT_KEYWORDS.items():
         for sub_type, keyword_groups in subcategories.items():
             if sub_type == "miscellaneous":
                 # Handle miscellaneous as a list
                 if isinstance(keyword_groups, list):
-                    if any(keyword in text_lower for keyword in keyword_groups):
+                    if any(keyword in hits for keyword in keyword_groups):
                         score = 2
                         if score > best_endorsement_score:
                             best_endorsement_score = score
@@ -5539,7 +7777,7 @@ def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
                 # Handle financial/non-financial with priority groups
                 match_score = 0
                 for priority, keywords in keyword_groups.items():
-                    if any(keyword in text_lower for keyword in keywords):
+                    if any(keyword in hits for keyword in keywords):
                         match_score += 3 if priority == "primary" else 2 if priority == "secondary" else 1
                 
                 if match_score > best_endorsement_score:
@@ -5552,21 +7790,8 @@ def classify_ticket_with_sop(text: str) -> Tuple[str, Dict]:
                SOP_KNOWLEDGE_BASE["endorsement"].get(best_endorsement_match, {})
     
     # 5. Fallback classification based on general keywords
-    general_classifications = {
-        "payment": "Support-Payment-Issue",
-        "policy": "General-Policy-Query", 
-        "claim": "Claims-General",
-        "document": "General-Document-Request",
-        "endorse": "Endorsement-General",
-        "cancel": "Endorsement-Cancellation",
-        "refund": "Endorsement-Refund",
-        "query": "General-Query",
-        "complaint": "General-Complaint",
-        "feedback": "General-Feedback"
-    }
-    
-    for keyword, classification in general_classifications.items():
-        if keyword in text_lower:
+    for keyword, classification in SOP_GENERAL_CLASSIFICATIONS.items():
+        if keyword in hits:
             if classification.startswith("Claims"):
                 return classification, SOP_KNOWLEDGE_BASE.get("claims", {}).get("general_claim_handling_procedure", {})
             elif classification.startswith("Endorsement"):
@@ -5652,7 +7877,7 @@ def get_claude_summary(text):
     """
     Enhanced version that incorporates SOP knowledge into summaries.
     """
-    if not anthropic_client:
+    if not get_anthropic_client():
         print("Claude client not initialized. Cannot generate summary.")
         return {"Problem": "Claude client not available.", "Why": "API key missing or invalid.", "Solution": "Check API key."}
 
@@ -5663,7 +7888,10 @@ def get_claude_summary(text):
     print("Starting SOP-enhanced summary generation...")
     
     chunks = chunk_text(text)
-    print(f"Split into {len(chunks)} chunks.")
+    if len(chunks) == 1:
+        print(f"Ticket fits in one call (~{estimate_tokens(text)} tokens), using single-call summary.")
+    else:
+        print(f"Split into {len(chunks)} chunks at conversation boundaries.")
 
     # Enhanced user prompt that includes SOP context
     user_prompt_tpl_chunk = (
@@ -5674,7 +7902,6 @@ def get_claude_summary(text):
         "- Solution (≤25 words): specific steps based on InsuranceDekho SOPs\n\n"
         "For the Solution, consider the relevant SOP procedures and TATs.\n"
         "Return only the JSON. Do not explain anything.\n\n"
-        "Chunk Text:\n\"\"\"{chunk}\"\"\""
     )
 
     def summarize_chunk(chunk, idx, max_retries=3):
@@ -5682,17 +7909,21 @@ def get_claude_summary(text):
         out = ""
         for attempt in range(1, max_retries + 1):
             try:
+                # The instructions are shared by every chunk of this ticket
                 messages = [
-                    {"role": "user", "content": user_prompt_tpl_chunk.format(chunk=chunk)}
+                    {"role": "user", "content": [
+                        prompt_block(user_prompt_tpl_chunk, cache=True),
+                        prompt_block(f"Chunk Text:\n\"\"\"{chunk}\"\"\"")
+                    ]}
                 ]
-                res = anthropic_client.messages.create(
+                # Retries skip the cache so a bad cached response gets replaced
+                out = call_claude(
                     model="claude-3-haiku-20240307",
                     max_tokens=1000,
                     messages=messages,
                     system=CLAUDE_SYSTEM_PROMPT,
-                )
-                
-                out = res.content[0].text.strip()
+                    use_cache=(attempt == 1),
+                ).strip()
 
                 try:
                     result = json.loads(out)
@@ -5721,17 +7952,20 @@ def get_claude_summary(text):
                 time.sleep(1)
         return {"Problem": "", "Why": "", "Solution": ""}
 
-    print("Summarizing chunks in parallel...")
-    partials = [None] * len(chunks)
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(summarize_chunk, chunk, i): i - 1 for i, chunk in enumerate(chunks, 1)}
-        for fut in as_completed(futures):
-            idx = futures[fut]
-            try:
-                partials[idx] = fut.result()
-            except Exception as e:
-                print(f"Thread error in chunk summarization: {e}")
-                partials[idx] = {"Problem": "", "Why": "", "Solution": ""}
+    if len(chunks) == 1:
+        partials = [summarize_chunk(chunks[0], 1)]
+    else:
+        print("Summarizing chunks in parallel...")
+        partials = [None] * len(chunks)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {executor.submit(propagate_cancellation(summarize_chunk), chunk, i): i - 1 for i, chunk in enumerate(chunks, 1)}
+            for fut in as_completed(futures):
+                idx = futures[fut]
+                try:
+                    partials[idx] = fut.result()
+                except Exception as e:
+                    print(f"Thread error in chunk summarization: {e}")
+                    partials[idx] = {"Problem": "", "Why": "", "Solution": ""}
 
     valid = [p for p in partials if p and any(p[f].strip() for f in ("Problem", "Why", "Solution"))]
     if not valid:
@@ -5760,13 +7994,13 @@ def get_claude_summary(text):
                 messages = [
                     {"role": "user", "content": user_prompt_tpl_merge}
                 ]
-                res = anthropic_client.messages.create(
+                out = call_claude(
                     model="claude-3-haiku-20240307",
                     max_tokens=1000,
                     messages=messages,
                     system=CLAUDE_SYSTEM_PROMPT,
-                )
-                out = res.content[0].text.strip()
+                    use_cache=(attempt == 1),
+                ).strip()
 
                 try:
                     result = json.loads(out)
@@ -5818,13 +8052,59 @@ def get_claude_summary(text):
 
     return merge_jsons("merge_failed.txt")
 
+def get_claude_summary_update(previous_summary, new_text, classification="Unknown", max_retries=2):
+    """
+    Updates a stored Problem/Why/Solution summary with the conversations that
+    arrived after it was written, instead of summarizing the whole ticket again.
+    Returns None if the update fails so the caller can fall back to get_claude_summary.
+    """
+    if not get_anthropic_client() or not new_text.strip():
+        return None
+    if estimate_tokens(new_text) > CLAUDE_SUMMARY_CHUNK_TOKENS:
+        return None
+
+    previous = {k: previous_summary.get(k, "") for k in ("Problem", "Why", "Solution")}
+    instructions = (
+        f"This is a {classification} ticket. Below is the existing summary of the ticket "
+        "and the new conversations that arrived after it was written. Update the summary so it "
+        "reflects the current state of the ticket. Keep what is still true, replace what the new "
+        "conversations changed. Your output MUST be a JSON object with exactly these keys:\n"
+        "- Problem (≤25 words): clearly stated main issue\n"
+        "- Why (≤25 words): root cause based on the ticket content\n"
+        "- Solution (≤25 words): specific steps based on InsuranceDekho SOPs\n\n"
+        "Return only the JSON. Do not explain anything.\n\n"
+        f"Existing summary:\n{json.dumps(previous, indent=2)}\n\n"
+    )
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            out = call_claude(
+                model="claude-3-haiku-20240307",
+                max_tokens=1000,
+                messages=[{"role": "user", "content": [
+                    prompt_block(instructions),
+                    prompt_block(f"New conversations:\n\"\"\"{new_text}\"\"\"")
+                ]}],
+                system=CLAUDE_SYSTEM_PROMPT,
+                use_cache=(attempt == 1),
+            ).strip()
+            if out.startswith("```json"):
+                out = out.strip("```json").strip("` \n")
+            result = json.loads(out)
+            if isinstance(result, dict) and all(k in result for k in ("Problem", "Why", "Solution")):
+                return {k: str(result[k]).strip() for k in ("Problem", "Why", "Solution")}
+            raise ValueError("Missing expected keys in summary update")
+        except Exception as e:
+            print(f"⚠️ Summary update attempt {attempt} failed: {e}")
+    return None
+
 # ========== Enhanced NLP Query Processing ==========
 
 def process_nlp_query(ticket_id, user_question):
     """
     Enhanced version that uses SOP knowledge to answer questions.
     """
-    if not anthropic_client:
+    if not get_anthropic_client():
         return "Error: Claude AI service is not available. Please check the API key."
 
     print(f"Processing NLP query for ticket {ticket_id}: '{user_question}'")
@@ -5842,8 +8122,9 @@ def process_nlp_query(ticket_id, user_question):
     # Classify the ticket to provide SOP context
     classification, sop_details = classify_ticket_with_sop(ticket_content)
     
-    # Enhanced prompt with SOP context
-    prompt_content = f"""
+    # Enhanced prompt with SOP context. The ticket body and SOP block are a
+    # cached prefix so follow-up questions on the same ticket reuse them.
+    context_content = f"""
     Here is the full content of Freshdesk Ticket ID: {ticket_id}
     <ticket_content>
     {ticket_content}
@@ -5853,7 +8134,8 @@ def process_nlp_query(ticket_id, user_question):
     
     Relevant SOP information:
     {json.dumps(sop_details, indent=2) if sop_details else "No specific SOP details available"}
-
+    """
+    prompt_content = f"""
     Based on the ticket content and applicable SOPs, please answer the following question:
     <user_question>
     {user_question}
@@ -5870,18 +8152,19 @@ def process_nlp_query(ticket_id, user_question):
 
     try:
         messages = [
-            {"role": "user", "content": prompt_content}
+            {"role": "user", "content": [
+                prompt_block(context_content, cache=True),
+                prompt_block(prompt_content)
+            ]}
         ]
         
-        response = anthropic_client.messages.create(
+        claude_answer = call_claude(
             model="claude-3-haiku-20240307",
             max_tokens=1500,
             messages=messages,
             system=CLAUDE_CHATBOT_SYSTEM_PROMPT,
             temperature=0.2,
-        )
-        
-        claude_answer = response.content[0].text.strip()
+        ).strip()
         print(f"Claude's response: {claude_answer}")
         return claude_answer
 
@@ -6133,22 +8416,27 @@ class WorkflowEngine:
 
 # ========== Enhanced Process Ticket Function ==========
 
-def process_ticket_id_orignal(ticket_id):
+def process_ticket_id_orignal(ticket_id, ticket_context=None):
     """
     Enhanced version that includes SOP-based classification and solutions.
     Now uses subject line for better classification.
+    Pass a TicketContext to reuse data already fetched in the same run.
     """
-    initialize_excel_if_needed()
+    summary_store = get_summary_store()
 
-    rec = search_ticket_in_excel(ticket_id)
+    ctx = ticket_context or TicketContext(ticket_id)
+    rec = summary_store.get(ticket_id)
     
     ticket_data = None
 
     if rec:
-        print(f"Ticket {ticket_id} already processed and found in Excel.")
-        ticket_data = fetch_ticket_by_id(ticket_id)
+        print(f"Ticket {ticket_id} already processed and found in the summary store.")
+        # Only conversations newer than the stored summary are fetched and summarized
+        watermark = summary_store.get_watermark(ticket_id)
+        new_conversations = ctx.load_since_watermark(watermark) if watermark else []
+        ticket_data = ctx.ticket
         if not ticket_data:
-            print(f"[Error] Even though in Excel, ticket {ticket_id} could not be fetched from Freshdesk.")
+            print(f"[Error] Even though in the summary store, ticket {ticket_id} could not be fetched from Freshdesk.")
             rec["raw_ticket_content"] = "Could not fetch raw content for existing ticket."
             rec["status"] = 0
             rec["Assignee"] = "N/A"
@@ -6157,11 +8445,33 @@ def process_ticket_id_orignal(ticket_id):
             rec["sop_category"] = "Unknown"
             return rec
 
-        conversations = fetch_all_ticket_conversations(ticket_id)
-        raw_ticket_content, actions_taken = extract_email_content_and_attachments(ticket_data, conversations)
+        conversations = ctx.conversations
+        raw_ticket_content, actions_taken = ctx.raw_ticket_content, ctx.actions_taken
         
-        # Classify with SOP using subject priority
-        classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations)
+        # Classify with SOP using subject priority (the stored one is still valid if nothing changed)
+        if watermark is None or new_conversations or not rec.get("Classification"):
+            classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations, raw_ticket_content)
+        else:
+            classification = rec["Classification"]
+        
+        summary_current = True
+        if new_conversations:
+            print(f"Ticket {ticket_id} has {len(new_conversations)} new conversation(s) since it was summarized.")
+            new_text = "\n\n".join(_conversation_parts(ticket_data, new_conversations)[0])
+            if new_text.strip():
+                summ = get_claude_summary_update(rec, new_text, classification)
+                if summ:
+                    rec.update(summ)
+                else:
+                    # Keep the old watermark so the next run tries again
+                    print(f"⚠️ Could not update the summary of ticket {ticket_id}, keeping the stored one.")
+                    summary_current = False
+            rec["Classification"] = classification
+            append_to_excel([ticket_id, ticket_data.get("subject", ""), rec["Problem"], rec["Why"],
+                             rec["Solution"], classification, rec.get("Cluster", "")])
+        if summary_current and (watermark is None or new_conversations
+                                or ticket_data.get("updated_at") != watermark.get("ticket_updated_at")):
+            save_summary_watermark(ticket_id, ticket_data, conversations)
         
         rec["raw_ticket_content"] = raw_ticket_content
         rec["status"] = ticket_data.get("status", 0)
@@ -6173,7 +8483,7 @@ def process_ticket_id_orignal(ticket_id):
         return rec
 
     print(f"Processing new ticket: {ticket_id}...")
-    ticket_data = fetch_ticket_by_id(ticket_id)
+    ticket_data = ctx.ticket
     if not ticket_data:
         print(f"[Error] Ticket ID {ticket_id} could not be fetched from Freshdesk.")
         return None
@@ -6181,8 +8491,9 @@ def process_ticket_id_orignal(ticket_id):
     # Log subject for debugging
     print(f"Ticket Subject: {ticket_data.get('subject', 'N/A')}")
     
-    conversations = fetch_all_ticket_conversations(ticket_id)
-    txt, actions_taken = extract_email_content_and_attachments(ticket_data, conversations)
+    conversations = ctx.conversations
+    txt, actions_taken = ctx.raw_ticket_content, ctx.actions_taken
+    stage_lap('fetch')
     
     if not txt.strip():
         print(f"[Error] No extractable text content found for Ticket ID {ticket_id}.")
@@ -6211,11 +8522,12 @@ def process_ticket_id_orignal(ticket_id):
 
     # Get enhanced summary with SOP context
     summ = get_claude_summary(txt)
+    stage_lap('summary')
     if not isinstance(summ, dict):
         print(f"[Error] Summary for Ticket ID {ticket_id} is not a valid dictionary.")
         agent_id = ticket_data.get("responder_id")
         assignee_name = get_agent_name_from_id(agent_id)
-        classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations)
+        classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations, txt)
         return {
             "Ticket ID": str(ticket_id),
             "Subject": ticket_data.get("subject", ""),
@@ -6238,7 +8550,7 @@ def process_ticket_id_orignal(ticket_id):
     sol = summ.get("Solution", "Solution not found.")
     
     # Enhanced classification with SOP using subject priority
-    classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations)
+    classification, _ = classify_ticket_with_subject_priority(ticket_data, conversations, txt)
     
     clus = "No Cluster"
     if cluster_model and embedding_model:
@@ -6250,12 +8562,15 @@ def process_ticket_id_orignal(ticket_id):
         except Exception as e:
             print(f"⚠️ Error during clustering for ticket {ticket_id}: {e}")
             clus = "Clustering Error"
+    stage_lap('classification')
 
     agent_id = ticket_data.get("responder_id")
     assignee_name = get_agent_name_from_id(agent_id)
 
     row = [ticket_id, ticket_data.get("subject", ""), prob, why, sol, classification, clus]
     append_to_excel(row)
+    save_summary_watermark(ticket_id, ticket_data, conversations)
+    stage_lap('store')
     print(f"Successfully processed and saved ticket {ticket_id}.")
 
     return {
@@ -6332,6 +8647,20 @@ class AutonomousActionSystem:
         except:
             return 0
     
+    def _calculate_business_age_days(self, created_at: str, classification: str) -> float:
+        """Working days since the ticket was created, on the calendar of the classification's team"""
+        if not created_at:
+            return 0
+        try:
+            calendar = get_business_calendar(classification.split("-")[0])
+            return calendar.business_days(created_at, calendar.now())
+        except BusinessCalendarCoverageError as e:
+            # Calendar days are never fewer than working days, so the TAT check errs early
+            print(f"⚠️ {e}; using calendar days for the TAT check")
+            return self._calculate_ticket_age(created_at) / 24
+        except Exception:
+            return 0
+    
     def _generate_claims_actions(self, ticket_data: dict, classification: str, sop_details: dict, ticket_age: float) -> list:
         """Generate actions specific to claims tickets"""
         actions = []
@@ -6406,18 +8735,23 @@ class AutonomousActionSystem:
             # Get TAT for this specific endorsement
             tat_hours = self._get_endorsement_tat(endorsement_type, sub_type, sop_details)
             
-            if tat_hours and ticket_age > tat_hours * 0.75:  # 75% of TAT reached
+            # TATs are counted in working days, so weekends and holidays do not use them up
+            tat_days = tat_hours / 24 if tat_hours else 0
+            business_days = self._calculate_business_age_days(ticket_data.get('created_at'), classification)
+            
+            if tat_days and business_days > tat_days * 0.75:  # 75% of TAT reached
                 actions.append({
                     'type': 'TAT_WARNING',
                     'priority': 'HIGH',
-                    'action': f'Process endorsement urgently - 75% of {tat_hours} hour TAT reached',
-                    'reason': f'{endorsement_type.title()} {sub_type} endorsement TAT is {tat_hours} hours',
+                    'action': f'Process endorsement urgently - 75% of {tat_days:g} working day TAT reached',
+                    'reason': f'{endorsement_type.title()} {sub_type} endorsement TAT is {tat_days:g} working days',
                     'auto_executable': True,
                     'execution_method': 'send_tat_alert',
                     'parameters': {
                         'ticket_id': ticket_data.get('Ticket ID'),
                         'tat_hours': tat_hours,
-                        'current_age': ticket_age
+                        'current_age': ticket_age,
+                        'business_days_elapsed': round(business_days, 2)
                     }
                 })
         
@@ -6690,24 +9024,35 @@ class AutonomousActionSystem:
             'message': f'Ticket escalated to {params.get("escalate_to_name")}',
             'details': {'escalation_level': level, 'escalated_at': datetime.now().isoformat()}
         }
+    
+    def run_claims_workflow(self, params: dict) -> dict:
+        """Run the claims workflow: customer reply, status and tags, insurer child ticket"""
+        workflow = automated_claims_workflow(params.get('ticket_id'))
+        stage = workflow.get('workflow_stage')
+        return {
+            'success': workflow.get('success', False),
+            'message': f'Claims workflow: {stage.replace("_", " ")}' if stage else workflow.get('error', 'Not a claims ticket'),
+            'details': {'workflow_log': workflow.get('workflow_log', [])}
+        }
 
 # ========== ENHANCED SUMMARY GENERATION WITH ACTIONS ==========
 
 def get_enhanced_claude_summary_with_actions(text, classification, sop_details):
     """Enhanced version that generates both summary and recommended actions"""
-    if not anthropic_client:
+    if not get_anthropic_client():
         return None, []
     
-    enhanced_prompt = f"""
-    Analyze this {classification} ticket and provide:
-    1. Standard RCA summary (Problem, Why, Solution)
-    2. Specific action items based on InsuranceDekho SOPs
-    
+    context_prompt = f"""
     Ticket content:
     {text}
     
     Relevant SOP:
     {json.dumps(sop_details, indent=2)}
+    """
+    enhanced_prompt = f"""
+    Analyze this {classification} ticket and provide:
+    1. Standard RCA summary (Problem, Why, Solution)
+    2. Specific action items based on InsuranceDekho SOPs
     
     Return JSON with this structure:
     {{
@@ -6734,15 +9079,18 @@ def get_enhanced_claude_summary_with_actions(text, classification, sop_details):
     """
     
     try:
-        response = anthropic_client.messages.create(
+        response_text = call_claude(
             model="claude-3-haiku-20240307",
             max_tokens=1500,
-            messages=[{"role": "user", "content": enhanced_prompt}],
+            messages=[{"role": "user", "content": [
+                prompt_block(context_prompt, cache=True),
+                prompt_block(enhanced_prompt)
+            ]}],
             system=CLAUDE_SYSTEM_PROMPT,
             temperature=0.2
         )
         
-        result = json.loads(response.content[0].text.strip())
+        result = json.loads(response_text.strip())
         return result.get("summary"), result.get("recommended_actions", [])
     except Exception as e:
         print(f"Error in enhanced summary: {e}")
@@ -7010,8 +9358,34 @@ IRDAI License no 588 | CIN: U66010RJ2016PTC054811 | Composite Broker Valid Till:
         
         return response.strip()
 
-    def generate_response(self, ticket_data: dict, context: str, response_type: str = 'general', agent_name: str = 'Support Team') -> str:
-        """Generate intelligent response with zero hallucination and maximum accuracy."""
+    def _complete(self, prompt: str, max_tokens: int, temperature: float, on_delta=None) -> str:
+        """
+        Get the raw Claude completion for a prompt. When on_delta is given the
+        response is streamed and each text delta is passed to it as it arrives.
+        """
+        request = dict(
+            model="claude-3-haiku-20240307",
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            client=self.client
+        )
+        if on_delta is None:
+            return call_claude(**request)
+
+        parts = []
+        for delta in stream_claude(**request):
+            parts.append(delta)
+            on_delta(delta)
+        return "".join(parts)
+
+    def generate_response(self, ticket_data: dict, context: str, response_type: str = 'general', agent_name: str = 'Support Team', on_delta=None) -> str:
+        """
+        Generate intelligent response with zero hallucination and maximum accuracy.
+
+        on_delta, if given, receives the raw draft as it streams from Claude;
+        the returned response is the validated, post-processed final text.
+        """
         
         classification = ticket_data.get('Classification', '')
         sentiment = self._analyze_sentiment(ticket_data)
@@ -7083,14 +9457,8 @@ Keep under 150 words. Be helpful but stick to facts.
 """
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=300,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2  # Lower temperature for more consistent, factual responses
-            )
-            
-            generated_response = response.content[0].text.strip()
+            # Lower temperature for more consistent, factual responses
+            generated_response = self._complete(prompt, 300, 0.2, on_delta=on_delta).strip()
             
             # Validate response for accuracy
             generated_response = self._validate_response_facts(generated_response, ticket_data)
@@ -7174,21 +9542,19 @@ class EnhancedSmartResponseGenerator(SmartResponseGenerator):
         super().__init__(anthropic_client)
         self.routing_analyzer = routing_analyzer
 
-    def generate_contextual_response(self, ticket_id, response_type='update', agent_name='Support Team'):
+    def generate_contextual_response(self, ticket_id, response_type='update', agent_name='Support Team', ticket_context=None, on_delta=None):
         """
-        Generate response based on complete ticket analysis including parent-child relationships
+        Generate response based on complete ticket analysis including parent-child relationships.
+        on_delta, if given, receives the response text as it streams from Claude.
         """
+        ctx = ticket_context or TicketContext(ticket_id)
+        
         # Get complete ticket context
-        complete_context = self.routing_analyzer.analyze_complete_ticket_context(ticket_id)
+        complete_context = self.routing_analyzer.analyze_complete_ticket_context(ticket_id, ticket_context=ctx)
 
         if not complete_context:
             return "Unable to fetch ticket details for response generation."
 
-        # Fetch ticket data for base analysis
-        ticket_data = fetch_ticket_by_id(ticket_id)
-        conversations = fetch_all_ticket_conversations(ticket_id)
-        ticket_content, _ = extract_email_content_and_attachments(ticket_data, conversations)
-
         # Build enhanced context for response generation
         enhanced_context = f"""
 COMPLETE TICKET ANALYSIS:
@@ -7253,14 +9619,7 @@ Keep the response concise and action-oriented.
 """
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=400,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
-
-            generated_response = response.content[0].text.strip()
+            generated_response = self._complete(prompt, 400, 0.3, on_delta=on_delta).strip()
 
             # Add appropriate signature based on routing
             signature = self._get_contextual_signature(complete_context['routing_intent'], agent_name)
@@ -7393,8 +9752,10 @@ def enhance_ticket_with_routing_context(ticket_data):
    if not ticket_id:
        return ticket_data
    
-   # Analyze complete context
-   complete_context = routing_analyzer.analyze_complete_ticket_context(ticket_id)
+   # Analyze complete context, reusing the data fetched by process_ticket_id_enhanced
+   complete_context = routing_analyzer.analyze_complete_ticket_context(
+       ticket_id, ticket_context=ticket_data.get('ticket_context')
+   )
    
    if complete_context:
        # Add routing analysis to ticket data
@@ -7442,8 +9803,8 @@ def enhance_ticket_with_routing_context(ticket_data):
        }
        
        # Generate intelligent response suggestion
-       if smart_response_generator:
-           enhanced_generator = EnhancedSmartResponseGenerator(anthropic_client, routing_analyzer)
+       if get_smart_response_generator():
+           enhanced_generator = EnhancedSmartResponseGenerator(get_anthropic_client(), routing_analyzer)
            ticket_data['suggested_response'] = enhanced_generator.generate_contextual_response(
                ticket_id,
                response_type='update'
@@ -8064,11 +10425,6 @@ class PredictiveAnalyticsEngine:
         
         return 0.3  # Default low automation potential
     
-workflow_engine = WorkflowEngine()
-predictive_engine = PredictiveAnalyticsEngine()
-smart_response_generator = SmartResponseGenerator(anthropic_client) if anthropic_client else None
-autonomous_action_system = AutonomousActionSystem(FRESHDESK_DOMAIN, FRESHDESK_API_KEY) if FRESHDESK_DOMAIN and FRESHDESK_API_KEY else None
-
 # ========== INTEGRATION WITH MAIN PROCESS ==========
 
 # Initialize global instances
@@ -8076,83 +10432,298 @@ autonomous_action_system = None
 smart_response_generator = None
 workflow_engine = None
 predictive_engine = None
+_autonomous_systems_initialized = False
+_autonomous_systems_lock = threading.RLock()
 
 def initialize_autonomous_systems():
     """Initialize all autonomous systems"""
     global autonomous_action_system, smart_response_generator, workflow_engine, predictive_engine
-    
-    if FRESHDESK_DOMAIN and FRESHDESK_API_KEY:
-        autonomous_action_system = AutonomousActionSystem(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
-        workflow_engine = WorkflowAutomationEngine(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
-    
-    if anthropic_client:
-        smart_response_generator = SmartResponseGenerator(anthropic_client)
-    
-    predictive_engine = PredictiveAnalyticsEngine()
+    global _autonomous_systems_initialized
+    
+    with _autonomous_systems_lock:
+        if FRESHDESK_DOMAIN and FRESHDESK_API_KEY:
+            autonomous_action_system = AutonomousActionSystem(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
+            workflow_engine = WorkflowAutomationEngine(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
+        
+        client = get_anthropic_client()
+        if client:
+            smart_response_generator = SmartResponseGenerator(client)
+        
+        predictive_engine = PredictiveAnalyticsEngine()
+        _autonomous_systems_initialized = True
+
+def _ensure_autonomous_systems():
+    if not _autonomous_systems_initialized:
+        with _autonomous_systems_lock:
+            if not _autonomous_systems_initialized:
+                initialize_autonomous_systems()
+
+def get_autonomous_action_system():
+    """Return the AutonomousActionSystem (None without Freshdesk credentials), initializing on first use"""
+    _ensure_autonomous_systems()
+    return autonomous_action_system
+
+def get_workflow_engine():
+    """Return the WorkflowAutomationEngine (None without Freshdesk credentials), initializing on first use"""
+    _ensure_autonomous_systems()
+    return workflow_engine
+
+def get_predictive_engine():
+    """Return the PredictiveAnalyticsEngine, initializing on first use"""
+    _ensure_autonomous_systems()
+    return predictive_engine
+
+def get_smart_response_generator():
+    """Return the SmartResponseGenerator (None without a Claude client), initializing on first use"""
+    _ensure_autonomous_systems()
+    return smart_response_generator
+
+# With LAZY_STARTUP the engines are created by the getters above on first use
+if not LAZY_STARTUP:
+    initialize_autonomous_systems()
+
+# ========== STAGE PIPELINE ==========
+
+# Per-stage time limits (seconds) for process_ticket_id_enhanced; a stage that
+# runs longer is reported as timed out and its dependents run without its data
+PIPELINE_STAGE_TIMEOUT_SECONDS = _config_value('PIPELINE_STAGE_TIMEOUT_SECONDS', 120)
+PIPELINE_STAGE_TIMEOUTS = {
+    'summary': 180,
+    'attachments': 300,
+}
+
+@dataclass
+class PipelineStage:
+    """
+    A named step of a StagePipeline; func(data) returns a dict of result fields.
+    A required stage that fails or times out ends the run with PipelineAbort.
+    """
+    name: str
+    func: Any
+    deps: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    required: bool = False
+
+class PipelineAbort(Exception):
+    """Raised by a stage when the run cannot continue; result is returned as is"""
+    def __init__(self, result):
+        super().__init__("pipeline aborted")
+        self.result = result
+
+class StagePipeline:
+    """
+    Runs a graph of PipelineStages on a thread pool.
+
+    A stage starts as soon as every stage it depends on has finished, so
+    independent stages overlap and the run takes about as long as the slowest
+    dependency chain. Each stage gets a copy of the result fields gathered so
+    far and returns the fields it adds. A stage that fails or exceeds its
+    timeout is recorded in stage_status; its dependents still run with the
+    data that is available. A stage raising PipelineAbort, or a required
+    stage failing or timing out, ends the run.
+
+    on_stage(name, data), if given to run(), is called with a copy of the
+    results so far each time a stage finishes, so callers can show partial
+    results while the slower stages are still running. Each stage runs under
+    its own CancellationToken, a child of the caller's. A stage that times out
+    has its token cancelled, and when run() ends (including by PipelineAbort
+    or cancellation) every stage still running is cancelled, so the worker
+    threads stop at their next API call instead of doing discarded work.
+    Once the caller's token is cancelled run() raises OperationCancelled
+    without waiting for the running stages.
+    """
 
-# Call initialization
-initialize_autonomous_systems()
+    def __init__(self, stages, default_timeout=None, timeouts=None):
+        self.stages = {stage.name: stage for stage in stages}
+        default_timeout = default_timeout or PIPELINE_STAGE_TIMEOUT_SECONDS
+        timeouts = timeouts or {}
+        self.timeouts = {
+            stage.name: stage.timeout or timeouts.get(stage.name) or default_timeout for stage in stages
+        }
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+    def run(self, data, on_stage=None):
+        """Run every stage; returns (data, stage_status) or raises PipelineAbort"""
+        data = dict(data)
+        status = {}
+        waiting = dict(self.stages)
+        running = {}
+        token = current_cancellation_token()
+        executor = ThreadPoolExecutor(max_workers=len(self.stages) or 1, thread_name_prefix="stage")
+
+        def timed(stage, snapshot, stage_token):
+            with cancellation_scope(stage_token):
+                stage_token.raise_if_cancelled()
+                start = time.time()
+                return stage.func(snapshot), time.time() - start
+
+        try:
+            while waiting or running:
+                check_cancelled()
+                for name, stage in list(waiting.items()):
+                    if all(dep in status for dep in stage.deps):
+                        del waiting[name]
+                        stage_token = CancellationToken(parent=token)
+                        future = executor.submit(timed, stage, dict(data), stage_token)
+                        running[future] = (stage, time.time(), stage_token)
+
+                if not running:
+                    break
 
-def process_ticket_id_enhanced(ticket_id):
+                now = time.time()
+                deadline = min(start + self.timeouts[stage.name] for stage, start, _ in running.values())
+                timeout = max(0.0, deadline - now)
+                if token is not None:
+                    # Wake up regularly to notice a cancellation
+                    timeout = min(timeout, 0.2)
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, start, _ = running.pop(future)
+                    try:
+                        updates, seconds = future.result()
+                    except PipelineAbort:
+                        raise
+                    except Exception as e:
+                        print(f"Error in stage {stage.name}: {e}")
+                        if stage.required:
+                            raise PipelineAbort({'error': f"Stage {stage.name} failed: {e}"})
+                        status[stage.name] = {'status': 'failed', 'seconds': round(time.time() - start, 2), 'error': str(e)}
+                        continue
+                    data.update(updates or {})
+                    status[stage.name] = {'status': 'done', 'seconds': round(seconds, 2)}
+                    if on_stage:
+                        try:
+                            on_stage(stage.name, dict(data))
+                        except Exception as e:
+                            print(f"Error in stage callback for {stage.name}: {e}")
+
+                now = time.time()
+                for future, (stage, start, stage_token) in list(running.items()):
+                    timeout = self.timeouts[stage.name]
+                    if now - start >= timeout:
+                        if stage.required:
+                            print(f"⚠️ Stage {stage.name} timed out after {timeout}s, ending the run")
+                            raise PipelineAbort({'error': f"Stage {stage.name} timed out after {timeout}s"})
+                        print(f"⚠️ Stage {stage.name} timed out after {timeout}s, continuing without it")
+                        stage_token.cancel()
+                        del running[future]
+                        status[stage.name] = {'status': 'timed_out', 'seconds': round(now - start, 2)}
+        finally:
+            # Stages still running are no longer wanted; they stop at their next
+            # cancellation check, and run() doesn't wait for them
+            for _, _, stage_token in running.values():
+                stage_token.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return data, status
+
+def process_ticket_id_enhanced(ticket_id, on_suggested_response_delta=None, on_stage_complete=None,
+                               cancel_token=None):
     """
-    Enhanced ticket processing with autonomous features and advanced pending status detection
+    Enhanced ticket processing with autonomous features and advanced pending status detection.
+
+    The steps run as a StagePipeline: the Claude summary, the child ticket
+    analysis and the SOP classification only need the ticket itself and run
+    side by side, and every later stage starts as soon as its inputs are ready.
+    result_data['stage_status'] reports each stage as done, failed or timed out.
+
+    on_suggested_response_delta, if given, receives the suggested response draft
+    as it streams from Claude, before the rest of the pipeline finishes.
+    on_stage_complete(stage_name, partial_result), if given, is called as each
+    stage finishes. The metadata stage (ticket details and classification)
+    comes first, typically well under a second after the call, followed by
+    pending-from and timing; the Claude summary, suggested response and
+    document analysis arrive later.
+    cancel_token (a CancellationToken) stops the run at the next API call once
+    cancelled; the result is then {'error': ..., 'cancelled': True}.
     """
     routing_analyzer = EnhancedContextualRoutingAnalyzer(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
     
     # ========== NEW: Initialize Enhanced Ticket Analyzer ==========
     enhanced_analyzer = EnhancedTicketAnalyzer(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
     
-    # Get the original ticket data
-    result_data = process_ticket_id_orignal(ticket_id)
-    
-    if not result_data or 'error' in result_data:
-        return result_data
-    
-    # Get classification and SOP details
-    classification = result_data.get('Classification', 'Unknown')
-    _, sop_details = classify_ticket_with_sop(result_data.get('raw_ticket_content', ''))
-    
+    # Everything fetched from Freshdesk during this run is shared through one context
+    ticket_context = TicketContext(ticket_id)
+
+    def run_summary(data):
+        # Get the original ticket data
+        result = process_ticket_id_orignal(ticket_id, ticket_context=ticket_context)
+        if not result or 'error' in result:
+            raise PipelineAbort(result)
+        return result
+
+    def run_metadata(data):
+        # Ticket details, classification and SOP details (no Claude calls)
+        ticket = ticket_context.ticket
+        if not ticket:
+            return {}
+        raw_content = ticket_context.raw_ticket_content
+        classification, _ = classify_ticket_with_subject_priority(ticket, ticket_context.conversations, raw_content)
+        _, sop_details = classify_ticket_with_sop(raw_content)
+        agent_id = ticket.get("responder_id")
+        return {
+            'Ticket ID': str(ticket_id),
+            'Subject': ticket.get("subject", ""),
+            'status': ticket.get("status", 0),
+            'created_at': ticket.get("created_at"),
+            'updated_at': ticket.get("updated_at"),
+            'agent_id': agent_id,
+            'Assignee': get_agent_name_from_id(agent_id),
+            'Actions Taken': ticket_context.actions_taken,
+            'ticket_url': f"https://{FRESHDESK_DOMAIN}.freshdesk.com/a/tickets/{ticket_id}",
+            'Classification': classification,
+            'sop_category': classification,
+            'sop_details': sop_details
+        }
+
     # ========== NEW: Comprehensive Child Ticket Analysis with Pending Status ==========
-    if result_data and not 'error' in result_data:
+    def run_comprehensive(data):
+        result = {}
         try:
             print(f"Starting comprehensive analysis for ticket {ticket_id}")
             
             # Use the enhanced analyzer for complete analysis
-            comprehensive_analysis = enhanced_analyzer.analyze_ticket_with_children(ticket_id)
+            comprehensive_analysis = enhanced_analyzer.analyze_ticket_with_children(
+                ticket_id, ticket_context=ticket_context
+            )
             
             if 'error' not in comprehensive_analysis:
                 # Add the comprehensive analysis to result_data
-                result_data['comprehensive_ticket_analysis'] = comprehensive_analysis
+                result['comprehensive_ticket_analysis'] = comprehensive_analysis
                 
                 # Extract key information for backward compatibility
                 main_ticket = comprehensive_analysis['main_ticket']
                 child_tickets = comprehensive_analysis['child_tickets']
                 
                 # Update existing fields with enhanced data
-                result_data['pending_from'] = main_ticket['pending_from']['content_based']
-                result_data['pending_confidence'] = main_ticket['pending_from']['confidence']
-                result_data['pending_evidence'] = main_ticket['pending_from']['evidence']
+                result['pending_from'] = main_ticket['pending_from']['content_based']
+                result['pending_confidence'] = main_ticket['pending_from']['confidence']
+                result['pending_evidence'] = main_ticket['pending_from']['evidence']
                 
                 # Add enhanced status information
-                result_data['enhanced_status'] = {
+                result['enhanced_status'] = {
                     'display': main_ticket['status']['display'],
                     'category': main_ticket['status']['category'],
                     'action': main_ticket['status']['action']
                 }
                 
                 # Add timing information
-                result_data['timing_info'] = main_ticket['timing']
+                result['timing_info'] = main_ticket['timing']
                 
                 # Add key extracted information
-                result_data['key_information'] = main_ticket['key_information']
+                result['key_information'] = main_ticket['key_information']
                 
                 # Add next expected action
-                result_data['next_expected_action'] = main_ticket['next_expected_action']
+                result['next_expected_action'] = main_ticket['next_expected_action']
                 
                 # Process child tickets if any
                 if child_tickets:
                     print(f"Found {len(child_tickets)} child tickets")
-                    result_data['child_tickets'] = child_tickets
+                    result['child_tickets'] = child_tickets
                     
                     # Create child ticket summary for easy access
                     child_summary = []
@@ -8165,184 +10736,235 @@ def process_ticket_id_enhanced(ticket_id):
                             'confidence': child['pending_from']['confidence'],
                             'key_info': child['key_information']
                         })
-                    result_data['child_summary'] = child_summary
+                    result['child_summary'] = child_summary
                 
                 # Add overall pending summary
-                result_data['pending_summary'] = comprehensive_analysis['pending_summary']
+                result['pending_summary'] = comprehensive_analysis['pending_summary']
                 
                 # Add relationship analysis
-                result_data['relationship_analysis'] = comprehensive_analysis['relationship_analysis']
+                result['relationship_analysis'] = comprehensive_analysis['relationship_analysis']
                 
                 # Add actionable insights
-                result_data['actionable_insights'] = enhanced_analyzer.generate_actionable_insights(comprehensive_analysis)
+                result['actionable_insights'] = enhanced_analyzer.generate_actionable_insights(comprehensive_analysis)
                 
                 print(f"Comprehensive analysis completed successfully")
                 
             else:
                 print(f"Error in comprehensive analysis: {comprehensive_analysis['error']}")
                 # Fall back to basic analysis if enhanced fails
-                result_data['comprehensive_analysis_error'] = comprehensive_analysis['error']
+                result['comprehensive_analysis_error'] = comprehensive_analysis['error']
                 
         except Exception as e:
             print(f"Error in enhanced ticket analysis: {e}")
-            result_data['enhanced_analysis_error'] = str(e)
+            result['enhanced_analysis_error'] = str(e)
             
             # Fall back to your existing basic child ticket analysis
-            status = result_data.get('status', 0)
+            status = (ticket_context.ticket or {}).get('status', 0)
             if status in [10, 11, 12]:  # Parent ticket statuses
                 print(f"Falling back to basic child ticket analysis...")
                 
-                child_tickets = fetch_child_tickets(ticket_id)
-                result_data['child_tickets'] = child_tickets
+                child_tickets = ticket_context.children
+                result['child_tickets'] = child_tickets
                 
-                child_analyses = []
-                for child in child_tickets:
+                def summarize_child(child):
                     child_id = child.get('id')
                     print(f"Analyzing child ticket {child_id}...")
                     
-                    child_data = fetch_ticket_by_id(child_id)
-                    if child_data:
-                        child_conversations = fetch_all_ticket_conversations(child_id)
-                        
-                        child_analysis = {
-                            'ticket_id': child_id,
-                            'subject': child.get('subject'),
-                            'status': status_map.get(child.get('status'), 'Unknown'),
-                            'created_at': child.get('created_at'),
-                            'conversations': len(child_conversations),
-                            'last_update': child.get('updated_at')
-                        }
-                        
-                        child_content = ""
-                        for conv in child_conversations:
-                            child_content += conv.get('body_text', '') + " "
-                        
-                        if 'claim' in child_content.lower():
-                            import re
-                            claim_match = re.search(r'claim\s*#?\s*([A-Z0-9/-]+)', child_content, re.IGNORECASE)
-                            if claim_match:
-                                child_analysis['claim_number'] = claim_match.group(1)
-                        
-                        if any(insurer in child_content.lower() for insurer in ['hdfc', 'icici', 'bajaj', 'tata']):
-                            child_analysis['insurer_involved'] = True
-                        
-                        child_analyses.append(child_analysis)
-                        
-                result_data['child_analyses'] = child_analyses
+                    child_ctx = ticket_context.child_context(child_id)
+                    child_data = child_ctx.ticket
+                    if not child_data:
+                        return None
+                    child_conversations = child_ctx.conversations
+                    
+                    child_analysis = {
+                        'ticket_id': child_id,
+                        'subject': child.get('subject'),
+                        'status': status_map.get(child.get('status'), 'Unknown'),
+                        'created_at': child.get('created_at'),
+                        'conversations': len(child_conversations),
+                        'last_update': child.get('updated_at')
+                    }
+                    
+                    child_content = ""
+                    for conv in child_conversations:
+                        child_content += conv.get('body_text', '') + " "
+                    
+                    if 'claim' in child_content.lower():
+                        claim_match = re.search(r'claim\s*#?\s*([A-Z0-9/-]+)', child_content, re.IGNORECASE)
+                        if claim_match:
+                            child_analysis['claim_number'] = claim_match.group(1)
+                    
+                    if any(insurer in child_content.lower() for insurer in ['hdfc', 'icici', 'bajaj', 'tata']):
+                        child_analysis['insurer_involved'] = True
+                    
+                    return child_analysis
+                
+                child_analyses = freshdesk_client.map(summarize_child, child_tickets)
+                result['child_analyses'] = [c for c in child_analyses if c]
+        return result
     
     # ========== NEW: Quick Pending Status for Non-Parent Tickets ==========
-    if not result_data.get('pending_from'):  # If not set by comprehensive analysis
+    def run_pending(data):
+        if data.get('pending_from'):  # Already set by comprehensive analysis
+            return {}
         try:
-            pending_summary = enhanced_analyzer.get_pending_status_summary(ticket_id)
+            pending_summary = get_pending_status_summary(ticket_id, ticket_context=ticket_context)
             if 'error' not in pending_summary:
-                result_data['pending_from'] = pending_summary['pending_from_analysis']
-                result_data['pending_confidence'] = pending_summary['confidence']
-                result_data['pending_evidence'] = pending_summary['evidence']
-                result_data['next_expected_action'] = pending_summary['recommendation']
+                return {
+                    'pending_from': pending_summary['pending_from_analysis'],
+                    'pending_confidence': pending_summary['confidence'],
+                    'pending_evidence': pending_summary['evidence'],
+                    'next_expected_action': pending_summary['recommendation']
+                }
         except Exception as e:
             print(f"Error getting pending status summary: {e}")
+        return {}
     
     # Add autonomous actions
-    if autonomous_action_system:
-        autonomous_actions = autonomous_action_system.analyze_ticket_for_actions(
-            result_data, classification, sop_details
-        )
-        result_data['autonomous_actions'] = autonomous_actions
-    else:
-        result_data['autonomous_actions'] = []
+    def run_actions(data):
+        engine = get_autonomous_action_system()
+        if not engine:
+            return {'autonomous_actions': []}
+        return {'autonomous_actions': engine.analyze_ticket_for_actions(
+            data, data.get('Classification', 'Unknown'), data.get('sop_details') or {}
+        )}
     
     # Add predictions
-    if predictive_engine:
-        predictions = predictive_engine.predict_ticket_outcome(result_data, classification)
-        result_data['predictions'] = format_predictions(predictions)
-    else:
-        result_data['predictions'] = {}
+    def run_predictions(data):
+        engine = get_predictive_engine()
+        if not engine:
+            return {'predictions': {}}
+        predictions = engine.predict_ticket_outcome(data, data.get('Classification', 'Unknown'))
+        return {'predictions': format_predictions(predictions)}
     
     # Add workflow
-    if workflow_engine:
-        workflow = workflow_engine.create_workflow(
-            result_data.get('Ticket ID'),
-            classification,
-            sop_details
-        )
-        result_data['workflow'] = workflow
-    else:
-        result_data['workflow'] = {}
+    def run_workflow(data):
+        engine = get_workflow_engine()
+        if not engine:
+            return {'workflow': {}}
+        return {'workflow': engine.create_workflow(
+            str(ticket_id),
+            data.get('Classification', 'Unknown'),
+            data.get('sop_details') or {}
+        )}
     
     # Generate suggested response
-    if smart_response_generator:
-        suggested_response = smart_response_generator.generate_response(
-            result_data,
+    def run_suggested_response(data):
+        engine = get_smart_response_generator()
+        if not engine:
+            return {'suggested_response': ""}
+        return {'suggested_response': engine.generate_response(
+            data,
             "Initial response",
-            "general"
-        )
-        result_data['suggested_response'] = suggested_response
-    else:
-        result_data['suggested_response'] = ""
-    
-    # Get SOP steps based on category
-    category = result_data.get('Classification') or result_data.get('sop_category', 'general')
-    sop_steps = get_sop_steps_for_category(category)
-    
-    # Calculate workflow progress
-    workflow_progress_data = calculate_workflow_progress(result_data, sop_steps)
-    
-    # Update workflow with progress
-    if 'workflow' not in result_data:
-        result_data['workflow'] = {}
-    
-    result_data['workflow'].update({
-        'progress': workflow_progress_data['progress'],
-        'status': workflow_progress_data['status'],
-        'current_step': workflow_progress_data['current_step'],
-        'completed_steps': workflow_progress_data.get('completed_steps', 0),
-        'total_steps': workflow_progress_data.get('total_steps', len(sop_steps)),
-        'remaining_steps': workflow_progress_data.get('remaining_steps', []),
-        'sop_steps': sop_steps
-    })
+            "general",
+            on_delta=on_suggested_response_delta
+        )}
+    
+    def run_sop_steps(data):
+        # Get SOP steps based on category
+        category = data.get('Classification') or data.get('sop_category', 'general')
+        sop_steps = get_sop_steps_for_category(category)
+        
+        # Calculate workflow progress
+        workflow_progress_data = calculate_workflow_progress(data, sop_steps)
+        
+        # Update workflow with progress
+        workflow = dict(data.get('workflow') or {})
+        workflow.update({
+            'progress': workflow_progress_data['progress'],
+            'status': workflow_progress_data['status'],
+            'current_step': workflow_progress_data['current_step'],
+            'completed_steps': workflow_progress_data.get('completed_steps', 0),
+            'total_steps': workflow_progress_data.get('total_steps', len(sop_steps)),
+            'remaining_steps': workflow_progress_data.get('remaining_steps', []),
+            'sop_steps': sop_steps
+        })
+        return {'workflow': workflow}
 
     # Process attachments if available
-    if result_data.get('attachments'):
+    def run_attachments(data):
+        # Attachments of the ticket and its conversations, from the shared context.
+        # Needs only the classification and the raw content, so OCR starts
+        # without waiting for the Claude summary.
+        attachments = (ticket_context.ticket or {}).get('attachments') or []
+        if not attachments:
+            return {}
+        before = dict(data, raw_ticket_content=ticket_context.raw_ticket_content)
+        data = dict(before, attachments=attachments)
         try:
             # Analyze documents using Vision API
-            result_data = process_ticket_attachments_enhanced(result_data)
+            data = process_ticket_attachments_enhanced(data)
             
             # Get document suggestions
             suggestion_engine = DocumentSuggestionEngine()
-            result_data['suggested_documents'] = suggestion_engine.suggest_documents(result_data)
+            data['suggested_documents'] = suggestion_engine.suggest_documents(data)
             
             # Process document workflow
             doc_workflow = DocumentWorkflowAutomation(DocumentAnalyzer())
-            result_data['document_workflow'] = doc_workflow.process_document_workflow(result_data)
+            data['document_workflow'] = doc_workflow.process_document_workflow(data)
             
-            # Add claims document automation
-            if classification.startswith("Claims"):
-                claims_automation_result = automated_claims_workflow(ticket_id)
-                result_data['claims_automation'] = claims_automation_result
-    
-                # If documents are missing, add the generated response
-                if claims_automation_result.get('success') and claims_automation_result.get('result'):
-                     if claims_automation_result['result'].get('documents', {}).get('missing_required'):
-                         result_data['suggested_response'] = claims_automation_result['result']['generated_response']
+            # Claims document check only; replying, retagging and the insurer
+            # child ticket are left to the agent (the RUN_CLAIMS_WORKFLOW action)
+            if data.get('Classification', 'Unknown').startswith("Claims"):
+                data['claims_analysis'] = process_claims_ticket_with_documents(ticket_id, ticket_context=ticket_context)
     
         except Exception as e:
             print(f"Error in document analysis: {e}")
-            result_data['attachment_analysis'] = {'error': str(e)}
+            data['attachment_analysis'] = {'error': str(e)}
+        return {key: value for key, value in data.items() if before.get(key) is not value}
+
+    pipeline = StagePipeline([
+        PipelineStage('summary', run_summary, required=True),
+        PipelineStage('metadata', run_metadata),
+        PipelineStage('comprehensive', run_comprehensive),
+        PipelineStage('pending', run_pending, deps=('comprehensive',)),
+        PipelineStage('actions', run_actions, deps=('summary', 'metadata', 'pending')),
+        PipelineStage('predictions', run_predictions, deps=('summary', 'metadata', 'pending')),
+        PipelineStage('workflow', run_workflow, deps=('metadata',)),
+        PipelineStage('suggested_response', run_suggested_response, deps=('summary', 'metadata', 'pending')),
+        PipelineStage('sop_steps', run_sop_steps, deps=('summary', 'workflow')),
+        PipelineStage('attachments', run_attachments, deps=('metadata',)),
+    ], timeouts=PIPELINE_STAGE_TIMEOUTS)
+
+    try:
+        with cancellation_scope(cancel_token or current_cancellation_token()):
+            result_data, stage_status = pipeline.run({'ticket_context': ticket_context}, on_stage=on_stage_complete)
+    except PipelineAbort as abort:
+        return abort.result
+    except OperationCancelled:
+        print(f"Processing of ticket {ticket_id} cancelled")
+        return {'error': 'Processing cancelled', 'cancelled': True}
+
+    # If documents are missing, the claims document request replaces the generated
+    # response, and the agent is offered the claims workflow as an action
+    claims_analysis = result_data.get('claims_analysis') or {}
+    if claims_analysis.get('success') and claims_analysis.get('is_claims'):
+        if claims_analysis.get('documents', {}).get('missing_required'):
+            result_data['suggested_response'] = claims_analysis['generated_response']
+        result_data['autonomous_actions'] = list(result_data.get('autonomous_actions') or []) + [
+            claims_workflow_action(ticket_id, claims_analysis)
+        ]
+
+    result_data['stage_status'] = stage_status
+    stage_lap('pipeline')
+    for name, info in stage_status.items():
+        add_stage_time(name, info['seconds'])
     
     return result_data
 
 # ========== NEW: Additional Helper Functions ==========
 
-def get_pending_status_summary(ticket_id):
+def get_pending_status_summary(ticket_id, ticket_context=None):
     """Quick function to get just the pending status information"""
     analyzer = EnhancedTicketAnalyzer(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
+    ctx = ticket_context or TicketContext(ticket_id)
     
-    ticket_data = fetch_ticket_by_id(ticket_id)
+    ticket_data = ctx.ticket
     if not ticket_data:
         return {'error': f'Could not fetch ticket {ticket_id}'}
     
-    conversations = fetch_all_ticket_conversations(ticket_id)
-    raw_content, _ = extract_email_content_and_attachments(ticket_data, conversations)
+    conversations = ctx.conversations
+    raw_content = ctx.raw_ticket_content
     
     status = ticket_data.get('status')
     status_info = analyzer.status_mappings.get(status, {})
@@ -8367,12 +10989,12 @@ def get_pending_status_summary(ticket_id):
         )
     }
 
-def analyze_ticket_comprehensively(ticket_id):
+def analyze_ticket_comprehensively(ticket_id, ticket_context=None):
     """Main function to analyze ticket with children and pending status"""
     analyzer = EnhancedTicketAnalyzer(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
     
     try:
-        result = analyzer.analyze_ticket_with_children(ticket_id)
+        result = analyzer.analyze_ticket_with_children(ticket_id, ticket_context=ticket_context)
         if 'error' in result:
             return result
         formatted_result = analyzer.format_analysis_for_display(result)
@@ -8426,9 +11048,6 @@ def print_ticket_summary(ticket_id):
             print(f"• [{insight['type'].upper()}] {insight['message']}")
             print(f"  Action: {insight['action']}")
             
-# Ensure all systems are initialized
-initialize_autonomous_systems()
-
 # Export all necessary items
 __all__ = [
     # Main functions
@@ -8441,6 +11060,15 @@ __all__ = [
     'workflow_engine',
     'predictive_engine',
     'smart_response_generator',
+    'get_autonomous_action_system',
+    'get_workflow_engine',
+    'get_predictive_engine',
+    'get_smart_response_generator',
+    'get_anthropic_client',
+    'BusinessCalendar',
+    'BusinessCalendarCoverageError',
+    'get_business_calendar',
+    'business_hours_between',
     
     # Helper functions
     'calculate_workflow_progress',
@@ -8452,6 +11080,32 @@ __all__ = [
     'WorkflowAutomationEngine',
     'PredictiveAnalyticsEngine',
     'SmartResponseGenerator',
+    'TicketContext',
+    'TicketSummaryStore',
+    'get_summary_store',
+    'get_classification_cache_stats',
+    'call_claude',
+    'get_claude_cache_stats',
+    'get_claude_usage_stats',
+    'stream_claude',
+    'get_enhanced_claude_answer_stream',
+    'prepare_image_for_ocr',
+    'prompt_block',
+    'BatchProcessor',
+    'run_batch',
+    'fetch_ticket_ids_for_query',
+    'StagePipeline',
+    'CancellationToken',
+    'OperationCancelled',
+    'cancellation_scope',
+    'PipelineStage',
+    'TicketSyncWorker',
+    'get_ticket_mirror',
+    'start_ticket_sync',
+    'stop_ticket_sync',
+    'export_ticket_summaries',
+    'FreshdeskClient',
+    'freshdesk_client',
     # Add these new exports
     'EnhancedContextualRoutingAnalyzer',
     'EnhancedSmartResponseGenerator',
@@ -8466,6 +11120,7 @@ __all__ = [
     'generate_document_request_response',
     'process_claims_ticket_with_documents',
     'automated_claims_workflow',
+    'claims_workflow_action',
     'send_automated_response',
     'update_ticket_tags',
     'update_ticket_status',
@@ -8498,13 +11153,8 @@ def _format_received_documents(ticket_data):
         return "No documents received yet."
     return "\n- " + "\n- ".join(docs)
 
-def get_enhanced_claude_answer(ticket_content_text: str, user_question: str, ticket_data: dict = None) -> str:
-    """Enhanced insurance broker agent that provides contextual responses based on complete ticket analysis"""
-    if not anthropic_client:
-        return "Error: Claude client not initialized. Please check your API configuration."
-    
-    # Enhanced system prompt for insurance broker specialization
-    INSURANCE_BROKER_SYSTEM_PROMPT = """You are an expert insurance broker agent specializing in claims and endorsements for InsuranceDekho. 
+# Enhanced system prompt for insurance broker specialization
+INSURANCE_BROKER_SYSTEM_PROMPT = """You are an expert insurance broker agent specializing in claims and endorsements for InsuranceDekho. 
     You have deep knowledge of:
     - Motor, Health, Life, and MSME insurance claims processing
     - Policy endorsements (financial and non-financial)
@@ -8524,20 +11174,24 @@ def get_enhanced_claude_answer(ticket_content_text: str, user_question: str, tic
 
     Act as a knowledgeable insurance professional who can solve complex claims and endorsement issues."""
 
-    try:
-        # Extract comprehensive context from ticket data
-        context_info = _extract_comprehensive_context(ticket_data) if ticket_data else {}
-        
-        # Build enhanced prompt with full context
-        enhanced_prompt = f"""
-TICKET ANALYSIS CONTEXT:
-{_format_ticket_context(ticket_data, context_info)}
-
-CUSTOMER QUESTION: {user_question}
+def _build_enhanced_answer_messages(ticket_content_text, user_question, ticket_data=None):
+    """Build the Claude messages for get_enhanced_claude_answer and its streaming variant"""
+    # Extract comprehensive context from ticket data
+    context_info = _extract_comprehensive_context(ticket_data) if ticket_data else {}
 
+    # Build enhanced prompt with full context
+    # Ticket content and analysis context come first so they are cached
+    # across questions; only the question varies
+    context_prompt = f"""
 TICKET CONTENT:
 {ticket_content_text[:3000]}...
 
+TICKET ANALYSIS CONTEXT:
+{_format_ticket_context(ticket_data, context_info)}
+"""
+    enhanced_prompt = f"""
+CUSTOMER QUESTION: {user_question}
+
 Based on the complete ticket analysis above, provide a comprehensive response as an insurance broker agent. 
 
 Consider:
@@ -8551,21 +11205,58 @@ Consider:
 Provide a helpful, professional response that addresses the customer's question while considering the full context of their case.
 """
 
-        response = anthropic_client.messages.create(
+    return [{"role": "user", "content": [
+        prompt_block(context_prompt, cache=True),
+        prompt_block(enhanced_prompt)
+    ]}]
+
+def get_enhanced_claude_answer(ticket_content_text: str, user_question: str, ticket_data: dict = None) -> str:
+    """Enhanced insurance broker agent that provides contextual responses based on complete ticket analysis"""
+    if not get_anthropic_client():
+        return "Error: Claude client not initialized. Please check your API configuration."
+
+    try:
+        answer = call_claude(
             model="claude-3-haiku-20240307",
             max_tokens=1500,
-            messages=[{"role": "user", "content": enhanced_prompt}],
+            messages=_build_enhanced_answer_messages(ticket_content_text, user_question, ticket_data),
             system=INSURANCE_BROKER_SYSTEM_PROMPT,
             temperature=0.6
         )
         
-        return response.content[0].text.strip()
+        return answer.strip()
         
     except Exception as e:
         print(f"Error in enhanced Claude response: {e}")
         # Fallback to basic response
         return _generate_fallback_insurance_response(user_question, ticket_data)
 
+def get_enhanced_claude_answer_stream(ticket_content_text: str, user_question: str, ticket_data: dict = None):
+    """
+    Streaming variant of get_enhanced_claude_answer that yields the answer
+    in text deltas as Claude generates it, so the GUI can show it right away.
+    """
+    if not get_anthropic_client():
+        yield "Error: Claude client not initialized. Please check your API configuration."
+        return
+
+    streamed = False
+    try:
+        for delta in stream_claude(
+            model="claude-3-haiku-20240307",
+            max_tokens=1500,
+            messages=_build_enhanced_answer_messages(ticket_content_text, user_question, ticket_data),
+            system=INSURANCE_BROKER_SYSTEM_PROMPT,
+            temperature=0.6
+        ):
+            streamed = True
+            yield delta
+    except Exception as e:
+        print(f"Error in enhanced Claude response stream: {e}")
+        # Fallback to basic response if nothing was streamed yet
+        if not streamed:
+            yield _generate_fallback_insurance_response(user_question, ticket_data)
+
 def _extract_comprehensive_context(ticket_data: dict) -> dict:
     """Extract comprehensive context from ticket data for better responses"""
     if not ticket_data:
@@ -8723,6 +11414,277 @@ Please ensure your ticket ID is properly loaded so I can provide specific guidan
 
 
 
+# ========== BATCH PROCESSING ==========
+
+BATCH_WORKERS = _config_value('BATCH_WORKERS', 4)
+BATCH_MAX_ATTEMPTS = _config_value('BATCH_MAX_ATTEMPTS', 3)
+FRESHDESK_SEARCH_MAX_PAGES = 10
+
+class BatchQueueStore(_SQLiteStore):
+    """
+    Checkpointed work queue for batch runs.
+
+    Every ticket of a job is a row whose status moves pending -> running ->
+    done / skipped / failed. Rows are updated as each ticket finishes, so a job
+    interrupted by a crash or a closed laptop picks up where it stopped.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            job_id TEXT PRIMARY KEY,
+            source TEXT,
+            created_at TEXT,
+            finished_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS batch_items (
+            job_id TEXT,
+            ticket_id TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            duration REAL,
+            stage_timings TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (job_id, ticket_id)
+        );
+    """
+
+    def create_job(self, job_id, ticket_ids, source=""):
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO batch_jobs (job_id, source, created_at) VALUES (?, ?, ?)",
+                (job_id, source, now)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO batch_items (job_id, ticket_id, status, updated_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                [(job_id, str(ticket_id), now) for ticket_id in ticket_ids]
+            )
+
+    def job_exists(self, job_id):
+        return self._connect().execute(
+            "SELECT 1 FROM batch_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone() is not None
+
+    def latest_unfinished_job(self):
+        row = self._connect().execute(
+            "SELECT job_id FROM batch_jobs WHERE finished_at IS NULL ORDER BY created_at DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def reset_running(self, job_id):
+        """Put tickets that were in flight when the job died back in the queue"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE batch_items SET status = 'pending' WHERE job_id = ? AND status = 'running'",
+                (job_id,)
+            )
+
+    def pending_ticket_ids(self, job_id, max_attempts):
+        rows = self._connect().execute(
+            "SELECT ticket_id FROM batch_items WHERE job_id = ? "
+            "AND (status = 'pending' OR (status = 'failed' AND attempts < ?)) ORDER BY rowid",
+            (job_id, max_attempts)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark(self, job_id, ticket_id, status, error=None, duration=None, stage_timings=None):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE batch_items SET status = ?, error = ?, duration = ?, stage_timings = ?, "
+                "attempts = attempts + ?, updated_at = ? WHERE job_id = ? AND ticket_id = ?",
+                (status, error, duration,
+                 json.dumps(stage_timings) if stage_timings is not None else None,
+                 1 if status == 'running' else 0,
+                 datetime.now().isoformat(), job_id, str(ticket_id))
+            )
+
+    def counts(self, job_id):
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM batch_items WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def finish_job(self, job_id):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE batch_jobs SET finished_at = ? WHERE job_id = ?",
+                (datetime.now().isoformat(), job_id)
+            )
+
+_batch_queue_store = None
+_batch_queue_store_lock = threading.Lock()
+
+def get_batch_queue_store():
+    """Return the shared BatchQueueStore"""
+    global _batch_queue_store
+    with _batch_queue_store_lock:
+        if _batch_queue_store is None:
+            _batch_queue_store = BatchQueueStore(BATCH_QUEUE_DB_FILE)
+        return _batch_queue_store
+
+def fetch_ticket_ids_for_query(query):
+    """
+    Return the ids of all tickets matching a Freshdesk filter query,
+    e.g. "status:5 AND created_at:>'2024-01-01'".
+
+    The search API returns at most 10 pages of 30 results, so split long
+    backfills into date ranges (one query per week or month).
+    """
+    url = f"https://{FRESHDESK_DOMAIN}.freshdesk.com/api/v2/search/tickets"
+    ticket_ids = []
+    for page in range(1, FRESHDESK_SEARCH_MAX_PAGES + 1):
+        response = freshdesk_client.get(url, params={'query': f'"{query}"', 'page': page})
+        if response.status_code != 200:
+            print(f"❌ Ticket search failed on page {page}: Status {response.status_code}, Response: {response.text}")
+            break
+        data = response.json()
+        results = data.get('results', [])
+        ticket_ids.extend(str(t['id']) for t in results)
+        if not results or len(ticket_ids) >= data.get('total', 0):
+            break
+    else:
+        print(f"⚠️ Search for {query!r} hit the {FRESHDESK_SEARCH_MAX_PAGES} page limit; narrow the date range.")
+    return ticket_ids
+
+class BatchProcessor:
+    """
+    Processes many tickets with a worker pool on top of a BatchQueueStore.
+
+    process_func is called with a ticket id and defaults to the summary
+    pipeline (process_ticket_id_orignal); pass process_ticket_id_enhanced for
+    the full analysis. Tickets already in the summary store are skipped unless
+    skip_processed is False.
+    """
+
+    def __init__(self, process_func=None, workers=None, skip_processed=True,
+                 max_attempts=None, progress_callback=None, store=None):
+        self.process_func = process_func or process_ticket_id_orignal
+        self.workers = workers or BATCH_WORKERS
+        self.skip_processed = skip_processed
+        self.max_attempts = max_attempts or BATCH_MAX_ATTEMPTS
+        self.progress_callback = progress_callback
+        self.store = store or get_batch_queue_store()
+
+    def run(self, ticket_ids=None, query=None, job_id=None):
+        """
+        Run a job and return its report.
+
+        A new job is created from ticket_ids or a Freshdesk query. Passing the
+        job_id of an existing job resumes it; with no arguments at all the most
+        recent unfinished job is resumed.
+        """
+        store = self.store
+        if ticket_ids is None and query is None and job_id is None:
+            job_id = store.latest_unfinished_job()
+            if job_id is None:
+                return {'error': 'No ticket ids, query or unfinished job to resume'}
+
+        if job_id and store.job_exists(job_id):
+            print(f"Resuming batch job {job_id}")
+            store.reset_running(job_id)
+        else:
+            if ticket_ids is None:
+                ticket_ids = fetch_ticket_ids_for_query(query) if query else []
+            ticket_ids = list(dict.fromkeys(str(t) for t in ticket_ids))
+            job_id = job_id or datetime.now().strftime("batch-%Y%m%d-%H%M%S")
+            store.create_job(job_id, ticket_ids, source=query or f"{len(ticket_ids)} ticket ids")
+            print(f"Created batch job {job_id} with {len(ticket_ids)} tickets")
+
+        pending = store.pending_ticket_ids(job_id, self.max_attempts)
+        if self.skip_processed:
+            processed = get_processed_ticket_ids()
+            for ticket_id in pending:
+                if ticket_id in processed:
+                    store.mark(job_id, ticket_id, 'skipped')
+            pending = [t for t in pending if t not in processed]
+
+        print(f"Batch job {job_id}: {len(pending)} tickets to process with {self.workers} workers")
+        start = time.time()
+        stage_totals = {}
+        processed_count = 0
+        failed_count = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._process_one, job_id, t): t for t in pending}
+            for future in as_completed(futures):
+                ticket_id = futures[future]
+                status, duration, timings = future.result()
+                processed_count += 1
+                if status == 'failed':
+                    failed_count += 1
+                for stage, seconds in timings.items():
+                    totals = stage_totals.setdefault(stage, {'total': 0.0, 'count': 0, 'max': 0.0})
+                    totals['total'] += seconds
+                    totals['count'] += 1
+                    totals['max'] = max(totals['max'], seconds)
+
+                elapsed = time.time() - start
+                print(f"[{processed_count}/{len(pending)}] Ticket {ticket_id}: {status} in {duration:.1f}s "
+                      f"({processed_count / elapsed * 60:.1f} tickets/min)")
+                if self.progress_callback:
+                    self.progress_callback(ticket_id, status, processed_count, len(pending))
+
+        elapsed = time.time() - start
+        counts = store.counts(job_id)
+        if not store.pending_ticket_ids(job_id, self.max_attempts):
+            store.finish_job(job_id)
+
+        return {
+            'job_id': job_id,
+            'counts': counts,
+            'processed': processed_count,
+            'failed': failed_count,
+            'elapsed_seconds': round(elapsed, 1),
+            'tickets_per_minute': round(processed_count / elapsed * 60, 2) if elapsed else 0.0,
+            'stage_timings': {
+                stage: {
+                    'total': round(t['total'], 2),
+                    'avg': round(t['total'] / t['count'], 2),
+                    'max': round(t['max'], 2)
+                }
+                for stage, t in stage_totals.items()
+            }
+        }
+
+    def _process_one(self, job_id, ticket_id):
+        """Process one ticket on a worker thread; returns (status, duration, stage timings)"""
+        timer = StageTimer()
+        _stage_timer_local.timer = timer
+        self.store.mark(job_id, ticket_id, 'running')
+        start = time.time()
+        status, error = 'done', None
+        try:
+            result = self.process_func(ticket_id)
+            if not result:
+                status, error = 'failed', 'No result returned'
+            elif isinstance(result, dict) and result.get('error'):
+                status, error = 'failed', str(result['error'])
+        except Exception as e:
+            status, error = 'failed', f"{type(e).__name__}: {e}"
+        finally:
+            timer.lap('other')
+            _stage_timer_local.timer = None
+
+        duration = time.time() - start
+        timings = {stage: round(seconds, 3) for stage, seconds in timer.timings.items() if seconds >= 0.0005}
+        self.store.mark(job_id, ticket_id, status, error=error, duration=round(duration, 3), stage_timings=timings)
+        return status, duration, timings
+
+def run_batch(ticket_ids=None, query=None, job_id=None, workers=None, enhanced=False, skip_processed=True):
+    """Convenience wrapper around BatchProcessor; see BatchProcessor.run"""
+    processor = BatchProcessor(
+        process_func=process_ticket_id_enhanced if enhanced else process_ticket_id_orignal,
+        workers=workers,
+        skip_processed=skip_processed
+    )
+    return processor.run(ticket_ids=ticket_ids, query=query, job_id=job_id)
+
 # ========== Main function for testing ==========
 if __name__ == "__main__":
     print("\n--- Starting Enhanced Freshdeskintegration with SOP Support ---")
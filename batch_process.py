@@ -0,0 +1,47 @@
+"""
+Batch ticket processing from the command line.
+
+Examples:
+    python batch_process.py --ids 5163041 5163042 5163050
+    python batch_process.py --query "created_at:>'2024-01-01' AND created_at:<'2024-02-01'"
+    python batch_process.py --resume                  # latest unfinished job
+    python batch_process.py --resume batch-20240301-220000
+"""
+
+import argparse
+import json
+
+from ID_BRAIN_SMART_ROUTING1 import run_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--ids', nargs='+', help='ticket ids to process')
+    source.add_argument('--ids-file', help='file with one ticket id per line')
+    source.add_argument('--query', help='Freshdesk filter query')
+    source.add_argument('--resume', nargs='?', const='', metavar='JOB_ID', help='resume a job (default: latest unfinished)')
+    parser.add_argument('--workers', type=int, help='worker threads (default: BATCH_WORKERS)')
+    parser.add_argument('--enhanced', action='store_true', help='run the full enhanced analysis instead of the summary only')
+    parser.add_argument('--reprocess', action='store_true', help='do not skip tickets already in the summary store')
+    parser.add_argument('--job-id', help='name for a new job')
+    args = parser.parse_args()
+
+    ticket_ids = args.ids
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            ticket_ids = [line.strip() for line in f if line.strip()]
+
+    report = run_batch(
+        ticket_ids=ticket_ids,
+        query=args.query,
+        job_id=args.resume or args.job_id,
+        workers=args.workers,
+        enhanced=args.enhanced,
+        skip_processed=not args.reprocess
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
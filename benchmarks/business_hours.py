@@ -0,0 +1,64 @@
+"""
+Benchmark: business-hours age of many tickets, hourly loop vs. BusinessCalendar.
+
+Builds random ticket creation times up to --max-days old and measures the
+per-ticket cost of the old hour-by-hour loop (9-18, Mon-Fri) and of the
+closed-form BusinessCalendar that replaced it, as a batch SLA sweep would.
+
+Usage:
+    python benchmarks/business_hours.py [--tickets 5000] [--max-days 180] [--team claims]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ID_BRAIN_SMART_ROUTING1 import get_business_calendar
+
+
+def hourly_loop(start_time, end_time):
+    """The previous EnhancedTicketAnalyzer.calculate_business_hours"""
+    business_hours = 0
+    current = start_time.replace(hour=9, minute=0, second=0, microsecond=0)
+    while current < end_time:
+        if current.weekday() < 5 and 9 <= current.hour < 18:
+            business_hours += 1
+        current += timedelta(hours=1)
+    return business_hours
+
+
+def timed(func, intervals):
+    start = time.perf_counter()
+    for created, now in intervals:
+        func(created, now)
+    return (time.perf_counter() - start) / len(intervals) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=5000, help='number of ticket ages to compute')
+    parser.add_argument('--max-days', type=int, default=180, help='oldest ticket age in days')
+    parser.add_argument('--team', default=None, help='shift calendar to use')
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    intervals = [
+        (now - timedelta(minutes=random.randrange(args.max_days * 24 * 60)), now)
+        for _ in range(args.tickets)
+    ]
+    calendar = get_business_calendar(args.team)
+
+    loop_us = timed(hourly_loop, intervals)
+    calendar_us = timed(calendar.business_seconds, intervals)
+    print(f"{args.tickets} tickets up to {args.max_days} days old")
+    print(f"hourly loop:      {loop_us:>10.1f} us/ticket")
+    print(f"BusinessCalendar: {calendar_us:>10.1f} us/ticket ({loop_us / calendar_us:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
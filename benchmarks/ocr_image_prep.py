@@ -0,0 +1,87 @@
+"""
+Benchmark: upload size vs. OCR confidence for OCR image preparation settings.
+
+Runs prepare_image_for_ocr over sample images (phone photos, scans, rendered
+PDF pages) for several max-side / JPEG-quality combinations and reports the
+upload size and encode time. With --ocr each prepared image is also sent to
+the Image Reader API and the returned confidence and text length are shown.
+
+Usage:
+    python benchmarks/ocr_image_prep.py path/to/images/*.jpg [--ocr]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ID_BRAIN_SMART_ROUTING1 import DocumentAnalyzer, prepare_image_for_ocr, sniff_image_type
+
+SETTINGS = [
+    (None, None),  # original bytes
+    (3000, 90),
+    (2200, 85),
+    (1600, 85),
+    (1600, 75),
+    (1200, 75),
+]
+
+
+def run_ocr(analyzer, content, filename, mime_type):
+    """Upload already prepared bytes and return (confidence, text length, seconds)"""
+    import requests
+    start = time.time()
+    response = requests.post(
+        analyzer.api_endpoint,
+        files={'image': (filename, content, mime_type)},
+        timeout=60
+    )
+    response.raise_for_status()
+    result = response.json()
+    return result.get('confidence', 0.0), len(result.get('extracted_text', '')), time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='+', help='sample image files')
+    parser.add_argument('--ocr', action='store_true', help='also call the Image Reader API')
+    args = parser.parse_args()
+
+    analyzer = DocumentAnalyzer() if args.ocr else None
+
+    header = f"{'image':<30} {'setting':<12} {'bytes':>10} {'ratio':>6} {'encode ms':>10}"
+    if args.ocr:
+        header += f" {'confidence':>10} {'chars':>7} {'ocr s':>6}"
+    print(header)
+    print('-' * len(header))
+
+    for path in args.images:
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        for max_side, quality in SETTINGS:
+            start = time.time()
+            if max_side is None:
+                extension, mime_type = sniff_image_type(original)
+                content, filename = original, f'document.{extension}'
+                label = 'original'
+            else:
+                content, filename, mime_type = prepare_image_for_ocr(original, max_side=max_side, quality=quality)
+                label = f'{max_side}px q{quality}'
+            encode_ms = (time.time() - start) * 1000
+
+            line = (f"{os.path.basename(path)[:30]:<30} {label:<12} {len(content):>10} "
+                    f"{len(content) / len(original):>6.2f} {encode_ms:>10.1f}")
+            if args.ocr:
+                try:
+                    confidence, chars, seconds = run_ocr(analyzer, content, filename, mime_type)
+                    line += f" {confidence:>10.3f} {chars:>7} {seconds:>6.2f}"
+                except Exception as e:
+                    line += f"  OCR failed: {e}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
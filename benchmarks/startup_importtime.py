@@ -0,0 +1,86 @@
+"""
+Benchmark: cold-start cost of importing the backend module.
+
+Imports ID_BRAIN_SMART_ROUTING1 in fresh interpreters (nothing cached in
+sys.modules) and reports the wall time of the import. With --importtime the
+output of `python -X importtime` for one run is parsed and the slowest
+modules (cumulative microseconds) are listed, which shows what the GUI pays
+for before its first window appears. --eager sets LAZY_STARTUP=false to
+compare against eager initialization of the Claude client and engines.
+
+Usage:
+    python benchmarks/startup_importtime.py [--runs 5] [--importtime] [--top 20] [--eager]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = 'ID_BRAIN_SMART_ROUTING1'
+
+TIMED_IMPORT = (
+    "import time; start = time.perf_counter(); "
+    f"import {MODULE}; "
+    "print('IMPORT_SECONDS', time.perf_counter() - start)"
+)
+
+
+def run_python(args, env):
+    return subprocess.run(
+        [sys.executable] + args, cwd=ROOT, env=env,
+        capture_output=True, text=True
+    )
+
+
+def timed_import(env):
+    """Import the module in a fresh interpreter and return the seconds it took"""
+    result = run_python(['-c', TIMED_IMPORT], env)
+    for line in result.stdout.splitlines():
+        if line.startswith('IMPORT_SECONDS'):
+            return float(line.split()[1])
+    raise RuntimeError(f"import failed:\n{result.stderr.strip()}")
+
+
+def importtime_report(env, top):
+    """Return the `top` slowest (cumulative us, self us, module) rows of -X importtime"""
+    result = run_python(['-X', 'importtime', '-c', f'import {MODULE}'], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to time')
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports of one run')
+    parser.add_argument('--top', type=int, default=20, help='rows to show with --importtime')
+    parser.add_argument('--eager', action='store_true', help='run with LAZY_STARTUP=false')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['LAZY_STARTUP'] = 'false' if args.eager else 'true'
+    env['TICKET_SYNC_ENABLED'] = 'false'
+
+    times = [timed_import(env) for _ in range(args.runs)]
+    mode = 'eager' if args.eager else 'lazy'
+    print(f"import {MODULE} ({mode}, {args.runs} runs): "
+          f"median {statistics.median(times) * 1000:.0f} ms, "
+          f"min {min(times) * 1000:.0f} ms, max {max(times) * 1000:.0f} ms")
+
+    if args.importtime:
+        print()
+        print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+        for cumulative_us, self_us, name in importtime_report(env, args.top):
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+
+if __name__ == '__main__':
+    main()
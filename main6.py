@@ -12,12 +12,16 @@ load_dotenv()
 # Import enhanced backend functions
 from ID_BRAIN_SMART_ROUTING1 import (
     process_ticket_id_enhanced,
-    get_enhanced_claude_answer,
-    autonomous_action_system,
+    get_enhanced_claude_answer_stream,
+    get_autonomous_action_system,
     process_ticket_attachments_enhanced,
     analyze_ticket_comprehensively,
     get_pending_status_summary,
     print_ticket_summary,
+    start_ticket_sync,
+    CancellationToken,
+    OperationCancelled,
+    cancellation_scope,
 )
 print("Successfully imported enhanced functions from A_BRAIN_SMART_ROUTING1.py")
 
@@ -31,6 +35,7 @@ executor = ThreadPoolExecutor(max_workers=2)
 # Global variables
 current_active_ticket_data = None
 active_workflow_id = None
+current_search_token = None  # CancellationToken of the search in progress
 workflow_step_status = {}  # Track individual step completion
 
 # Status map
@@ -94,6 +99,9 @@ def main(page: ft.Page):
     if os.path.exists(FULL_ICON_PATH):
         page.window_icon = FULL_ICON_PATH
 
+    # Keep the local ticket mirror warm so recently updated tickets open instantly
+    start_ticket_sync()
+
     # --- Constants for Styling ---
     PRIMARY_BG_COLOR = "#1A1A1A"
     SECONDARY_BG_COLOR = "#2A2A2A"
@@ -720,7 +728,8 @@ def main(page: ft.Page):
 
     def execute_action_sync(action: dict):
         """Execute an autonomous action"""
-        if not autonomous_action_system:
+        action_system = get_autonomous_action_system()
+        if not action_system:
             show_message("Autonomous action system not available", error=True)
             return
 
@@ -757,13 +766,15 @@ def main(page: ft.Page):
                 page.run_thread(update_error)
 
         def execute_action():
-            return autonomous_action_system.execute_action(action)
+            return action_system.execute_action(action)
         
         future = executor.submit(execute_action)
         future.add_done_callback(handle_execution_result)
     
     def on_back_to_placeholder():
         global current_active_ticket_data, active_workflow_id, workflow_step_status
+        if current_search_token is not None:
+            current_search_token.cancel()
         current_active_ticket_data = None
         active_workflow_id = None
         workflow_step_status = {}
@@ -831,27 +842,62 @@ def main(page: ft.Page):
 
     async def on_search_click_enhanced(e):
         """Enhanced search with document analysis"""
-        global current_active_ticket_data, active_workflow_id
+        global current_active_ticket_data, active_workflow_id, current_search_token
 
         ticket_id_str = search_entry.value.strip()
         if not ticket_id_str.isdigit():
             show_message("Please enter a valid numerical Ticket ID.", error=True)
             return
 
-        search_button.disabled = True
-        search_entry.disabled = True
+        # A new search supersedes the one in progress: stop it and drop its results
+        if current_search_token is not None:
+            current_search_token.cancel()
+        token = CancellationToken()
+        current_search_token = token
+
         progressbar.value = None
         progressbar.visible = True
         page.update()
 
         result_data = None
+        suggested_response_field.value = ""
+        page.update()
+
+        def on_suggested_response_delta(delta):
+            # Show the suggested response draft while the rest of the analysis runs
+            if token.cancelled:
+                return
+            suggested_response_field.value = (suggested_response_field.value or "") + delta
+            page.update()
+
+        def on_stage_complete(stage, partial_data):
+            # Render each stage as it finishes: ticket details and classification
+            # show up first, the summary and predictions fill in later.
+            # The complete result is rendered again once processing is done.
+            if token.cancelled or stage == 'attachments' or not partial_data.get('Ticket ID'):
+                return
+            pending = "Generating summary..."
+            display_rca_result_enhanced({'Problem': pending, 'Why': pending, 'Solution': pending, **partial_data})
+            update_info_cards_enhanced(partial_data)
+            if stage == 'actions':
+                display_autonomous_actions(partial_data)
+
         try:
             # 1) Fetch the basic ticket data
-            future = executor.submit(process_ticket_id_enhanced, ticket_id_str)
+            future = executor.submit(
+                process_ticket_id_enhanced,
+                ticket_id_str,
+                on_suggested_response_delta,
+                on_stage_complete,
+                token
+            )
             result_data = await asyncio.wrap_future(future)
+            if token.cancelled:
+                return
 
-            if 'error' in result_data:
-                show_message(f"Error: {result_data['error']}", error=True)
+            if not result_data or 'error' in result_data:
+                error = result_data['error'] if result_data else f"Ticket {ticket_id_str} could not be fetched"
+                show_message(f"Error: {error}", error=True)
                 on_back_to_placeholder()
                 return
 
@@ -863,26 +909,38 @@ def main(page: ft.Page):
 
             # 3) Inject comprehensive routing & action analysis
             try:
-                full_ctx = analyze_ticket_comprehensively(int(ticket_id_str))
+                full_ctx = analyze_ticket_comprehensively(
+                    int(ticket_id_str),
+                    ticket_context=result_data.get('ticket_context')
+                )
                 result_data['routing_analysis'] = full_ctx.get('routing_analysis', {})
                 result_data['action_analysis']  = full_ctx.get('action_analysis', {})
             except Exception as ex:
                 print(f"Error merging comprehensive analysis: {ex}")
+            if token.cancelled:
+                return
 
             # 4) Update the UI
             display_rca_result_enhanced(result_data)
             update_info_cards_enhanced(result_data)
             display_autonomous_actions(result_data)
 
-            # 5) If there are attachments, analyze them too
-            if result_data.get('attachments'):
+            # 5) Show the pipeline's document analysis; analyze the attachments
+            #    here only when the pipeline did not
+            if 'attachment_analysis' in result_data:
+                display_autonomous_actions_with_documents(result_data)
+            elif result_data.get('attachments'):
                 show_message("Analyzing attached documents...")
-                future_docs = executor.submit(
-                    process_ticket_attachments_enhanced,
-                    current_active_ticket_data
-                )
+
+                def analyze_documents(ticket_data):
+                    with cancellation_scope(token):
+                        return process_ticket_attachments_enhanced(ticket_data)
+
+                future_docs = executor.submit(analyze_documents, current_active_ticket_data)
                 try:
                     updated_data = await asyncio.wrap_future(future_docs)
+                    if token.cancelled:
+                        return
                     current_active_ticket_data.update(updated_data)
                     display_autonomous_actions_with_documents(current_active_ticket_data)
                 except Exception as ex:
@@ -908,6 +966,9 @@ def main(page: ft.Page):
             else:
                 show_message(f"Successfully processed ticket {ticket_id_str}!")
 
+        except OperationCancelled:
+            print(f"Search for ticket {ticket_id_str} was superseded")
+
         except Exception as ex:
             print(f"Exception in search: {type(ex).__name__}: {ex}")
             traceback.print_exc()
@@ -915,11 +976,10 @@ def main(page: ft.Page):
             on_back_to_placeholder()
 
         finally:
-            # Reset buttons & hide progressbar
-            search_button.disabled = False
-            search_entry.disabled = False
-            progressbar.visible = False
-            page.update()
+            # Hide the progressbar unless a newer search is still running
+            if current_search_token is token:
+                progressbar.visible = False
+                page.update()
 
 
     def add_message_to_chat(sender: str, message: str, is_user: bool = False, is_action: bool = False):
@@ -929,6 +989,13 @@ def main(page: ft.Page):
             else (ft.Colors.PURPLE_900 if is_action else SECONDARY_BG_COLOR)
         )
         text_align = ft.TextAlign.RIGHT if is_user else ft.TextAlign.LEFT
+        message_text = ft.Text(
+            message,
+            size=14,
+            color=TEXT_COLOR_PRIMARY,
+            selectable=True,
+            max_lines=None
+        )
 
         chat_messages_column.controls.append(
             ft.Row(
@@ -949,13 +1016,7 @@ def main(page: ft.Page):
                                         text_align=text_align
                                     ),
                                 ]),
-                                ft.Text(
-                                    message,
-                                    size=14,
-                                    color=TEXT_COLOR_PRIMARY,
-                                    selectable=True,
-                                    max_lines=None
-                                ),
+                                message_text,
                             ],
                             horizontal_alignment=(
                                 ft.CrossAxisAlignment.END if is_user
@@ -986,6 +1047,7 @@ def main(page: ft.Page):
             page.update()
 
         page.run_thread(scroll_to_bottom)
+        return message_text
 
     async def send_chat_message(e):
         user_message = chat_input_field.value.strip()
@@ -1001,12 +1063,13 @@ def main(page: ft.Page):
             progressbar.visible = True
             page.update()
 
-            ai_response = ""
             try:
                 if current_active_ticket_data is None:
-                    ai_response = (
+                    add_message_to_chat(
+                        "ID Brain AI",
                         "I need a Freshdesk ticket to answer questions. "
-                        "Please go to the 'ID Brain (RCA)' tab, enter a Ticket ID, and click 'Search' first."
+                        "Please go to the 'ID Brain (RCA)' tab, enter a Ticket ID, and click 'Search' first.",
+                        is_user=False
                     )
                 else:
                     action_keywords = [
@@ -1029,20 +1092,25 @@ def main(page: ft.Page):
                         f"Full Ticket Content: {current_active_ticket_data.get('raw_ticket_content', '')}"
                     )
 
-                    future = executor.submit(
-                        get_enhanced_claude_answer,
-                        ticket_content_for_qa,
-                        user_message,
-                        current_active_ticket_data if is_action_query else None
+                    # Render the answer into its bubble as Claude streams it
+                    response_text = add_message_to_chat(
+                        "ID Brain AI",
+                        "",
+                        is_user=False,
+                        is_action=is_action_query
                     )
-                    ai_response = await asyncio.wrap_future(future)
 
-                add_message_to_chat(
-                    "ID Brain AI",
-                    ai_response,
-                    is_user=False,
-                    is_action=is_action_query
-                )
+                    def stream_answer():
+                        for delta in get_enhanced_claude_answer_stream(
+                            ticket_content_for_qa,
+                            user_message,
+                            current_active_ticket_data if is_action_query else None
+                        ):
+                            response_text.value += delta
+                            page.update()
+
+                    future = executor.submit(stream_answer)
+                    await asyncio.wrap_future(future)
             except Exception as ex:
                 add_message_to_chat(
                     "ID Brain AI",
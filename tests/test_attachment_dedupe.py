@@ -0,0 +1,99 @@
+"""
+DocumentAnalyzer.analyze_all_attachments: byte-identical attachments share
+one analysis, look-alike documents are analyzed separately and only flagged.
+"""
+
+import io
+import tempfile
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+
+def id_card(holder):
+    """A card printed from one template; only the holder line differs"""
+    img = Image.new("RGB", (640, 400), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((20, 20, 620, 90), fill="navy")
+    draw.rectangle((40, 130, 200, 330), fill="gray")
+    draw.text((240, 200), holder, fill="black")
+    out = io.BytesIO()
+    img.save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    files = {}
+    analyzed = []
+
+    def download(url, max_bytes=None):
+        spool = tempfile.SpooledTemporaryFile()
+        spool.write(files[url])
+        spool.seek(0)
+        return spool, len(files[url]), {'Content-Type': 'image/png'}
+
+    def process(self, attachment, content=None):
+        analyzed.append(attachment['name'])
+        return {
+            'filename': attachment['name'],
+            'document_name': 'Aadhaar Card',
+            'category': 'identity',
+            'confidence': 0.9,
+            'extracted_data': {'holder': attachment['name']},
+        }
+
+    monkeypatch.setattr(brain.freshdesk_client, "download", download)
+    monkeypatch.setattr(brain.DocumentAnalyzer, "_should_use_direct_url", lambda self, *args: False)
+    monkeypatch.setattr(brain.DocumentAnalyzer, "_process_single_attachment", process)
+
+    def run(attachments):
+        entries = []
+        for name, content in attachments:
+            url = f"https://example.freshdesk.com/files/{len(files)}/{name}"
+            files[url] = content
+            entries.append({'name': name, 'size': len(content), 'attachment_url': url})
+        analyzer = brain.DocumentAnalyzer()
+        analyzer.max_workers = 1
+        return analyzer.analyze_all_attachments(entries), analyzed
+
+    return run
+
+
+def results_by_file(results):
+    return {result.get('original_filename', result['filename']): result for result in results['analyzed']}
+
+
+def test_look_alike_cards_are_analyzed_separately(analyzer):
+    first, second = id_card("RAMESH KUMAR 1234"), id_card("SUNITA DEVI 5678")
+    assert first != second
+    assert brain.dhashes_match(brain.image_dhash(first), brain.image_dhash(second))
+
+    results, analyzed = analyzer([("ramesh.png", first), ("sunita.png", second)])
+
+    assert analyzed == ["ramesh.png", "sunita.png"]
+    by_file = results_by_file(results)
+    assert by_file["sunita.png"]['extracted_data'] == {'holder': "sunita.png"}
+    assert by_file["sunita.png"]['possible_duplicate_of'] == "ramesh.png"
+    assert 'possible_duplicate_of' not in by_file["ramesh.png"]
+    assert results['statistics']['duplicates_skipped'] == 0
+    assert results['statistics']['possible_duplicates'] == 1
+
+
+def test_identical_files_share_one_analysis(analyzer):
+    card = id_card("RAMESH KUMAR 1234")
+
+    results, analyzed = analyzer([("card.png", card), ("card (1).png", card)])
+
+    assert analyzed == ["card.png"]
+    by_file = results_by_file(results)
+    assert by_file["card (1).png"]['duplicate_of'] == "card.png"
+    assert by_file["card (1).png"]['extracted_data'] == {'holder': "card.png"}
+    assert results['statistics']['duplicates_skipped'] == 1
+    assert results['statistics']['possible_duplicates'] == 0
@@ -0,0 +1,40 @@
+"""_config_value: config.json settings, environment fallback and defaults."""
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+
+@pytest.fixture
+def config(monkeypatch):
+    values = {}
+    monkeypatch.setattr(brain, "config", values)
+    return values
+
+
+def test_falsy_config_values_are_kept(config, monkeypatch):
+    monkeypatch.setenv("PDF_RENDER_PROCESSES", "4")
+    config.update({"PDF_RENDER_PROCESSES": 0, "OCR_IMAGE_PREPARE": False})
+
+    assert brain._config_value("PDF_RENDER_PROCESSES", 2) == 0
+    assert brain._config_value("OCR_IMAGE_PREPARE", "true").lower() == "false"
+
+
+def test_environment_is_used_when_config_has_no_key(config, monkeypatch):
+    monkeypatch.setenv("PDF_RENDER_PROCESSES", "3")
+
+    assert brain._config_value("PDF_RENDER_PROCESSES", 2) == 3
+
+
+def test_missing_empty_and_invalid_values_use_the_default(config, monkeypatch):
+    monkeypatch.delenv("PDF_RENDER_PROCESSES", raising=False)
+    assert brain._config_value("PDF_RENDER_PROCESSES", 2) == 2
+
+    config["PDF_RENDER_PROCESSES"] = ""
+    assert brain._config_value("PDF_RENDER_PROCESSES", 2) == 2
+
+    config["PDF_RENDER_PROCESSES"] = "many"
+    assert brain._config_value("PDF_RENDER_PROCESSES", 2) == 2
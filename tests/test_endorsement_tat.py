@@ -0,0 +1,156 @@
+"""
+Endorsement TAT warnings: BusinessCalendar year coverage, and the created_at
+of the fetched ticket reaching the actions stage of process_ticket_id_enhanced.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+TICKET_ID = 5150
+# Motor non-financial sub types without their own entry use the 72 hour (3 working day) TAT
+CLASSIFICATION = "Endorsement-Motor-Non_Financial"
+
+
+def test_calendar_refuses_years_without_holidays():
+    calendar = brain.BusinessCalendar(holidays=[date(2026, 1, 26)], years=[2026])
+
+    assert calendar.business_hours("2026-03-02T09:00:00", "2026-03-02T12:00:00") == 3
+    with pytest.raises(brain.BusinessCalendarCoverageError, match="2027"):
+        calendar.business_hours("2026-12-30T09:00:00", "2027-01-04T12:00:00")
+    with pytest.raises(brain.BusinessCalendarCoverageError, match="2025"):
+        calendar.business_hours("2025-12-30T09:00:00", "2026-01-02T12:00:00")
+
+
+def test_calendar_without_holidays_covers_every_year():
+    calendar = brain.BusinessCalendar()
+
+    assert calendar.business_hours("2031-03-03T09:00:00", "2031-03-03T18:00:00") == 9
+
+
+def test_covered_years_default_to_the_holiday_years():
+    settings = {'holidays': [date(2025, 8, 15), date(2026, 8, 15)]}
+    assert brain._covered_years(settings) == {2025, 2026}
+    assert brain._covered_years({'holidays': [], 'years': ['2026']}) == {2026}
+    assert brain._covered_years({'holidays': []}) is None
+
+
+@pytest.fixture
+def shipped_calendar():
+    settings = brain._load_business_calendar_settings()
+    holidays = brain._parse_holidays(settings.get('holidays'))
+    years = brain._covered_years(dict(settings, holidays=holidays))
+    return brain.BusinessCalendar(settings['shifts']['default'], holidays, years=years)
+
+
+@pytest.mark.parametrize("day, name", [
+    (date(2024, 3, 25), "Holi"),
+    (date(2024, 10, 31), "Diwali"),
+    (date(2025, 3, 31), "Id-ul-Fitr"),
+    (date(2025, 4, 18), "Good Friday"),
+    (date(2026, 3, 4), "Holi"),
+    (date(2026, 11, 8), "Diwali"),
+])
+def test_shipped_calendar_has_moveable_holidays(shipped_calendar, day, name):
+    assert shipped_calendar.is_holiday(day), name
+
+
+def test_shipped_calendar_lists_every_gazetted_holiday_of_covered_years(shipped_calendar):
+    for year in shipped_calendar.years:
+        holidays = [day for day in map(date.fromordinal, shipped_calendar.holidays) if day.year == year]
+        # The Central Government list has 17 or 18 closed holidays a year
+        assert len(holidays) >= 17, year
+
+
+def test_shipped_calendar_skips_holidays_and_refuses_unlisted_years(shipped_calendar):
+    # Holi 2026 (Wednesday) is not a working day
+    assert shipped_calendar.business_hours("2026-03-03T09:00:00", "2026-03-05T18:00:00") == 18
+    with pytest.raises(brain.BusinessCalendarCoverageError):
+        shipped_calendar.business_hours("2023-12-29T09:00:00", "2024-01-02T18:00:00")
+
+
+def test_uncovered_year_falls_back_to_calendar_days(monkeypatch):
+    calendar = brain.BusinessCalendar(holidays=[date(2020, 1, 26)], years=[2020])
+    monkeypatch.setattr(brain, "get_business_calendar", lambda team=None: calendar)
+    created_at = (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
+
+    age_days = brain.AutonomousActionSystem("example", "key")._calculate_business_age_days(created_at, CLASSIFICATION)
+
+    assert age_days == pytest.approx(10, abs=0.01)
+
+
+@pytest.fixture
+def offline_pipeline(monkeypatch):
+    """
+    process_ticket_id_enhanced with the Freshdesk fetches and the Claude
+    stages stubbed; returns a function that runs it for a ticket created_at.
+    """
+    ticket = {
+        'id': TICKET_ID,
+        'subject': 'Change of address on motor policy',
+        'description_text': 'Please update the address on my motor policy.',
+        'status': 2,
+        'responder_id': None,
+    }
+    conversations = [{
+        'id': 1, 'incoming': True, 'body_text': 'Any update on my endorsement?',
+        'created_at': '2026-01-05T10:00:00Z', 'updated_at': '2026-01-05T10:00:00Z',
+    }]
+
+    # The escalation check reads SOP_KNOWLEDGE_BASE, which the backend expects to be provided
+    monkeypatch.setattr(brain, "SOP_KNOWLEDGE_BASE", {"claims": {}, "endorsement": {}, "support": {}}, raising=False)
+    monkeypatch.setattr(brain, "read_mirrored_ticket", lambda ticket_id: None)
+    monkeypatch.setattr(brain, "fetch_all_ticket_conversations", lambda ticket_id, start_page=1: list(conversations))
+    monkeypatch.setattr(brain, "fetch_child_tickets", lambda ticket_id: [])
+    monkeypatch.setattr(brain, "fetch_parent_ticket", lambda ticket: None)
+    monkeypatch.setattr(brain, "process_ticket_id_orignal",
+                        lambda ticket_id, ticket_context=None: {'Ticket ID': str(ticket_id), 'Summary': 'stub'})
+    monkeypatch.setattr(brain.EnhancedTicketAnalyzer, "analyze_ticket_with_children",
+                        lambda self, ticket_id, ticket_context=None: {'error': 'skipped'})
+    monkeypatch.setattr(brain, "get_pending_status_summary",
+                        lambda ticket_id, ticket_context=None: {'error': 'skipped'})
+    monkeypatch.setattr(brain, "classify_ticket_with_subject_priority", lambda *args: (CLASSIFICATION, None))
+    monkeypatch.setattr(brain, "classify_ticket_with_sop", lambda content: ("Endorsement", {}))
+    monkeypatch.setattr(brain, "get_agent_name_from_id", lambda agent_id: "Unassigned")
+    monkeypatch.setattr(brain, "get_autonomous_action_system",
+                        lambda: brain.AutonomousActionSystem("example", "key"))
+    monkeypatch.setattr(brain, "get_predictive_engine", lambda: None)
+    monkeypatch.setattr(brain, "get_workflow_engine", lambda: None)
+    monkeypatch.setattr(brain, "get_smart_response_generator", lambda: None)
+
+    def run(created_at):
+        fetched = dict(ticket, created_at=created_at, updated_at=created_at)
+        monkeypatch.setattr(brain, "fetch_ticket_by_id", lambda ticket_id, conversations=None: dict(fetched))
+        return brain.process_ticket_id_enhanced(TICKET_ID)
+
+    return run
+
+
+def tat_warnings(result):
+    return [action for action in result.get('autonomous_actions', []) if action['type'] == 'TAT_WARNING']
+
+
+def test_pipeline_raises_tat_warning_for_old_endorsement(offline_pipeline):
+    created_at = (datetime.now(timezone.utc) - timedelta(days=21)).isoformat()
+
+    result = offline_pipeline(created_at)
+
+    assert result['stage_status']['actions']['status'] == 'done'
+    assert result['created_at'] == created_at
+    warnings = tat_warnings(result)
+    assert len(warnings) == 1
+    assert warnings[0]['parameters']['business_days_elapsed'] > 3 * 0.75
+
+
+def test_pipeline_skips_tat_warning_for_new_endorsement(offline_pipeline):
+    created_at = (datetime.now(timezone.utc) - timedelta(minutes=30)).isoformat()
+
+    result = offline_pipeline(created_at)
+
+    assert result['stage_status']['actions']['status'] == 'done'
+    assert tat_warnings(result) == []
@@ -0,0 +1,323 @@
+"""
+FreshdeskClient and the fetch helpers against a local stub of the Freshdesk API:
+conversation pagination, search pagination, 429 + Retry-After, attachment
+downloads, and the ticket sync worker with the mirror it fills. The stub is reached through the client's base_url, so the helpers
+still build their usual https://<domain>.freshdesk.com URLs.
+"""
+
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+TICKET_ID = 4242
+CONVERSATION_COUNT = 65  # three pages of 30
+SEARCH_TOTAL = 45  # two pages of 30
+ATTACHMENT_BYTES = bytes(range(256)) * 1024  # 256 KB
+
+
+class StubFreshdesk(BaseHTTPRequestHandler):
+    """Serves the few endpoints the tests use and records every request"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append(self.path)
+
+        if url.path == "/api/v2/rate-limited":
+            self.server.rate_limited_hits += 1
+            if self.server.rate_limited_hits == 1:
+                self.send_json([], status=429, headers={"Retry-After": "1"})
+            else:
+                self.send_json({"ok": True})
+        elif url.path == "/api/v2/tickets":
+            # Tickets updated at or after updated_since, oldest update first
+            since = query["updated_since"][0]
+            per_page = int(query["per_page"][0])
+            page = int(query.get("page", ["1"])[0])
+            tickets = sorted((t for t in self.server.tickets if t["updated_at"] >= since),
+                             key=lambda t: t["updated_at"])
+            self.send_json(tickets[(page - 1) * per_page:page * per_page])
+        elif re.fullmatch(r"/api/v2/tickets/\d+/conversations", url.path):
+            ticket_id = int(url.path.split("/")[4])
+            page = int(query.get("page", ["1"])[0])
+            start = (page - 1) * brain.CONVERSATIONS_PER_PAGE
+            self.send_json(self.server.conversations.get(ticket_id, [])[start:start + brain.CONVERSATIONS_PER_PAGE])
+        elif url.path == "/api/v2/search/tickets":
+            page = int(query.get("page", ["1"])[0])
+            start = (page - 1) * 30
+            ids = range(start, min(start + 30, SEARCH_TOTAL))
+            self.send_json({"results": [{"id": i} for i in ids], "total": SEARCH_TOTAL})
+        elif url.path == "/files/report.pdf":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(ATTACHMENT_BYTES)))
+            self.send_header("Content-Disposition", 'attachment; filename="report.pdf"')
+            self.end_headers()
+            self.wfile.write(ATTACHMENT_BYTES)
+        else:
+            self.send_json({"message": "not found"}, status=404)
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def conversation(conv_id, attachments=()):
+    return {"id": conv_id, "body_text": f"message {conv_id}", "created_at": "2024-01-01T00:00:00Z",
+            "updated_at": "2024-01-01T00:00:00Z", "attachments": list(attachments)}
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFreshdesk)
+    server.requests = []
+    server.rate_limited_hits = 0
+    server.tickets = []
+    server.conversations = {TICKET_ID: [conversation(i) for i in range(CONVERSATION_COUNT)]}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client(stub_server, monkeypatch):
+    """A FreshdeskClient pointed at the stub and installed as the shared client"""
+    host, port = stub_server.server_address
+    client = brain.FreshdeskClient(
+        brain.FRESHDESK_DOMAIN, "test-key", requests_per_minute=6000,
+        timeout=5, max_retries=2, base_url=f"http://{host}:{port}"
+    )
+    monkeypatch.setattr(brain, "freshdesk_client", client)
+    yield client
+    client.session.close()
+
+
+def test_conversations_are_fetched_across_pages(client, stub_server):
+    conversations = brain.fetch_all_ticket_conversations(TICKET_ID)
+
+    assert [c["id"] for c in conversations] == list(range(CONVERSATION_COUNT))
+    pages = [parse_qs(urlparse(path).query)["page"] for path in stub_server.requests]
+    assert pages == [["1"], ["2"], ["3"]]
+
+
+def test_search_stops_at_the_reported_total(client, stub_server):
+    ticket_ids = brain.fetch_ticket_ids_for_query("status:5")
+
+    assert ticket_ids == [str(i) for i in range(SEARCH_TOTAL)]
+    assert len(stub_server.requests) == 2
+
+
+def test_429_is_retried_after_retry_after(client, stub_server):
+    start = time.monotonic()
+    response = client.get(f"{client.api_origin}/api/v2/rate-limited")
+    elapsed = time.monotonic() - start
+
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+    assert stub_server.rate_limited_hits == 2
+    assert elapsed >= 0.9
+
+
+def test_429_is_returned_once_retries_run_out(client, stub_server, monkeypatch):
+    monkeypatch.setattr(client, "max_retries", 0)
+
+    response = client.get("/api/v2/rate-limited")
+
+    assert response.status_code == 429
+    assert stub_server.rate_limited_hits == 1
+
+
+def test_attachment_download_is_streamed_to_a_spool(client, stub_server):
+    spool, size, headers = client.download(f"{client.api_origin}/files/report.pdf")
+    with spool:
+        assert size == len(ATTACHMENT_BYTES)
+        assert spool.read() == ATTACHMENT_BYTES
+    assert headers["Content-Type"] == "application/pdf"
+    assert stub_server.requests == ["/files/report.pdf"]
+
+
+def test_download_attachment_returns_metadata_and_content(client):
+    result = brain.download_attachment(f"{client.api_origin}/files/report.pdf")
+
+    assert result["filename"] == "report.pdf"
+    assert result["content_type"] == "application/pdf"
+    assert result["size"] == len(ATTACHMENT_BYTES)
+    assert bytes(result["content"]) == ATTACHMENT_BYTES
+
+
+def test_oversized_attachment_is_refused(client):
+    with pytest.raises(brain.AttachmentTooLarge):
+        client.download(f"{client.api_origin}/files/report.pdf", max_bytes=1024)
+
+
+def iso(minutes_ago):
+    return (datetime.utcnow() - timedelta(minutes=minutes_ago)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    store = brain.TicketMirrorStore(str(tmp_path / "ticket_mirror.db"))
+    monkeypatch.setattr(brain, "get_ticket_mirror", lambda: store)
+    monkeypatch.setattr(brain, "TICKET_SYNC_ENABLED", True)
+    return store
+
+
+@pytest.fixture
+def updated_tickets(stub_server, monkeypatch):
+    """Five tickets on the stub, listed two per page (pages of 2, 2 and 1)"""
+    monkeypatch.setattr(brain, "TICKET_SYNC_PER_PAGE", 2)
+    stub_server.tickets = [
+        {"id": 100 + i, "subject": f"ticket {i}", "updated_at": iso(50 - i)} for i in range(5)
+    ]
+    stub_server.conversations.update({100 + i: [conversation(1000 + i)] for i in range(5)})
+    return stub_server.tickets
+
+
+def ticket_list_queries(stub_server):
+    return [parse_qs(urlparse(path).query) for path in stub_server.requests
+            if urlparse(path).path == "/api/v2/tickets"]
+
+
+def test_sync_pages_through_updated_tickets_and_stores_the_watermark(client, stub_server, mirror, updated_tickets):
+    result = brain.TicketSyncWorker(store=mirror, reserve=0).sync_once()
+
+    assert result["synced"] == 5 and result["unchanged"] == 0
+    queries = ticket_list_queries(stub_server)
+    assert [q["page"] for q in queries] == [["1"], ["2"], ["3"]]
+    for q in queries:
+        assert q["order_by"] == ["updated_at"] and q["order_type"] == ["asc"] and q["per_page"] == ["2"]
+    # The first pass starts TICKET_SYNC_INITIAL_DAYS back
+    assert queries[0]["updated_since"][0] < iso(60 * 24 * brain.TICKET_SYNC_INITIAL_DAYS - 5)
+
+    assert mirror.count() == 5
+    assert mirror.get_meta("updated_since") == updated_tickets[-1]["updated_at"]
+    assert mirror.is_current()
+    ticket, conversations, _ = mirror.get(102)
+    assert ticket["subject"] == "ticket 2"
+    assert [c["id"] for c in conversations] == [1002]
+
+
+def test_next_sync_resumes_from_the_watermark(client, stub_server, mirror, updated_tickets):
+    worker = brain.TicketSyncWorker(store=mirror, reserve=0)
+    worker.sync_once()
+    watermark = mirror.get_meta("updated_since")
+    stub_server.requests.clear()
+
+    # Ticket 101 gets a reply after the first pass
+    updated_tickets[1]["updated_at"] = iso(0)
+    stub_server.conversations[101].append(conversation(2001))
+    result = worker.sync_once()
+
+    assert ticket_list_queries(stub_server)[0]["updated_since"] == [watermark]
+    # The newest ticket of the last pass comes back (updated_since is inclusive) and is skipped
+    assert result["synced"] == 1 and result["unchanged"] == 1
+    assert [c["id"] for c in mirror.get(101)[1]] == [1001, 2001]
+    assert mirror.get_meta("updated_since") == updated_tickets[1]["updated_at"]
+
+
+def test_failed_ticket_list_leaves_the_mirror_stale(client, stub_server, mirror, updated_tickets, monkeypatch):
+    monkeypatch.setattr(brain, "fetch_updated_tickets", lambda updated_since, page=1: None)
+
+    result = brain.TicketSyncWorker(store=mirror, reserve=0).sync_once()
+
+    assert result == {'error': 'Ticket list request failed', 'synced': 0}
+    assert not mirror.is_current()
+
+
+def test_sync_requests_leave_the_reserve(client, stub_server, mirror, updated_tickets, monkeypatch):
+    reserves = []
+    acquire = client.rate_limiter.acquire
+
+    def record_acquire(reserve=0):
+        reserves.append(reserve)
+        return acquire(reserve)
+
+    monkeypatch.setattr(client.rate_limiter, "acquire", record_acquire)
+    brain.TicketSyncWorker(store=mirror, reserve=7).sync_once()
+    client.get("/api/v2/search/tickets")
+
+    assert reserves[:-1] and set(reserves[:-1]) == {7}
+    assert reserves[-1] == 0
+
+
+def test_rate_limiter_reserve_holds_background_requests_back():
+    limiter = brain.RateLimiter(requests_per_minute=600)  # refills 10 tokens a second
+    limiter.tokens = 5
+
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start < 0.1
+
+    # With 4 tokens left a reserve of 10 waits for 11, i.e. about 0.7s of refill
+    start = time.monotonic()
+    limiter.acquire(reserve=10)
+    elapsed = time.monotonic() - start
+    assert 0.6 <= elapsed < 2
+    assert 9.5 <= limiter.tokens < 11
+
+
+def test_rate_limiter_reserve_is_capped_below_capacity():
+    limiter = brain.RateLimiter(requests_per_minute=60)
+
+    start = time.monotonic()
+    limiter.acquire(reserve=1000)
+    assert time.monotonic() - start < 0.1
+
+
+def test_mirror_is_current_only_after_a_recent_sync(mirror):
+    assert not mirror.is_current()
+
+    mirror.set_meta("last_sync_started_at", time.time() - 10)
+    assert mirror.is_current()
+    assert not mirror.is_current(max_age=5)
+
+    mirror.set_meta("last_sync_started_at", time.time() - 4 * brain.TICKET_SYNC_INTERVAL_SECONDS)
+    assert not mirror.is_current()
+
+
+def test_read_mirrored_ticket(mirror, monkeypatch):
+    plain = {"id": 1, "updated_at": iso(5), "attachments": []}
+    with_files = {"id": 2, "updated_at": iso(5), "attachments": [{"attachment_url": "https://example.com/a.pdf"}]}
+    mirror.put(plain, [conversation(10)])
+    mirror.put(with_files, [conversation(20, with_files["attachments"])])
+
+    # No finished sync yet
+    assert brain.read_mirrored_ticket(1) is None
+
+    mirror.set_meta("last_sync_started_at", time.time())
+    assert brain.read_mirrored_ticket(1) == (plain, [conversation(10)])
+    assert brain.read_mirrored_ticket(2)[0] == with_files
+    assert brain.read_mirrored_ticket(3) is None
+
+    # Once the signed attachment URLs may have expired, only the plain ticket is served
+    monkeypatch.setattr(time, "time", lambda now=time.time(): now + brain.TICKET_MIRROR_ATTACHMENT_URL_MAX_AGE + 1)
+    mirror.set_meta("last_sync_started_at", time.time())
+    assert brain.read_mirrored_ticket(2) is None
+    assert brain.read_mirrored_ticket(1) == (plain, [conversation(10)])
+
+    monkeypatch.setattr(brain, "TICKET_SYNC_ENABLED", False)
+    assert brain.read_mirrored_ticket(1) is None
@@ -0,0 +1,68 @@
+"""PDF page rendering on the spawned render pool, from bytes and from a memory map."""
+
+import mmap
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+fitz = pytest.importorskip("fitz")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+PAGE_COUNT = 5
+
+
+@pytest.fixture(scope="module")
+def pdf_file(tmp_path_factory):
+    document = fitz.open()
+    for page_num in range(PAGE_COUNT):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Page {page_num + 1} of the claim form")
+    path = tmp_path_factory.mktemp("pdf") / "claim.pdf"
+    document.save(str(path))
+    document.close()
+    return path
+
+
+@pytest.fixture
+def render_pool(monkeypatch):
+    monkeypatch.setattr(brain, "PDF_RENDER_PROCESSES", 2)
+    brain._discard_pdf_render_pool()
+    yield
+    brain._discard_pdf_render_pool()
+
+
+def rendered_pages(content):
+    return dict(brain.DocumentAnalyzer()._iter_rendered_pages(content, list(range(PAGE_COUNT))))
+
+
+def test_pool_renders_the_same_pages_as_the_calling_thread(pdf_file, render_pool):
+    content = pdf_file.read_bytes()
+    expected = dict(brain._iter_pdf_page_images(content, range(PAGE_COUNT)))
+
+    assert rendered_pages(content) == expected
+    assert brain._pdf_render_pool._mp_context.get_start_method() == "spawn"
+
+
+def test_memory_mapped_pdf_is_sent_to_workers_as_a_path(pdf_file, render_pool, monkeypatch):
+    submitted = []
+    pool = brain.get_pdf_render_pool()
+    submit = pool.submit
+
+    def record_submit(func, source, *args):
+        submitted.append(source)
+        return submit(func, source, *args)
+
+    monkeypatch.setattr(pool, "submit", record_submit)
+    with open(pdf_file, "rb") as f:
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        pages = rendered_pages(content)
+    finally:
+        content.close()
+
+    assert sorted(pages) == list(range(PAGE_COUNT))
+    assert submitted and all(isinstance(source, str) for source in submitted)
+    assert not any(os.path.exists(path) for path in submitted)
@@ -0,0 +1,128 @@
+"""
+Parity of classify_ticket_with_sop (compiled KeywordMatcher) with the
+substring-scanning implementation it replaced (tests/legacy_sop_classifier.py).
+"""
+
+import random
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+from legacy_sop_classifier import legacy_classify_ticket_with_sop
+
+# SOP details returned for each category. The backend reads them from
+# SOP_KNOWLEDGE_BASE, which the tests provide.
+SOP_KNOWLEDGE_BASE = {
+    "claims": {
+        "common_requests": {
+            "pi_request": {"sop": "pi request"},
+            "cashless_garage": {"sop": "cashless garage"},
+            "cashless_hospital": {"sop": "cashless hospital"},
+        },
+        "motor": {"sop": "motor claims"},
+        "health": {"sop": "health claims"},
+        "life": {"sop": "life claims"},
+        "general_claim_handling_procedure": {"sop": "general claims"},
+    },
+    "endorsement": {
+        "motor": {"sop": "motor endorsement"},
+        "health": {"sop": "health endorsement"},
+        "life": {"sop": "life endorsement"},
+    },
+    "support": {
+        "pdpnr": {"sop": "pdpnr"},
+        "plng": {"sop": "plng"},
+        "kyc": {"sop": "kyc"},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def sop_knowledge_base(monkeypatch):
+    monkeypatch.setattr(brain, "SOP_KNOWLEDGE_BASE", SOP_KNOWLEDGE_BASE, raising=False)
+    brain.classification_cache.clear()
+
+
+TICKETS = [
+    "Motor claim for my car, accident near the garage. Surveyor visit pending, claim number MC/123.",
+    "Health claim: hospitalization claim for surgery, cashless denied, reimbursement requested with discharge summary.",
+    "Death claim intimation. Nominee has the death certificate and the succession certificate.",
+    "SME claim after fire at the factory, stock damage and business interruption.",
+    "Please process ownership transfer of the vehicle and update ncb correction on the policy.",
+    "Name correction and address change needed on my motor policy, chassis number is wrong.",
+    "Add member to the health policy: newborn addition, also dob correction for spouse.",
+    "Nominee update and email id change for the health policy, pincode changed too.",
+    "Life policy: rider addition and fund switch, premium frequency change to annual mode.",
+    "Need tax certificate and 80c certificate for my life policy.",
+    "Add employee to the GMC policy and delete employee who left, employee list attached.",
+    "Company name change and gstin update for the msme policy.",
+    "Payment done policy not received, transaction id and payment receipt attached.",
+    "Payment link not generated, proposal stuck with technical error.",
+    "Amount debited but payment failed after successful OTP, refund pending.",
+    "KYC pending, video kyc failed with face match error.",
+    "Portal issue: login issue on the pos portal, password reset not working.",
+    "Please share pi report and inspection photos, odometer and rc copy attached.",
+    "Which cashless garage or network garage is near me?",
+    "Send me the list of cashless hospitals, network hospital near me please.",
+    "Need a soft copy of the policy document and premium receipt.",
+    "What are the coverage details and policy status? Also premium details.",
+    "I want to cancel and get a refund.",
+    "General complaint about service, and some feedback on the app.",
+    "UTR not shared for the refund, negative balance shown.",
+    "Hello, just checking in.",
+    "",
+    "MOTOR CLAIM / Health Claim / Policy Cancellation / PDPNR / KYC ISSUE all in one mail",
+    "pedestrian hit the car; wheel damaged; the deductible is unclear",
+]
+
+
+def keyword_pool():
+    pool = set()
+    for table in (brain.SOP_CLAIM_KEYWORDS, brain.SOP_ENDORSEMENT_KEYWORDS,
+                  brain.SOP_SUPPORT_KEYWORDS, brain.SOP_COMMON_REQUEST_KEYWORDS):
+        pool.update(brain._collect_keywords(table))
+    pool.update(brain.SOP_GENERAL_CLASSIFICATIONS)
+    return sorted(pool)
+
+
+def generated_tickets(count=500, seed=20240601):
+    """Texts mixing random SOP keywords, partial keywords and filler words"""
+    rng = random.Random(seed)
+    pool = keyword_pool()
+    filler = ["please", "the", "policy", "customer", "urgent", "re:", "fw:", "attached", "regards", "team"]
+    tickets = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(1, 12)):
+            choice = rng.random()
+            if choice < 0.5:
+                words.append(rng.choice(pool))
+            elif choice < 0.7:
+                keyword = rng.choice(pool)
+                words.append(keyword[:rng.randint(1, len(keyword))])
+            else:
+                words.append(rng.choice(filler))
+        text = rng.choice([" ", "", "\n", ", "]).join(words)
+        tickets.append(text.upper() if rng.random() < 0.2 else text)
+    return tickets
+
+
+@pytest.mark.parametrize("text", TICKETS)
+def test_fixture_tickets_match_legacy_classifier(text):
+    assert brain.classify_ticket_with_sop(text) == legacy_classify_ticket_with_sop(text)
+
+
+def test_generated_tickets_match_legacy_classifier():
+    for text in generated_tickets():
+        assert brain.classify_ticket_with_sop(text) == legacy_classify_ticket_with_sop(text), text
+
+
+def test_keyword_matcher_has_substring_semantics():
+    pool = keyword_pool()
+    matcher = brain.get_sop_keyword_matcher()
+    for text in TICKETS + generated_tickets(200, seed=7):
+        text = text.lower()
+        assert matcher.find(text) == {keyword for keyword in pool if keyword in text}
@@ -0,0 +1,158 @@
+"""
+StagePipeline required stages, and the stage graph of process_ticket_id_enhanced:
+the summary ends the run when it fails, attachments don't wait for it, and
+the claims workflow is only offered as an action.
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+TICKET_ID = 6160
+
+
+def test_failed_required_stage_aborts_the_run():
+    def broken(data):
+        raise RuntimeError("Claude unavailable")
+
+    pipeline = brain.StagePipeline([
+        brain.PipelineStage('summary', broken, required=True),
+        brain.PipelineStage('after', lambda data: {'after': True}, deps=('summary',)),
+    ])
+
+    with pytest.raises(brain.PipelineAbort) as abort:
+        pipeline.run({})
+    assert abort.value.result == {'error': 'Stage summary failed: Claude unavailable'}
+
+
+def test_timed_out_required_stage_aborts_the_run():
+    release = threading.Event()
+    pipeline = brain.StagePipeline([
+        brain.PipelineStage('summary', lambda data: release.wait(5) and {}, timeout=0.2, required=True),
+    ])
+
+    start = time.monotonic()
+    try:
+        with pytest.raises(brain.PipelineAbort) as abort:
+            pipeline.run({})
+    finally:
+        release.set()
+    assert time.monotonic() - start < 2
+    assert 'timed out' in abort.value.result['error']
+
+
+def test_optional_stage_failure_is_only_reported():
+    def broken(data):
+        raise RuntimeError("no OCR service")
+
+    pipeline = brain.StagePipeline([
+        brain.PipelineStage('attachments', broken),
+        brain.PipelineStage('after', lambda data: {'after': True}, deps=('attachments',)),
+    ])
+
+    data, status = pipeline.run({})
+    assert data == {'after': True}
+    assert status['attachments']['status'] == 'failed'
+
+
+@pytest.fixture
+def claims_pipeline(monkeypatch):
+    """
+    process_ticket_id_enhanced on a claims ticket with an attachment, with the
+    Freshdesk fetches, Claude calls and document analysis stubbed. Anything
+    that would write to the ticket is recorded in side_effects.
+    """
+    state = {'side_effects': [], 'summary': None, 'attachments_done': threading.Event()}
+    ticket = {
+        'id': TICKET_ID, 'subject': 'Claim for accident damage', 'status': 2, 'responder_id': None,
+        'description_text': 'My car was damaged, please register the claim.',
+        'created_at': '2026-01-05T10:00:00Z', 'updated_at': '2026-01-05T10:00:00Z',
+        'attachments': [{'name': 'rc.pdf', 'size': 1024, 'attachment_url': 'https://example.freshdesk.com/rc.pdf'}],
+    }
+
+    def summary(ticket_id, ticket_context=None):
+        if state['summary'] is not None:
+            return state['summary']()
+        state['attachments_before_summary'] = state['attachments_done'].wait(3)
+        return {'Ticket ID': str(ticket_id), 'Problem': 'Accident claim', 'raw_ticket_content': 'summary content'}
+
+    def analyze_attachments(data):
+        assert data['raw_ticket_content']
+        state['attachments_done'].set()
+        return dict(data, attachment_analysis={'total_attachments': len(data['attachments'])})
+
+    def side_effect(name):
+        def record(*args, **kwargs):
+            state['side_effects'].append(name)
+            return {'success': True, 'workflow_stage': 'documents_requested'}
+        return record
+
+    monkeypatch.setattr(brain, "SOP_KNOWLEDGE_BASE", {"claims": {}, "endorsement": {}, "support": {}}, raising=False)
+    monkeypatch.setattr(brain, "read_mirrored_ticket", lambda ticket_id: None)
+    monkeypatch.setattr(brain, "fetch_ticket_by_id", lambda ticket_id, conversations=None: dict(ticket))
+    monkeypatch.setattr(brain, "fetch_all_ticket_conversations", lambda ticket_id, start_page=1: [])
+    monkeypatch.setattr(brain, "fetch_child_tickets", lambda ticket_id: [])
+    monkeypatch.setattr(brain, "fetch_parent_ticket", lambda ticket: None)
+    monkeypatch.setattr(brain, "process_ticket_id_orignal", summary)
+    monkeypatch.setattr(brain.EnhancedTicketAnalyzer, "analyze_ticket_with_children",
+                        lambda self, ticket_id, ticket_context=None: {'error': 'skipped'})
+    monkeypatch.setattr(brain, "get_pending_status_summary", lambda ticket_id, ticket_context=None: {'error': 'skipped'})
+    monkeypatch.setattr(brain, "classify_ticket_with_subject_priority", lambda *args: ("Claims-Motor", None))
+    monkeypatch.setattr(brain, "classify_ticket_with_sop", lambda content: ("Claims", {}))
+    monkeypatch.setattr(brain, "get_agent_name_from_id", lambda agent_id: "Unassigned")
+    monkeypatch.setattr(brain, "get_autonomous_action_system", lambda: brain.AutonomousActionSystem("example", "key"))
+    monkeypatch.setattr(brain, "get_predictive_engine", lambda: None)
+    monkeypatch.setattr(brain, "get_workflow_engine", lambda: None)
+    monkeypatch.setattr(brain, "get_smart_response_generator", lambda: None)
+    monkeypatch.setattr(brain, "process_ticket_attachments_enhanced", analyze_attachments)
+    monkeypatch.setattr(brain.DocumentSuggestionEngine, "suggest_documents", lambda self, data: [])
+    monkeypatch.setattr(brain.DocumentWorkflowAutomation, "process_document_workflow", lambda self, data: {})
+    monkeypatch.setattr(brain, "process_claims_ticket_with_documents", lambda ticket_id, ticket_context=None: {
+        'success': True, 'is_claims': True, 'claim_type': 'Motor',
+        'documents': {'missing_required': ['Claim Form']},
+        'generated_response': 'Please send the signed claim form.',
+    })
+    for name in ('automated_claims_workflow', 'send_automated_response', 'update_ticket_status',
+                 'update_ticket_tags', 'create_claim_intimation_child_ticket'):
+        monkeypatch.setattr(brain, name, side_effect(name))
+    return state
+
+
+def test_summary_failure_ends_the_run(claims_pipeline):
+    def broken():
+        raise RuntimeError("Claude unavailable")
+    claims_pipeline['summary'] = broken
+
+    result = brain.process_ticket_id_enhanced(TICKET_ID)
+
+    assert result == {'error': 'Stage summary failed: Claude unavailable'}
+
+
+def test_attachments_run_without_waiting_for_the_summary(claims_pipeline):
+    result = brain.process_ticket_id_enhanced(TICKET_ID)
+
+    # The summary stub waits for the attachments stage, which must not wait for it
+    assert claims_pipeline['attachments_before_summary']
+    assert result['stage_status']['attachments']['status'] == 'done'
+    assert result['attachment_analysis'] == {'total_attachments': 1}
+    assert result['Problem'] == 'Accident claim'
+
+
+def test_claims_workflow_is_offered_not_run(claims_pipeline):
+    result = brain.process_ticket_id_enhanced(TICKET_ID)
+
+    assert claims_pipeline['side_effects'] == []
+    assert result['suggested_response'] == 'Please send the signed claim form.'
+    action = next(a for a in result['autonomous_actions'] if a['type'] == 'RUN_CLAIMS_WORKFLOW')
+    assert 'Claim Form' in action['reason']
+
+    executed = brain.AutonomousActionSystem("example", "key").execute_action(action)
+
+    assert executed['success']
+    assert claims_pipeline['side_effects'] == ['automated_claims_workflow']
@@ -0,0 +1,41 @@
+"""get_summary_store: one-time import of the legacy ticket_summary.xlsx workbook."""
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+openpyxl = pytest.importorskip("openpyxl")
+
+import ID_BRAIN_SMART_ROUTING1 as brain
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    excel = tmp_path / "ticket_summary.xlsx"
+    monkeypatch.setattr(brain, "SUMMARY_DB_FILE", str(tmp_path / "ticket_summary.db"))
+    monkeypatch.setattr(brain, "EXCEL_FILE", str(excel))
+    monkeypatch.setattr(brain, "_summary_store", None)
+    return excel
+
+
+def write_workbook(path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(brain.TicketSummaryStore.COLUMNS)
+    ws.append(["101", "Claim status", "Delay", "Pending survey", "Follow up", "Claims-Motor", ""])
+    wb.save(path)
+
+
+def test_failed_import_is_retried(paths, monkeypatch):
+    paths.write_bytes(b"not a workbook")  # e.g. a half-written or locked file
+
+    store = brain.get_summary_store()
+    assert store.get_meta('excel_imported') is None
+    assert store.get("101") is None
+
+    monkeypatch.setattr(brain, "_summary_store", None)
+    write_workbook(paths)
+
+    store = brain.get_summary_store()
+    assert store.get_meta('excel_imported')
+    assert store.get("101")["Problem"] == "Delay"